@@ -0,0 +1,8 @@
+"""
+Helpers of the CNES sonar-scanner image
+
+They are run by the entrypoint of the image (see scripts/entrypoint.sh)
+with ``python3 -m cnes_scanner <command>``. Each command logs on the
+standard error; the standard output is reserved for the properties
+the entrypoint must add to the command line of the sonar-scanner.
+"""
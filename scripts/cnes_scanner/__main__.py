@@ -0,0 +1,416 @@
+"""
+Command line of the helpers of the CNES sonar-scanner image
+
+Usage: python3 -m cnes_scanner <command> [arguments]
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+
+from . import (analyze, batch, cache, changes, issues, lintcache, lintserver, measure, metrics, prewarm, resources,
+               shard, warm)
+
+LOGGER = logging.getLogger("cnes_scanner")
+
+
+def project_base_dir(scanner_args) -> str:
+    """
+    Find the base directory of the project the sonar-scanner will analyze
+
+    :param scanner_args: arguments of the sonar-scanner
+    :returns: the value of sonar.projectBaseDir, or the working directory
+    """
+    base_dir = os.environ.get("SONAR_PROJECT_BASE_DIR") or os.getcwd()
+    for arg in scanner_args:
+        if arg.startswith("-Dsonar.projectBaseDir="):
+            base_dir = arg.split("=", 1)[1]
+    return base_dir
+
+
+def metrics_dir(scanner_args) -> str:
+    """
+    :param scanner_args: arguments of the sonar-scanner
+    :returns: the directory of the metrics of the entrypoint
+    """
+    return os.environ.get("CNES_METRICS_DIR") or project_base_dir(scanner_args)
+
+
+def container_limits(command: str) -> dict:
+    """
+    :param command: name of the command, for its error
+    :returns: the resources of the container (see resources.limits)
+    :raises subprocess.CalledProcessError: if CNES_CPUS or CNES_MEMORY is invalid
+    """
+    try:
+        return resources.limits()
+    except ValueError as error:
+        LOGGER.error("%s", error)
+        raise subprocess.CalledProcessError(2, command) from error
+
+
+def run_analyze(stage: str, scanner_args, base_dir: str, files=None):
+    """
+    Run the embedded tools, as a stage of the metrics if they are enabled
+
+    :returns: the properties to add to the scanner command line
+    """
+    limits = container_limits(stage)
+    if metrics.formats():
+        return metrics.time_stage(stage, metrics_dir(scanner_args), analyze.analyze, base_dir, limits, files=files,
+                                  scanner_args=scanner_args)
+    return analyze.analyze(base_dir, limits, files=files, scanner_args=scanner_args)
+
+
+def command_analyze(args):
+    """
+    Run the embedded tools before an analysis by the sonar-scanner,
+    the unparsed arguments are the ones of the sonar-scanner
+    """
+    return run_analyze("analyze", args.scanner_args, project_base_dir(args.scanner_args))
+
+
+def command_pr(args):
+    """
+    Run the embedded tools on the files changed since a base ref and
+    restrict the analysis by the sonar-scanner to them,
+    the unparsed arguments are the ones of the sonar-scanner: they are
+    printed after the properties, wherever they were around the base ref,
+    except sonar.inclusions which is printed last, restricted to the changed files
+    """
+    base_dir = project_base_dir(args.scanner_args)
+    included = changes.user_inclusions(base_dir, args.scanner_args)
+    files = changes.included_files(changes.changed_files(base_dir, args.base_ref), included)
+    if included:
+        LOGGER.info("%d changed files matched by sonar.inclusions=%s", len(files), ",".join(included))
+    patterns = changes.inclusions(files)
+    if not patterns:
+        LOGGER.info("No file to analyze since %s", args.base_ref)
+        return []
+    if not changes.is_branch_analysis(base_dir, args.scanner_args):
+        LOGGER.warning("Neither sonar.pullrequest.key nor sonar.branch.name is set: the analysis of the changed "
+                       "files only replaces the one of the main branch, whose other files are then removed")
+    scanner_args = [arg for arg in args.scanner_args if not arg.startswith("-Dsonar.inclusions=")]
+    return run_analyze("pr", args.scanner_args, base_dir, files) + [*scanner_args, f"-Dsonar.inclusions={patterns}"]
+
+
+def command_batch(args):
+    """
+    Analyze all the sub-projects of the repository,
+    the unparsed arguments are the ones of the sonar-scanner of each project
+    """
+    limits = container_limits("batch")
+    results = batch.batch(args.root, args.scanner_args, args.jobs or max(1, limits["cpus"] // 2), args.cold,
+                          args.report, limits)
+    failures = [project for project, result in results.items() if result["status"] != "SUCCESS"]
+    if failures:
+        raise subprocess.CalledProcessError(1, f"sonar-scanner ({', '.join(failures)})")
+    return []
+
+
+def command_convert(args):
+    """
+    Convert the report of a tool to generic external issues
+    """
+    path_map = []
+    for mapping in args.path_map:
+        prefix, separator, replacement = mapping.partition("=")
+        if not separator:
+            LOGGER.error("Invalid path mapping (expected PREFIX=REPLACEMENT): %s", mapping)
+            raise subprocess.CalledProcessError(2, "convert")
+        path_map.append((prefix, replacement))
+    paths = issues.PathMapper(args.base_dir or project_base_dir(args.scanner_args), args.source_dir, path_map)
+    try:
+        count = issues.convert(args.format, args.report, args.output, paths)
+    except (OSError, ValueError) as error:
+        LOGGER.error("%s", error)
+        raise subprocess.CalledProcessError(1, "convert") from error
+    LOGGER.info("%d issues converted to %s", count, args.output)
+    return []
+
+
+def command_evict(args):
+    """
+    Evict the least recently used entries of the cache to fit in a maximum size
+    """
+    if not args.max_size:
+        LOGGER.error("The maximum size of the cache is required (--max-size or CNES_CACHE_MAX_SIZE)")
+        raise subprocess.CalledProcessError(2, "evict")
+    try:
+        cache.evict(args.cache_dir or prewarm.default_cache_dir(), cache.parse_size(args.max_size))
+    except (OSError, ValueError) as error:
+        LOGGER.error("%s", error)
+        raise subprocess.CalledProcessError(1, "evict") from error
+    return []
+
+
+def command_jvm_options(args):
+    """
+    Size the heap and the processors of the JVM of the sonar-scanner to the
+    resources of the container and print its options
+    """
+    options = os.environ.get("SONAR_SCANNER_OPTS", "")
+    if not resources.autotune_enabled():
+        return [options]
+    limits = container_limits("jvm-options")
+    LOGGER.info("Container resources: %d CPUs (%s), %d MiB of memory (%s)", limits["cpus"], limits["cpus_from"],
+                limits["memory"] >> 20, limits["memory_from"])
+    options = resources.jvm_options(options, limits["memory"], limits["cpus"])
+    LOGGER.info("SONAR_SCANNER_OPTS=%s", options)
+    return [options]
+
+
+def command_lint(args):
+    """
+    Lint files with pylint or shellcheck, reusing the cached results of unchanged files
+    unless CNES_LINT_CACHE disables the cache
+    """
+    use_cache = analyze.lint_cache_enabled()
+    try:
+        if args.tool == "pylint":
+            lintcache.cached_pylint(args.files, args.rcfile, args.msg_template, args.output, args.jobs,
+                                    use_cache=use_cache)
+        else:
+            lintcache.cached_shellcheck(args.files, args.output, shell=args.shell, jobs=args.jobs,
+                                        use_cache=use_cache)
+    except ValueError as error:
+        LOGGER.error("%s", error)
+        raise subprocess.CalledProcessError(1, f"lint {args.tool}") from error
+    return []
+
+
+def command_measure(args):
+    """
+    Run a command and write its resource usage to a JSON file
+    """
+    command = args.measured[1:] if args.measured[:1] == ["--"] else args.measured
+    if not command:
+        LOGGER.error("No command to measure")
+        raise subprocess.CalledProcessError(2, "measure")
+    usage = measure.write_measure(command, args.output)
+    LOGGER.info("%s: %.3fs wall, %.3fs CPU, %d KiB peak RSS", command[0], usage["wall"], usage["cpu"],
+                usage["max_rss_kb"])
+    return []
+
+
+def command_metrics(args):
+    """
+    Run the final command of the entrypoint and record its metrics
+    """
+    command = args.measured[1:] if args.measured[:1] == ["--"] else args.measured
+    if not command:
+        LOGGER.error("No command to run")
+        raise subprocess.CalledProcessError(2, "metrics")
+    status = metrics.run_stage(os.path.basename(command[0]), command, metrics_dir(command[1:]))
+    if status:
+        # Exit like a shell does for a command killed by a signal
+        raise subprocess.CalledProcessError(128 - status if status < 0 else status, command[0])
+    return []
+
+
+def command_pylint_server(args):
+    """
+    Run the pylint server until it is interrupted
+    """
+    try:
+        lintserver.serve(args.socket)
+    except KeyboardInterrupt:
+        LOGGER.info("pylint server stopped")
+    return []
+
+
+def command_pylint_client(args):
+    """
+    Run pylint in the pylint server of the container,
+    the unparsed arguments are the ones of pylint
+    """
+    try:
+        status = lintserver.lint(args.scanner_args, socket_file=args.socket)
+    except OSError as error:
+        LOGGER.error("Cannot reach the pylint server on %s (is the container in pylint-server mode?)",
+                     args.socket or lintserver.socket_path())
+        raise subprocess.CalledProcessError(1, "pylint (server)") from error
+    # The exit status of pylint is returned as is, like the pylint command line
+    sys.exit(status)
+
+
+def command_pylint_shard(args):
+    """
+    Split the Python files of the project into shards, lint one of them
+    with pylint or merge the results of all of them into one report
+    """
+    try:
+        if args.action == "merge":
+            shard.merge(args.shard_outputs, args.msg_template, args.output, args.history, args.jobs)
+            return []
+        files = args.files or analyze.detect_sources(".").get("python", [])
+        if args.action == "split":
+            for path in shard.shard_files(files, args.shards, args.index, args.weights, args.history):
+                print(path)
+            return []
+        shard.run_shard(files, args.shards, args.index, args.rcfile, args.output, args.jobs, args.weights,
+                        args.history, analyze.lint_cache_enabled())
+    except (OSError, ValueError) as error:
+        LOGGER.error("%s", error)
+        raise subprocess.CalledProcessError(1, f"pylint-shard {args.action}") from error
+    return []
+
+
+def command_prewarm(args):
+    """
+    Fill the cache of the sonar-scanner with the files of a server
+    and optionally write the build context of an image with this cache
+    """
+    if not args.url:
+        LOGGER.error("The URL of the server is required (--url or SONAR_HOST_URL)")
+        raise subprocess.CalledProcessError(2, "prewarm")
+    try:
+        manifest = prewarm.prewarm(args.url, args.token, args.server_version, args.cache_dir)
+        if args.image_context:
+            prewarm.write_image_context(manifest, args.image_context, args.base_image, args.cache_dir)
+    except (OSError, ValueError) as error:
+        LOGGER.error("%s", error)
+        raise subprocess.CalledProcessError(1, "prewarm") from error
+    return []
+
+
+def command_warm_scan(args):
+    """
+    Run an analysis with the warm sonar-scanner of the container,
+    the unparsed arguments are the ones of the sonar-scanner
+    """
+    try:
+        status = warm.scan(args.scanner_args)
+    except OSError as error:
+        LOGGER.error("Cannot reach the warm sonar-scanner on %s (is the container in warm mode?)",
+                     warm.socket_path())
+        raise subprocess.CalledProcessError(1, "sonar-scanner (warm)") from error
+    if status:
+        raise subprocess.CalledProcessError(status, "sonar-scanner (warm)")
+    return []
+
+
+def main(argv=None) -> int:
+    """
+    Run a command and print the properties it adds to the scanner command line
+
+    :param argv: (optional) arguments, default: sys.argv[1:]
+    :returns: the exit status
+    """
+    parser = argparse.ArgumentParser(prog="cnes_scanner")
+    parser.set_defaults(passthrough=False)
+    commands = parser.add_subparsers(dest="command", required=True)
+    analyze_parser = commands.add_parser("analyze", help="run the embedded tools on the project")
+    analyze_parser.set_defaults(function=command_analyze, passthrough=True)
+    pr_parser = commands.add_parser("pr", help="run the embedded tools on the files changed since a base ref")
+    pr_parser.add_argument("base_ref", help="ref the changes are compared to (e.g. origin/main)")
+    pr_parser.set_defaults(function=command_pr, passthrough=True)
+    batch_parser = commands.add_parser("batch", help="analyze all the sub-projects of the repository")
+    batch_parser.add_argument("--root", default=".", help="root directory of the repository")
+    batch_parser.add_argument("--jobs", type=int, default=int(os.environ.get("CNES_BATCH_JOBS", "0")),
+                              help="maximum number of concurrent analyses, default: $CNES_BATCH_JOBS or half the CPUs")
+    batch_parser.add_argument("--cold", action="store_true", help="analyze each project with a new sonar-scanner")
+    batch_parser.add_argument("--report", default="cnes-batch-report.json", help="path of the JSON report")
+    batch_parser.set_defaults(function=command_batch, passthrough=True)
+    convert_parser = commands.add_parser("convert", help="convert the report of a tool to generic external issues")
+    convert_parser.add_argument("format", choices=sorted(issues.FORMATS))
+    convert_parser.add_argument("report", help="path of the report")
+    convert_parser.add_argument("--output", required=True, help="path of the JSON file of the issues")
+    convert_parser.add_argument("--base-dir", default="",
+                                help="base directory of the project, default: sonar.projectBaseDir")
+    convert_parser.add_argument("--source-dir", default=None,
+                                help="directory the tool ran in, default: the base directory")
+    convert_parser.add_argument("--path-map", action="append", default=[], metavar="PREFIX=REPLACEMENT",
+                                help="replace a prefix of the paths of the report (repeatable)")
+    convert_parser.set_defaults(function=command_convert)
+    evict_parser = commands.add_parser("evict", help="evict the least recently used entries of the cache")
+    evict_parser.add_argument("--max-size", default=os.environ.get("CNES_CACHE_MAX_SIZE", ""),
+                              help="maximum size of the cache (e.g. 2G), default: $CNES_CACHE_MAX_SIZE")
+    evict_parser.add_argument("--cache-dir", default="", help="cache directory, default: $SONAR_USER_HOME/cache")
+    evict_parser.set_defaults(function=command_evict)
+    jvm_parser = commands.add_parser("jvm-options", help="print the options of the JVM sized to the container")
+    jvm_parser.set_defaults(function=command_jvm_options)
+    lint_parser = commands.add_parser("lint", help="lint files, reusing the cached results of unchanged files")
+    lint_parser.add_argument("tool", choices=("pylint", "shellcheck"))
+    lint_parser.add_argument("files", nargs="*", help="files to lint, in the order of the report")
+    lint_parser.add_argument("--output", required=True, help="path of the report")
+    lint_parser.add_argument("--jobs", type=int, default=1, help="number of jobs for the files to lint")
+    lint_parser.add_argument("--rcfile", default=analyze.DEFAULT_PYLINTRC, help="pylintrc (pylint)")
+    lint_parser.add_argument("--msg-template", default=analyze.PYLINT_TEMPLATE, help="message template (pylint)")
+    lint_parser.add_argument("--shell", default="", help="shell dialect (shellcheck)")
+    lint_parser.set_defaults(function=command_lint)
+    measure_parser = commands.add_parser("measure", help="measure the resource usage of a command")
+    measure_parser.add_argument("--output", required=True, help="path of the JSON file of the resource usage")
+    measure_parser.add_argument("measured", nargs=argparse.REMAINDER, help="-- command to measure")
+    measure_parser.set_defaults(function=command_measure)
+    metrics_parser = commands.add_parser("metrics", help="run a command and record the metrics of the entrypoint")
+    metrics_parser.add_argument("measured", nargs=argparse.REMAINDER, help="-- command to run")
+    metrics_parser.set_defaults(function=command_metrics)
+    shard_parser = commands.add_parser("pylint-shard", help="lint the Python files with pylint across CI nodes")
+    shard_actions = shard_parser.add_subparsers(dest="action", required=True)
+    for action, action_help in (("split", "print the files of a shard"), ("run", "lint the files of a shard")):
+        action_parser = shard_actions.add_parser(action, help=action_help)
+        action_parser.add_argument("files", nargs="*",
+                                   help="files to lint, in the order of the report, default: the Python files")
+        action_parser.add_argument("--shards", type=int, default=int(os.environ.get("CI_NODE_TOTAL", "1")),
+                                   help="number of shards, default: $CI_NODE_TOTAL or 1")
+        action_parser.add_argument("--index", type=int, default=int(os.environ.get("CI_NODE_INDEX", "1")),
+                                   help="index of the shard, from 1, default: $CI_NODE_INDEX or 1")
+        action_parser.add_argument("--weights", choices=shard.WEIGHTS, default="size",
+                                   help="estimation of the cost of the files")
+        action_parser.add_argument("--history", default="", help="history written by a previous merge")
+    run_shard_parser = shard_actions.choices["run"]
+    run_shard_parser.add_argument("--output", required=True, help="path of the JSON file of the results")
+    run_shard_parser.add_argument("--jobs", type=int, default=1, help="number of pylint jobs")
+    run_shard_parser.add_argument("--rcfile", default=os.environ.get("CNES_PYLINTRC", analyze.DEFAULT_PYLINTRC),
+                                  help="pylintrc, default: $CNES_PYLINTRC or the CNES A/B one")
+    merge_parser = shard_actions.add_parser("merge", help="merge the results of the shards into one report")
+    merge_parser.add_argument("shard_outputs", nargs="+", help="JSON files of the results of the shards")
+    merge_parser.add_argument("--output", required=True, help="path of the report")
+    merge_parser.add_argument("--msg-template", default=analyze.PYLINT_TEMPLATE, help="message template")
+    merge_parser.add_argument("--history", default="", help="path of the history to write for the next runs")
+    merge_parser.add_argument("--jobs", type=int, default=1,
+                              help="number of pylint jobs for the messages computed over several modules")
+    shard_parser.set_defaults(function=command_pylint_shard)
+    pylint_server_parser = commands.add_parser("pylint-server", help="run pylint with its modules kept loaded")
+    pylint_server_parser.add_argument("--socket", default="", help="socket to listen on, default: $CNES_PYLINT_SOCKET")
+    pylint_server_parser.set_defaults(function=command_pylint_server)
+    pylint_client_parser = commands.add_parser("pylint-client", help="run pylint in the pylint server")
+    pylint_client_parser.add_argument("--socket", default="", help="socket of the server, default: $CNES_PYLINT_SOCKET")
+    pylint_client_parser.set_defaults(function=command_pylint_client, passthrough=True)
+    prewarm_parser = commands.add_parser("prewarm", help="fill the cache of the sonar-scanner for a server")
+    prewarm_parser.add_argument("--url", default=os.environ.get("SONAR_HOST_URL", ""),
+                                help="URL of the server, default: $SONAR_HOST_URL")
+    prewarm_parser.add_argument("--token",
+                                default=os.environ.get("SONAR_TOKEN") or os.environ.get("SONAR_LOGIN", ""),
+                                help="token of a user of the server, default: $SONAR_TOKEN or $SONAR_LOGIN")
+    prewarm_parser.add_argument("--server-version", default="", help="expected version of the server")
+    prewarm_parser.add_argument("--cache-dir", default="", help="cache directory, default: $SONAR_USER_HOME/cache")
+    prewarm_parser.add_argument("--image-context", default="",
+                                help="directory to write the build context of an image with the cache to")
+    prewarm_parser.add_argument("--base-image", default="lequal/sonar-scanner",
+                                help="image to derive from, default: lequal/sonar-scanner")
+    prewarm_parser.set_defaults(function=command_prewarm)
+    warm_parser = commands.add_parser("warm-scan", help="run an analysis with the warm sonar-scanner")
+    warm_parser.set_defaults(function=command_warm_scan, passthrough=True)
+
+    # The arguments of the sonar-scanner may look like options: they are left unparsed
+    args, unknown = parser.parse_known_args(argv)
+    if unknown and not args.passthrough:
+        parser.error(f"unrecognized arguments: {' '.join(unknown)}")
+    args.scanner_args = unknown
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s", stream=sys.stderr)
+    try:
+        properties = args.function(args)
+    except subprocess.CalledProcessError as error:
+        LOGGER.error("%s", error)
+        return error.returncode or 1
+    for scanner_property in properties or ():
+        print(scanner_property)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""
+Pre-analysis with the embedded tools
+
+The languages of the project are detected from the extensions of its
+files. The tools of the detected languages (the ones of the flavor of
+the image, the others are skipped) run concurrently, in a pool
+sized to the CPUs of the container, each one with the jobs its share
+of the CPUs and of the memory allows (see resources), and write their
+reports to the default paths expected by conf/sonar-scanner.properties:
+    - cppcheck: cppcheck-report.xml
+    - pylint: pylint-report.txt
+    - shellcheck: shellcheck-report.xml, always converted to generic
+      external issues: no sensor of the server reads it
+    - Infer: infer-out/report.json (only if a compile_commands.json exists)
+
+Environment variables:
+    CNES_ANALYZE_TOOLS: comma-separated list of the tools to run,
+                        default: all the tools of the detected languages
+    CNES_PYLINTRC: pylintrc to use, default: /opt/python/pylintrc_RNC2015_A_B
+    CNES_LINT_CACHE: set to "no" to lint all the files with pylint and
+                     shellcheck instead of reusing the cached results of
+                     the unchanged ones (see lintcache)
+    CNES_INCREMENTAL: set to "no" to analyze all the files with cppcheck and
+                      Infer instead of only the ones changed since the
+                      previous analysis (see incremental)
+    CNES_EXTERNAL_ISSUES: comma-separated list of the tools whose reports are
+                          converted to generic external issues (<tool>-issues.json,
+                          see issues) and imported with sonar.externalIssuesReportPaths,
+                          default: none
+"""
+
+import contextlib
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import incremental, issues, lintcache
+from .resources import limits as container_limits, tool_jobs
+
+LOGGER = logging.getLogger(__name__)
+
+# File extensions of each language
+LANGUAGES = {
+    'cxx': ('.c', '.cc', '.cpp', '.cxx', '.h', '.hh', '.hpp', '.hxx'),
+    'python': ('.py',),
+    'shell': ('.sh', '.bash', '.ksh')
+}
+# Headers are analyzed through the files including them
+HEADERS = ('.h', '.hh', '.hpp', '.hxx')
+# Directories that never contain sources to analyze
+IGNORED_DIRS = ('infer-out', 'node_modules', '__pycache__')
+# Template of the pylint messages, as documented in the README
+PYLINT_TEMPLATE = "{path}:{line}: [{msg_id}({symbol}), {obj}] {msg}"
+DEFAULT_PYLINTRC = "/opt/python/pylintrc_RNC2015_A_B"
+# Report of each tool and its format (see issues.FORMATS)
+REPORTS = {
+    'cppcheck': ("cppcheck-report.xml", "cppcheck"),
+    'infer': ("infer-out/report.json", "infer"),
+    'pylint': ("pylint-report.txt", "pylint"),
+    'shellcheck': ("shellcheck-report.xml", "checkstyle")
+}
+EXTERNAL_ISSUES_PROPERTY = "-Dsonar.externalIssuesReportPaths="
+# Properties of the import sensors of the reports, blanked when the reports are imported as external issues
+SENSOR_REPORT_PROPERTIES = {
+    'cppcheck': "-Dsonar.cxx.cppcheck.reportPaths=",
+    'pylint': "-Dsonar.python.pylint.reportPaths="
+}
+
+
+def lint_cache_enabled() -> bool:
+    """
+    :returns: whether pylint and shellcheck reuse the cached results of unchanged files
+    """
+    return os.environ.get("CNES_LINT_CACHE", "yes").lower() not in ("no", "false", "0")
+
+
+def external_issues_tools() -> list:
+    """
+    :returns: the tools whose reports are imported as generic external issues
+    """
+    return [name for name in os.environ.get("CNES_EXTERNAL_ISSUES", "").split(",") if name in REPORTS]
+
+
+def detect_sources(base_dir: str, files=None) -> dict:
+    """
+    List the source files of each language in a project
+
+    :param base_dir: base directory of the project
+    :param files: (optional) paths (relative to base_dir) of the files to consider, default: all the files
+    :returns: the sorted paths (relative to base_dir) of the files of each detected language
+    """
+    if files is None:
+        files = []
+        for root, dirs, names in os.walk(base_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d not in IGNORED_DIRS)
+            files.extend(os.path.relpath(os.path.join(root, name), base_dir) for name in names)
+    else:
+        files = [path for path in files
+                 if not any(d.startswith('.') or d in IGNORED_DIRS for d in path.split('/')[:-1])
+                 and os.path.isfile(os.path.join(base_dir, path))]
+    sources = {}
+    for path in files:
+        for language, extensions in LANGUAGES.items():
+            if path.endswith(extensions):
+                sources.setdefault(language, []).append(path)
+    return {language: sorted(paths) for language, paths in sources.items()}
+
+
+def run_cppcheck(base_dir: str, files, jobs: int, project: str):
+    """
+    Run cppcheck on C/C++ files
+
+    :returns: the properties to add to the scanner command line
+    """
+    files = [path for path in files if not path.endswith(HEADERS)]
+    if not files:
+        return []
+    # The results of the unchanged files are reused from the build directory
+    state = incremental.cppcheck_build_dir(base_dir, project) if incremental.incremental_enabled() \
+        else contextlib.nullcontext()
+    with state as build_dir, tempfile.NamedTemporaryFile("w", suffix=".txt") as file_list:
+        file_list.write("\n".join(files))
+        file_list.flush()
+        options = [f"--cppcheck-build-dir={build_dir}"] if build_dir else []
+        subprocess.run(["cppcheck", "--quiet", "--xml-version=2", f"-j{jobs}", *options,
+                        f"--file-list={file_list.name}", "--output-file=cppcheck-report.xml"],
+                       cwd=base_dir, check=True)
+    return []
+
+
+def run_pylint(base_dir: str, files, jobs: int, project: str):  # pylint: disable=unused-argument
+    """
+    Run pylint, with a CNES pylintrc, on Python files
+
+    :returns: the properties to add to the scanner command line
+    """
+    rcfile = os.environ.get("CNES_PYLINTRC", DEFAULT_PYLINTRC)
+    if lint_cache_enabled():
+        # pylint runs in its own process, it may fork its jobs
+        subprocess.run([sys.executable, "-m", "cnes_scanner", "lint", "pylint", f"--rcfile={rcfile}",
+                        f"--jobs={jobs}", "--output=pylint-report.txt", *files],
+                       cwd=base_dir, check=True)
+        return []
+    with open(os.path.join(base_dir, "pylint-report.txt"), "w", encoding="utf8") as report:
+        subprocess.run(["pylint", "--exit-zero", f"--rcfile={rcfile}", "-r", "n", f"-j{jobs}",
+                        "--persistent=n", f"--msg-template={PYLINT_TEMPLATE}", *files],
+                       cwd=base_dir, stdout=report, check=True)
+    return []
+
+
+def run_shellcheck(base_dir: str, files, jobs: int, project: str):  # pylint: disable=unused-argument
+    """
+    Run shellcheck on shell scripts
+
+    :returns: the properties to add to the scanner command line
+    """
+    if lint_cache_enabled():
+        lintcache.cached_shellcheck(files, os.path.join(base_dir, "shellcheck-report.xml"),
+                                    base_dir=base_dir, jobs=jobs)
+    else:
+        with open(os.path.join(base_dir, "shellcheck-report.xml"), "w", encoding="utf8") as report:
+            # shellcheck exits with 1 when it finds issues
+            status = subprocess.run(["shellcheck", "-f", "checkstyle", *files],
+                                    cwd=base_dir, stdout=report, check=False).returncode
+        if status not in (0, 1):
+            raise subprocess.CalledProcessError(status, "shellcheck")
+    # No sensor of the server reads the report: it is imported as generic external issues anyway
+    if "shellcheck" in external_issues_tools():
+        return []
+    return convert_report(base_dir, "shellcheck")
+
+
+def run_infer(base_dir: str, files, jobs: int, project: str):
+    """
+    Run Infer on the compilation database of a C/C++ project
+
+    :returns: the properties to add to the scanner command line
+    """
+    if not os.path.isfile(os.path.join(base_dir, "compile_commands.json")):
+        LOGGER.info("No compile_commands.json, skipping Infer")
+        return []
+    # Infer analyzes the units of the compilation database, not only the given files: in pr mode,
+    # sonar.inclusions leaves the issues of the unchanged files out of the analysis
+    if incremental.incremental_enabled():
+        # All the headers of the project, also in pr mode: the state of Infer is the one of the whole project
+        headers = [path for path in detect_sources(base_dir).get("cxx", []) if path.endswith(HEADERS)]
+        incremental.run_infer(base_dir, headers, jobs, project=project)
+    else:
+        subprocess.run(["infer", "run", "--quiet", f"--jobs={jobs}",
+                        "--compilation-database", "compile_commands.json"],
+                       cwd=base_dir, check=True)
+    if "infer" in external_issues_tools():
+        return []
+    return ["-Dsonar.cxx.infer.reportPaths=infer-out/report.json"]
+
+
+def convert_report(base_dir: str, name: str):
+    """
+    Convert the report of a tool to generic external issues
+
+    :returns: the properties to add to the scanner command line
+    :raises ValueError: if the report cannot be read
+    """
+    report, report_format = REPORTS[name]
+    if not os.path.isfile(os.path.join(base_dir, report)):
+        return []
+    output = f"{name}-issues.json"
+    count = issues.convert(report_format, os.path.join(base_dir, report), os.path.join(base_dir, output),
+                           issues.PathMapper(base_dir))
+    LOGGER.info("%d issues of %s converted to %s", count, name, output)
+    # The import sensor of the tool would import its issues a second time
+    sensor = [SENSOR_REPORT_PROPERTIES[name]] if name in SENSOR_REPORT_PROPERTIES else []
+    return sensor + [f"{EXTERNAL_ISSUES_PROPERTY}{output}"]
+
+
+# Tools run by the analysis: (name, language, function of the base directory, the files, the number of jobs
+# and the identity of the project)
+TOOLS = (
+    ('cppcheck', 'cxx', run_cppcheck),
+    ('infer', 'cxx', run_infer),
+    ('pylint', 'python', run_pylint),
+    ('shellcheck', 'shell', run_shellcheck)
+)
+
+
+def analyze(base_dir: str, limits: dict = None, files=None, timings: dict = None, scanner_args=()):
+    """
+    Run the embedded tools on a project concurrently
+
+    :param base_dir: base directory of the project
+    :param limits: (optional) CPUs and memory to use (see resources.limits), default: the ones of the container
+    :param files: (optional) paths (relative to base_dir) of the files to analyze, default: all the files
+    :param timings: (optional) dictionary filled with the wall time (in seconds) of each tool
+    :param scanner_args: (optional) arguments of the sonar-scanner, identifying the project (see incremental)
+    :returns: the properties to add to the scanner command line
+    :raises subprocess.CalledProcessError: if a tool failed
+    """
+    limits = limits or container_limits()
+    cpus = limits["cpus"]
+    selected = os.environ.get("CNES_ANALYZE_TOOLS", "")
+    sources = detect_sources(base_dir, files)
+    LOGGER.info("Detected languages: %s", ", ".join(sorted(sources)) or "none")
+    tasks = [(name, function, sources[language]) for name, language, function in TOOLS
+             if language in sources and (not selected or name in selected.split(','))]
+    missing = [name for name, _, _ in tasks if not shutil.which(name)]
+    for name in missing:
+        LOGGER.warning("%s is not in this flavor of the image (%s), skipping it",
+                       name, os.environ.get("CNES_FLAVOR", "unknown"))
+    tasks = [task for task in tasks if task[0] not in missing]
+    if not tasks:
+        return []
+    workers = min(len(tasks), cpus)
+    # The CPUs and the memory of the container are shared by the tools running concurrently
+    jobs = {name: tool_jobs(name, max(1, cpus // workers), limits["memory"] // workers) for name, _, _ in tasks}
+    LOGGER.info("Running %s with %d workers", ", ".join(f"{name} ({jobs[name]} jobs)" for name, _, _ in tasks),
+                workers)
+    timings = {} if timings is None else timings
+    external_tools = external_issues_tools()
+    project = incremental.project_id(base_dir, scanner_args)
+
+    def timed(name, function, files):
+        start = time.monotonic()
+        try:
+            properties = function(base_dir, files, jobs[name], project)
+            if name in external_tools:
+                properties += convert_report(base_dir, name)
+            return properties
+        finally:
+            timings[name] = round(time.monotonic() - start, 3)
+            LOGGER.info("%s done in %.1fs", name, timings[name])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [(name, pool.submit(timed, name, function, files)) for name, function, files in tasks]
+    properties = []
+    failures = []
+    for name, future in futures:
+        try:
+            properties.extend(future.result())
+        except (subprocess.CalledProcessError, OSError, ValueError) as error:
+            LOGGER.error("%s failed: %s", name, error)
+            failures.append(name)
+    if failures:
+        raise subprocess.CalledProcessError(1, ", ".join(failures))
+    # The scanner keeps only the last value of a property: the reports are joined
+    reports = [prop[len(EXTERNAL_ISSUES_PROPERTY):] for prop in properties if prop.startswith(EXTERNAL_ISSUES_PROPERTY)]
+    properties = [prop for prop in properties if not prop.startswith(EXTERNAL_ISSUES_PROPERTY)]
+    if reports:
+        properties.append(EXTERNAL_ISSUES_PROPERTY + ",".join(reports))
+    return properties
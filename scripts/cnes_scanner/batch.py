@@ -0,0 +1,237 @@
+"""
+Analysis of all the sub-projects of a repository in one container
+
+The sub-projects are the directories containing a sonar-project.properties
+file (hidden directories and the ones of IGNORED_DIRS are skipped). They
+are analyzed concurrently by a bounded number of workers. Each worker is
+a warm sonar-scanner (see warm): its JVM, its engine and the plugins of
+the server stay loaded from a project to the next, and all of them share
+the cache of the sonar-scanner. With cold workers, each project is
+analyzed by a new sonar-scanner process instead (which still loads its
+classes from the archive of the image). The JVM of each sonar-scanner
+is sized to its share of the resources of the container (see resources).
+
+The logs of each project are prefixed with its directory. The status
+and the duration of the analysis of each project are logged at the end
+and written to a JSON report.
+"""
+
+import json
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import resources, warm
+from .analyze import IGNORED_DIRS
+
+LOGGER = logging.getLogger(__name__)
+
+PROPERTIES_FILE = "sonar-project.properties"
+ENTRYPOINT = "/usr/bin/entrypoint.sh"
+# Time for a warm sonar-scanner to listen on its socket (in seconds)
+WARM_START_TIMEOUT = 120
+# Environment variable of the warm sonar-scanners of a batch: the entrypoint leaves the cache, its lock
+# and the options of the JVM to the batch, which already prepared them
+WARM_WORKER_ENV = "CNES_WARM_WORKER"
+
+
+def discover(root: str) -> list:
+    """
+    List the sub-projects of a repository
+
+    :param root: root directory of the repository
+    :returns: the sorted directories (relative to root) containing a sonar-project.properties
+    """
+    projects = []
+    for directory, dirs, names in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d not in IGNORED_DIRS)
+        if PROPERTIES_FILE in names:
+            projects.append(os.path.relpath(directory, root))
+    return sorted(projects)
+
+
+class PrefixedOutput:
+    """
+    This class copies lines to a binary stream, prefixed with the name of a
+    project. The lines of concurrent projects are not mixed.
+    """
+    _lock = threading.Lock()
+
+    def __init__(self, prefix: str, stream=None):
+        """
+        :param prefix: prefix of the lines
+        :param stream: (optional) binary stream, default: the standard output
+        """
+        self.prefix = f"[{prefix}] ".encode("utf-8")
+        self.stream = stream or sys.stdout.buffer
+
+    def write(self, line: bytes):
+        """
+        Write a line (or the end of a line)
+        """
+        with self._lock:
+            self.stream.write(self.prefix + line)
+
+    def flush(self):
+        """
+        Flush the stream
+        """
+        with self._lock:
+            self.stream.flush()
+
+
+def server_args(scanner_args) -> list:
+    """
+    :param scanner_args: arguments of the sonar-scanner given to all the projects
+    :returns: the properties of the server read from the environment, unless given as arguments
+    """
+    return [f"-D{key}={os.environ[name]}" for name, key in warm.ENV_PROPERTIES
+            if name != "SONAR_PROJECT_BASE_DIR" and os.environ.get(name)
+            and not any(arg.startswith(f"-D{key}=") for arg in scanner_args)]
+
+
+def scanner_env(jobs: int, limits: dict) -> dict:
+    """
+    :param jobs: number of concurrent sonar-scanners
+    :param limits: resources of the container (see resources.limits)
+    :returns: the environment of a sonar-scanner, with the heap and the processors of its JVM
+              sized to its share of the resources of the container (see resources)
+    """
+    env = dict(os.environ)
+    if resources.autotune_enabled():
+        env["SONAR_SCANNER_OPTS"] = resources.jvm_options(os.environ.get("SONAR_SCANNER_OPTS", ""),
+                                                          limits["memory"] // jobs, max(1, limits["cpus"] // jobs))
+        LOGGER.info("SONAR_SCANNER_OPTS=%s", env["SONAR_SCANNER_OPTS"])
+    return env
+
+
+def start_warm_scanners(count: int, socket_dir: str, env: dict = None) -> list:
+    """
+    Start warm sonar-scanners and wait for them to listen
+
+    :param count: number of warm sonar-scanners
+    :param socket_dir: directory of their sockets
+    :param env: (optional) environment of the sonar-scanners, default: the one of this process
+    :returns: the processes and the sockets of the warm sonar-scanners
+    :raises subprocess.CalledProcessError: if one of them stopped before listening
+    """
+    scanners = []
+    for index in range(count):
+        socket_file = os.path.join(socket_dir, f"warm-{index}.sock")
+        process = subprocess.Popen([ENTRYPOINT, "warm"], stdout=subprocess.DEVNULL,
+                                   env={**(env or os.environ), "CNES_WARM_SOCKET": socket_file, WARM_WORKER_ENV: "yes"})
+        scanners.append((process, socket_file))
+    deadline = time.monotonic() + WARM_START_TIMEOUT
+    for process, socket_file in scanners:
+        while not os.path.exists(socket_file):
+            if process.poll() is not None or time.monotonic() > deadline:
+                stop_warm_scanners(scanners)
+                raise subprocess.CalledProcessError(process.returncode or 1, "sonar-scanner (warm)")
+            time.sleep(0.1)
+    return scanners
+
+
+def stop_warm_scanners(scanners):
+    """
+    Stop warm sonar-scanners
+    """
+    for process, _ in scanners:
+        if process.poll() is None:
+            process.terminate()
+    for process, _ in scanners:
+        process.wait()
+
+
+def scan_project(project_dir: str, scanner_args, output, socket_file: str = "", env: dict = None) -> int:
+    """
+    Analyze a project with a warm sonar-scanner or with a new one
+
+    :param project_dir: base directory of the project
+    :param scanner_args: arguments of the sonar-scanner
+    :param output: binary stream of the logs of the analysis
+    :param socket_file: (optional) socket of a warm sonar-scanner, default: run a new sonar-scanner
+    :param env: (optional) environment of a new sonar-scanner, default: the one of this process
+    :returns: the exit status of the analysis
+    """
+    args = [f"-Dsonar.projectBaseDir={project_dir}", *scanner_args]
+    if socket_file:
+        return warm.scan(args, project_dir, output, socket_file)
+    with subprocess.Popen(["sonar-scanner", *args], cwd=project_dir, env=env, stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT) as process:
+        for line in process.stdout:
+            output.write(line)
+        output.flush()
+    return process.returncode
+
+
+def batch(root: str, scanner_args, jobs: int, cold: bool = False, report: str = "", limits: dict = None) -> dict:
+    """
+    Analyze all the sub-projects of a repository
+
+    :param root: root directory of the repository
+    :param scanner_args: arguments of the sonar-scanner given to all the projects
+    :param jobs: maximum number of concurrent analyses
+    :param cold: (optional) analyze each project with a new sonar-scanner instead of warm ones
+    :param report: (optional) path of the JSON report of the analyses
+    :param limits: (optional) resources shared by the analyses (see resources.limits), default: the ones
+                   of the container
+    :returns: the status and the duration of the analysis of each project
+    :raises subprocess.CalledProcessError: if the warm sonar-scanners could not start
+    """
+    projects = discover(root)
+    LOGGER.info("%d projects to analyze in %s", len(projects), root)
+    results = {}
+    if not projects:
+        return results
+    jobs = max(1, min(jobs, len(projects)))
+    scanner_args = server_args(scanner_args) + list(scanner_args)
+    env = scanner_env(jobs, limits or resources.limits())
+    socket_dir = tempfile.mkdtemp(prefix="cnes-batch-")
+    sockets = queue.Queue()
+    scanners = []
+    try:
+        if cold:
+            for _ in range(jobs):
+                sockets.put("")
+        else:
+            LOGGER.info("Starting %d warm sonar-scanners", jobs)
+            scanners = start_warm_scanners(jobs, socket_dir, env)
+            for _, socket_file in scanners:
+                sockets.put(socket_file)
+
+        def analyze_project(project):
+            socket_file = sockets.get()
+            start = time.monotonic()
+            error = None
+            try:
+                status = scan_project(os.path.abspath(os.path.join(root, project)), scanner_args,
+                                      PrefixedOutput(project), socket_file, env)
+            except Exception as exception:  # pylint: disable=broad-except
+                # A project in error does not stop the analysis of the others
+                LOGGER.error("%s: %s", project, exception)
+                status, error = 1, str(exception) or type(exception).__name__
+            finally:
+                sockets.put(socket_file)
+            results[project] = {"status": "SUCCESS" if status == 0 else "FAILURE", "exit_status": status,
+                                "wall": round(time.monotonic() - start, 3)}
+            if error:
+                results[project]["error"] = error
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            list(pool.map(analyze_project, projects))
+    finally:
+        stop_warm_scanners(scanners)
+        shutil.rmtree(socket_dir, ignore_errors=True)
+    for project in projects:
+        LOGGER.info("%s: %s in %.1fs", project, results[project]["status"], results[project]["wall"])
+    if report:
+        with open(report, "w", encoding="utf8") as report_file:
+            json.dump(results, report_file, indent=2, sort_keys=True)
+    return results
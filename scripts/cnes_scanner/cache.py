@@ -0,0 +1,274 @@
+"""
+Cache shared by the containers of a host
+
+The cache of the sonar-scanner ($SONAR_USER_HOME/cache, usually bind
+mounted from the host) is shared by all the containers analyzing at
+the same time. Its entries are populated atomically (written next to
+their final path, then renamed) under a lock per entry, held with
+flock on a file of $SONAR_USER_HOME/cache/.cnes-locks: concurrent
+containers wait for the one downloading an entry instead of downloading
+it again, and an interrupted download only leaves a temporary file,
+removed by the next eviction.
+
+The eviction removes the least recently used entries until the cache
+fits in a maximum size. The entries are:
+    - the files of the sonar-scanner (<md5>/<name>) recorded by prewarm,
+      which stamps them (.cnes-stamps/<md5>) each time it finds or
+      downloads them; the files the sonar-scanner downloads itself are
+      never evicted,
+    - the results of pylint and shellcheck (cnes-lint, see lintcache),
+    - the state of cppcheck and Infer for a project (cnes-incremental,
+      see incremental), never evicted while an analysis uses it.
+The last use of an entry is the modification time of its stamp, or of
+its files, set explicitly when the tools reuse them: the access times,
+coarse or absent depending on the mount options, are not used.
+
+The sonar-scanner does not take the locks of the entries: the entrypoint
+holds a shared lock (.cnes-locks/scanner.lock) while a sonar-scanner
+runs, which the eviction takes exclusively. While a sonar-scanner of a
+container runs, its files and its temporary files (_tmp) are left alone,
+and only the entries of the embedded tools are evicted.
+
+Environment variables:
+    CNES_CACHE_MAX_SIZE: maximum size of the cache (e.g. 2G, 500M),
+                         default: no eviction
+"""
+
+import contextlib
+import fcntl
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+LOCK_DIR = ".cnes-locks"
+# Use-stamps of the files of the sonar-scanner recorded by prewarm
+STAMP_DIR = ".cnes-stamps"
+# Lock shared by the running sonar-scanners (see the entrypoint)
+SCANNER_LOCK = "scanner"
+# Directories of the entries being removed
+EVICTED_PREFIX = ".cnes-evicted-"
+# Temporary files older than this are left by interrupted writes (in seconds)
+STALE_TMP_AGE = 3600
+# Multipliers of the suffixes of the sizes
+SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+# Entries of the sonar-scanner: a directory named after the MD5 of its file
+SCANNER_ENTRY = re.compile(r"^[0-9a-f]{32}$")
+
+
+def parse_size(size: str) -> int:
+    """
+    :param size: a size in bytes, with an optional K, M, G or T suffix (e.g. 2G)
+    :returns: the size in bytes
+    :raises ValueError: if the size is invalid
+    """
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$", size, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size: {size}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+@contextlib.contextmanager
+def locked(directory: str, name: str, blocking: bool = True):
+    """
+    Hold the lock of an entry of a cache, shared by all the processes of the
+    containers mounting the cache
+
+    :param directory: directory of the cache
+    :param name: name of the entry
+    :param blocking: (optional) whether to wait for the lock, default: True
+    :returns: a context yielding whether the lock is held (always True when blocking)
+    """
+    lock_dir = os.path.join(directory, LOCK_DIR)
+    os.makedirs(lock_dir, exist_ok=True)
+    # The lock files are never removed: a process may be waiting on one
+    with open(os.path.join(lock_dir, f"{name}.lock"), "a", encoding="utf8") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def touch(path: str):
+    """
+    Record the use of an entry, for the eviction
+    """
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def stamp(cache_dir: str, name: str):
+    """
+    Record the use of a file of the sonar-scanner, which makes it an entry of the eviction
+
+    :param cache_dir: directory of the cache
+    :param name: name of the entry (the MD5 of the file)
+    """
+    stamp_dir = os.path.join(cache_dir, STAMP_DIR)
+    os.makedirs(stamp_dir, exist_ok=True)
+    with open(os.path.join(stamp_dir, name), "a", encoding="utf8"):
+        pass
+    touch(os.path.join(stamp_dir, name))
+
+
+def last_use(path: str) -> float:
+    """
+    :returns: the last modification of a file or of a directory and its files
+    """
+    latest = os.stat(path).st_mtime
+    if os.path.isdir(path):
+        for directory, _, names in os.walk(path):
+            for name in names:
+                with contextlib.suppress(OSError):
+                    latest = max(latest, os.stat(os.path.join(directory, name)).st_mtime)
+    return latest
+
+
+def disk_usage(path: str) -> int:
+    """
+    :returns: the size of the files of a file or of a directory
+    """
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    size = 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            with contextlib.suppress(OSError):
+                size += os.path.getsize(os.path.join(directory, name))
+    return size
+
+
+def entries(cache_dir: str):
+    """
+    List the entries of a cache
+
+    :param cache_dir: directory of the cache
+    :returns: a generator of (path, lock directory, lock name, path of its last use) of each entry, without
+              lock for the files replaced atomically
+    """
+    stamp_dir = os.path.join(cache_dir, STAMP_DIR)
+    if os.path.isdir(stamp_dir):
+        for name in sorted(os.listdir(stamp_dir)):
+            path = os.path.join(cache_dir, name)
+            if SCANNER_ENTRY.match(name) and os.path.isdir(path):
+                yield path, cache_dir, name, os.path.join(stamp_dir, name)
+    incremental_dir = os.path.join(cache_dir, "cnes-incremental")
+    if os.path.isdir(incremental_dir):
+        for tool in sorted(os.listdir(incremental_dir)):
+            tool_dir = os.path.join(incremental_dir, tool)
+            if not tool.startswith(".") and os.path.isdir(tool_dir):
+                for project in sorted(os.listdir(tool_dir)):
+                    if not project.startswith("."):
+                        path = os.path.join(tool_dir, project)
+                        yield path, incremental_dir, f"{tool}-{project}", path
+    for directory, _, names in os.walk(os.path.join(cache_dir, "cnes-lint")):
+        for name in names:
+            if name.endswith(".json"):
+                yield os.path.join(directory, name), None, None, os.path.join(directory, name)
+
+
+def remove_stale_temporaries(cache_dir: str, scanner: bool = True) -> int:
+    """
+    Remove the temporary files left by interrupted writes to a cache (the
+    ones of the embedded tools and of the sonar-scanner, in _tmp) and the
+    entries left by an interrupted eviction
+
+    :param cache_dir: directory of the cache
+    :param scanner: (optional) whether to remove the ones of the sonar-scanner, i.e. no sonar-scanner is
+                    running, default: True
+    :returns: the number of files and entries removed
+    """
+    removed = 0
+    deadline = time.time() - STALE_TMP_AGE
+    for directory, dirs, names in os.walk(cache_dir):
+        if directory == cache_dir:
+            # Entries moved by an interrupted eviction
+            for name in [d for d in dirs if d.startswith(EVICTED_PREFIX)]:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+                removed += 1
+        skipped = (LOCK_DIR, STAMP_DIR, "cnes-incremental") + (() if scanner else ("_tmp",))
+        dirs[:] = [d for d in dirs if d not in skipped and not d.startswith(EVICTED_PREFIX)]
+        in_tmp = os.path.basename(directory) == "_tmp"
+        for name in names:
+            path = os.path.join(directory, name)
+            with contextlib.suppress(OSError):
+                if (in_tmp or name.endswith(".tmp")) and os.path.getmtime(path) < deadline:
+                    os.remove(path)
+                    removed += 1
+    return removed
+
+
+def remove_entry(path: str, cache_dir: str):
+    """
+    Remove an entry of a cache: a directory is first moved out of the
+    cache, so that it is either complete or missing for the other containers
+    """
+    if not os.path.isdir(path):
+        os.remove(path)
+        return
+    trash = tempfile.mkdtemp(prefix=EVICTED_PREFIX, dir=cache_dir)
+    os.rename(path, os.path.join(trash, "entry"))
+    shutil.rmtree(trash, ignore_errors=True)
+
+
+def evict(cache_dir: str, max_size: int):
+    """
+    Remove the least recently used entries of a cache until it fits in a maximum size
+
+    :param cache_dir: directory of the cache
+    :param max_size: maximum size of the entries of the cache, in bytes
+    :returns: the number of entries removed and their size
+    """
+    if not os.path.isdir(cache_dir):
+        return 0, 0
+    with locked(cache_dir, "evict", blocking=False) as acquired, \
+            locked(cache_dir, SCANNER_LOCK, blocking=False) as scanner_idle:
+        if not acquired:
+            LOGGER.info("The cache %s is already being evicted", cache_dir)
+            return 0, 0
+        if not scanner_idle:
+            LOGGER.info("A sonar-scanner is using the cache %s, only the entries of the embedded tools are evicted",
+                        cache_dir)
+        stale = remove_stale_temporaries(cache_dir, scanner_idle)
+        if stale:
+            LOGGER.info("%d stale temporary files removed from the cache", stale)
+        usage = []
+        for path, lock_dir, lock_name, used in entries(cache_dir):
+            with contextlib.suppress(OSError):
+                usage.append((last_use(used), disk_usage(path), path, lock_dir, lock_name))
+        total = sum(size for _, size, _, _, _ in usage)
+        removed, freed = 0, 0
+        for _, size, path, lock_dir, lock_name in sorted(usage, key=lambda entry: entry[0]):
+            if total - freed <= max_size:
+                break
+            # The files of the sonar-scanner are counted, but kept while one runs
+            if lock_dir == cache_dir and not scanner_idle:
+                continue
+            with contextlib.ExitStack() as stack:
+                # An entry in use (locked) is kept
+                if lock_name and not stack.enter_context(locked(lock_dir, lock_name, blocking=False)):
+                    continue
+                try:
+                    remove_entry(path, cache_dir)
+                    if lock_dir == cache_dir:
+                        with contextlib.suppress(FileNotFoundError):
+                            os.remove(os.path.join(cache_dir, STAMP_DIR, lock_name))
+                except OSError as error:
+                    LOGGER.warning("Cannot evict %s: %s", path, error)
+                    continue
+            removed += 1
+            freed += size
+        LOGGER.info("Cache %s: %d entries evicted (%d KiB), %d KiB left of %d KiB", cache_dir, removed,
+                    freed >> 10, (total - freed) >> 10, max_size >> 10)
+        return removed, freed
@@ -0,0 +1,122 @@
+"""
+Files changed by a pull request
+
+The changed files are the ones added, copied, modified or renamed between
+the merge base of a base ref and HEAD, as in the diff of a pull request.
+Deleted files are left out: there is nothing left to analyze in them.
+
+The analysis of the changed files only is meant for a pull request or a
+branch (sonar.pullrequest.* or sonar.branch.*): on the main branch, the
+server would consider the other files as removed.
+
+The sonar.inclusions of the user (given to the scanner or in the
+sonar-project.properties of the project) still apply: only the changed
+files they match are analyzed.
+"""
+
+import logging
+import os
+import re
+import subprocess
+
+from .incremental import properties_value
+
+LOGGER = logging.getLogger(__name__)
+
+# Properties of an analysis of a pull request or of a branch
+BRANCH_PROPERTIES = ("sonar.pullrequest.key", "sonar.branch.name")
+
+
+def changed_files(base_dir: str, base_ref: str):
+    """
+    List the files changed since a base ref in the git repository of a project
+
+    :param base_dir: base directory of the project, in a git repository
+    :param base_ref: ref the changes are compared to (e.g. origin/main)
+    :returns: the sorted paths (relative to base_dir) of the changed files under base_dir
+    :raises subprocess.CalledProcessError: if git failed (unknown ref, not a repository...)
+    """
+    # The sources are mounted in the container: their owner is not the user of the container
+    output = subprocess.run(["git", "-c", "safe.directory=*", "diff", "--name-only", "--relative",
+                             "--diff-filter=ACMR", "-z", f"{base_ref}...HEAD"],
+                            cwd=base_dir, stdout=subprocess.PIPE, check=True).stdout
+    files = sorted(path for path in os.fsdecode(output).split("\0") if path)
+    LOGGER.info("%d files changed since %s", len(files), base_ref)
+    return files
+
+
+def user_inclusions(base_dir: str, scanner_args) -> list:
+    """
+    :param base_dir: base directory of the project
+    :param scanner_args: arguments of the sonar-scanner
+    :returns: the patterns of the sonar.inclusions of the user, the last one given to the scanner,
+              else the one of the sonar-project.properties of the project, empty if there is none
+    """
+    value = properties_value(os.path.join(base_dir, "sonar-project.properties"), "sonar.inclusions")
+    for arg in scanner_args:
+        if arg.startswith("-Dsonar.inclusions="):
+            value = arg.split("=", 1)[1]
+    return [pattern.strip() for pattern in (value or "").split(",") if pattern.strip()]
+
+
+def pattern_regex(pattern: str):
+    """
+    :param pattern: wildcard pattern of a path of SonarQube (**: any directories, *: any characters
+                    but /, ?: a character but /)
+    :returns: the compiled regular expression matching the same paths
+    """
+    regex, index = "", 0
+    while index < len(pattern):
+        if pattern.startswith("**/", index):
+            regex, index = regex + "(?:.*/)?", index + 3
+        elif pattern.startswith("**", index):
+            regex, index = regex + ".*", index + 2
+        elif pattern[index] == "*":
+            regex, index = regex + "[^/]*", index + 1
+        elif pattern[index] == "?":
+            regex, index = regex + "[^/]", index + 1
+        else:
+            regex, index = regex + re.escape(pattern[index]), index + 1
+    return re.compile(regex)
+
+
+def included_files(files, patterns) -> list:
+    """
+    :param files: paths of the files, relative to the base directory of the project
+    :param patterns: patterns of sonar.inclusions (see pattern_regex), none to include all the files
+    :returns: the files matched by one of the patterns
+    """
+    if not patterns:
+        return list(files)
+    regexes = [pattern_regex(pattern) for pattern in patterns]
+    return [path for path in files if any(regex.fullmatch(path) for regex in regexes)]
+
+
+def inclusions(files) -> str:
+    """
+    Build the value of sonar.inclusions restricting an analysis to some files
+
+    :param files: paths of the files, relative to the base directory of the project
+    :returns: the comma-separated patterns
+    """
+    patterns = []
+    for path in files:
+        # A comma separates the patterns: such a file cannot be included alone
+        if "," in path:
+            LOGGER.warning("%s cannot be part of sonar.inclusions, it is left out of the analysis", path)
+        else:
+            patterns.append(path)
+    return ",".join(patterns)
+
+
+def is_branch_analysis(base_dir: str, scanner_args) -> bool:
+    """
+    :param base_dir: base directory of the project
+    :param scanner_args: arguments of the sonar-scanner
+    :returns: whether the analysis is the one of a pull request or of a branch (see BRANCH_PROPERTIES),
+              given to the scanner or in the sonar-project.properties of the project
+    """
+    if any(arg.startswith(f"-D{name}=") for arg in scanner_args for name in BRANCH_PROPERTIES):
+        return True
+    return any(properties_value(os.path.join(base_dir, "sonar-project.properties"), name)
+               for name in BRANCH_PROPERTIES)
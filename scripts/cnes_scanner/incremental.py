@@ -0,0 +1,332 @@
+"""
+Persistent state of the C/C++ tools between analyses
+
+cppcheck and Infer keep their state in the cache mounted for the
+scanner, in a directory per project, so that only what changed since
+the previous analysis is analyzed again. A project is identified by its
+sonar.projectKey (given to the scanner or in its sonar-project.properties),
+else by the origin of its git repository and its path in the repository,
+else by its base directory: the projects are usually all mounted on
+/usr/src, whose path does not identify them.
+    - cppcheck: its build directory (--cppcheck-build-dir), in which it
+      stores the results of each file with the hash of its content;
+    - Infer: its results directory, with the capture of the translation
+      units of the compile_commands.json. A manifest records the hash of
+      the content and of the compilation command of each unit: only the
+      new or changed ones are captured again, then analyzed in reactive
+      mode (with their dependencies) along with the units calling the
+      functions they define, directly or not, whose issues depend on the
+      summaries of these functions (see calling_units); the issues of the
+      other units are kept from the previous report, without duplicates.
+      Infer runs from scratch when the
+      manifest is missing, when Infer was upgraded, when the base
+      directory of the project moved (the capture has absolute paths),
+      when a unit was removed or when a header of the project changed
+      (the manifest does not know which units include it).
+The state of a project is locked while a tool uses it: the analyses of
+the same project by containers sharing the cache run one after the
+other, and the state is not evicted meanwhile (see cache).
+
+Environment variables:
+    CNES_INCREMENTAL: set to "no" to analyze all the files with cppcheck
+                      and Infer, default: only the changed ones
+    CNES_INCREMENTAL_DIR: directory of the state of the tools,
+                          default: $SONAR_USER_HOME/cache/cnes-incremental
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+
+from . import cache
+from .lintcache import file_digest
+
+LOGGER = logging.getLogger(__name__)
+
+INFER_MANIFEST = "cnes-manifest.json"
+# Comments of C/C++, left out of the search of the functions
+C_COMMENTS = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+# Definition of a function: a name, its parameters and a block
+C_FUNCTION_DEFINITION = re.compile(r"\b([A-Za-z_]\w*)\s*\([^;{}]*\)\s*(?:const\s*)?(?:noexcept\s*)?(?:override\s*)?\{")
+# Keywords followed by parentheses and a block, which are not functions
+C_KEYWORDS = {"if", "for", "while", "switch", "catch", "return", "sizeof", "defined"}
+
+
+def incremental_enabled() -> bool:
+    """
+    :returns: whether cppcheck and Infer reuse their state of the previous analysis
+    """
+    return os.environ.get("CNES_INCREMENTAL", "yes").lower() not in ("no", "false", "0")
+
+
+def properties_value(path: str, key: str):
+    """
+    :param path: path of a properties file
+    :param key: key of a property
+    :returns: the value of the property in the file, None if there is none
+    """
+    try:
+        with open(path, "r", encoding="utf8") as properties:
+            for line in properties:
+                line = line.strip()
+                if line and not line.startswith(("#", "!")):
+                    name, _, value = line.partition("=")
+                    if name.strip() == key:
+                        return value.strip()
+    except OSError:
+        pass
+    return None
+
+
+def git_output(base_dir: str, *args) -> str:
+    """
+    :returns: the output of a git command in a directory, empty if it failed
+    """
+    try:
+        return subprocess.run(["git", "-C", base_dir, *args], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def project_id(base_dir: str, scanner_args=()) -> str:
+    """
+    Identify a project, wherever it is mounted in the container
+
+    :param base_dir: base directory of the project
+    :param scanner_args: (optional) arguments of the sonar-scanner
+    :returns: its sonar.projectKey, else the origin of its git repository and its path in the repository,
+              else its absolute base directory
+    """
+    key = properties_value(os.path.join(base_dir, "sonar-project.properties"), "sonar.projectKey")
+    for arg in scanner_args:
+        if arg.startswith("-Dsonar.projectKey="):
+            key = arg.split("=", 1)[1]
+    if key:
+        return f"key\0{key}"
+    origin = git_output(base_dir, "config", "--get", "remote.origin.url")
+    if origin:
+        return f"git\0{origin}\0{git_output(base_dir, 'rev-parse', '--show-prefix')}"
+    return f"path\0{os.path.abspath(base_dir)}"
+
+
+@contextlib.contextmanager
+def state_dir(tool: str, base_dir: str, project: str = ""):
+    """
+    Hold the state of a tool for a project: the analyses of the project by
+    other containers sharing the cache wait for this one, and the state is
+    not evicted from the cache meanwhile (see cache)
+
+    :param tool: name of the tool
+    :param base_dir: base directory of the project
+    :param project: (optional) identity of the project, default: project_id(base_dir)
+    :returns: a context yielding the directory of the state, created if needed
+    """
+    root = os.environ.get("CNES_INCREMENTAL_DIR") or os.path.join(
+        os.environ.get("SONAR_USER_HOME") or os.path.expanduser("~/.sonar"), "cache", "cnes-incremental")
+    project = hashlib.sha256((project or project_id(base_dir)).encode("utf-8")).hexdigest()[:16]
+    directory = os.path.join(root, tool, project)
+    with cache.locked(root, f"{tool}-{project}"):
+        os.makedirs(directory, exist_ok=True)
+        cache.touch(directory)
+        yield directory
+
+
+def cppcheck_build_dir(base_dir: str, project: str = ""):
+    """
+    :param base_dir: base directory of the project
+    :param project: (optional) identity of the project, default: project_id(base_dir)
+    :returns: a context yielding the build directory of cppcheck for a project (see state_dir)
+    """
+    return state_dir("cppcheck", base_dir, project)
+
+
+def compilation_units(base_dir: str, database: str = "compile_commands.json") -> dict:
+    """
+    Read the translation units of a compilation database
+
+    :param base_dir: base directory of the project
+    :param database: (optional) path of the compilation database, relative to base_dir
+    :returns: for each unit (path relative to base_dir), its entry and the hash of its command and content
+    """
+    with open(os.path.join(base_dir, database), "r", encoding="utf8") as database_file:
+        entries = json.load(database_file)
+    units = {}
+    for entry in entries:
+        if "file" not in entry:
+            raise ValueError(f"{database}: entry without file: {entry}")
+        path = os.path.normpath(os.path.join(base_dir, entry.get("directory", "."), entry["file"]))
+        command = entry.get("command") or " ".join(entry.get("arguments", []))
+        digest = file_digest(path) if os.path.isfile(path) else ""
+        units[os.path.relpath(path, base_dir)] = {
+            "entry": entry,
+            "hash": hashlib.sha256(f"{command}\0{digest}".encode("utf-8")).hexdigest()
+        }
+    return units
+
+
+def headers_digest(base_dir: str, headers) -> str:
+    """
+    :param base_dir: base directory of the project
+    :param headers: paths of the headers of the project, relative to base_dir
+    :returns: a hash of the paths and of the content of the headers
+    """
+    digest = hashlib.sha256()
+    for path in sorted(headers):
+        digest.update(f"{path}\0{file_digest(os.path.join(base_dir, path))}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def infer_changes(results_dir: str, version: str, units: dict, headers: str, base_dir: str):
+    """
+    Compare the translation units to the ones of the previous analysis
+
+    :param results_dir: results directory of Infer
+    :param version: version of Infer
+    :param units: translation units (see compilation_units)
+    :param headers: hash of the headers of the project (see headers_digest)
+    :param base_dir: absolute base directory of the project
+    :returns: the units to analyze again, None if Infer must run from scratch
+    """
+    try:
+        with open(os.path.join(results_dir, INFER_MANIFEST), "r", encoding="utf8") as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != version or manifest.get("headers") != headers \
+            or manifest.get("base_dir") != base_dir \
+            or not set(manifest.get("units", {})) <= set(units) \
+            or not os.path.isfile(os.path.join(results_dir, "report.json")):
+        return None
+    return [path for path, unit in units.items() if manifest["units"].get(path) != unit["hash"]]
+
+
+def source_text(base_dir: str, path: str) -> str:
+    """
+    :returns: the content of a C/C++ file without its comments, empty if it cannot be read
+    """
+    try:
+        with open(os.path.join(base_dir, path), "r", encoding="utf8", errors="replace") as source:
+            return C_COMMENTS.sub(" ", source.read())
+    except OSError:
+        return ""
+
+
+def calling_units(base_dir: str, units, changed) -> list:
+    """
+    Find the translation units calling, directly or not, the functions defined by changed
+    units: their issues depend on the summaries of these functions. The functions are
+    found by their names, which over-approximates the callers (e.g. homonyms)
+
+    :param base_dir: base directory of the project
+    :param units: paths of all the units, relative to base_dir
+    :param changed: paths of the changed units
+    :returns: the other units calling them
+    """
+    texts = {path: source_text(base_dir, path) for path in units}
+    affected, pending = set(changed), list(changed)
+    while pending:
+        names = {name for path in pending for name in C_FUNCTION_DEFINITION.findall(texts.get(path, ""))}
+        names -= C_KEYWORDS
+        pending = []
+        if not names:
+            break
+        call = re.compile(r"\b(?:" + "|".join(sorted(map(re.escape, names))) + r")\s*\(")
+        for path, text in texts.items():
+            if path not in affected and call.search(text):
+                affected.add(path)
+                pending.append(path)
+    return [path for path in units if path in affected and path not in set(changed)]
+
+
+def infer_issue_key(issue: dict) -> tuple:
+    """
+    :returns: the identity of an issue of Infer, reported once whatever the units it is found through
+    """
+    return issue.get("file"), issue.get("line"), issue.get("bug_type"), issue.get("procedure")
+
+
+def merge_infer_reports(previous: str, report: str, analyzed):
+    """
+    Complete the report of a reactive analysis, which only has the issues of
+    the analyzed translation units, with the issues of the other ones
+
+    :param previous: path of the report of the previous analysis
+    :param report: path of the report of the reactive analysis, overwritten
+    :param analyzed: paths of the analyzed units, relative to the base directory
+    """
+    analyzed = set(analyzed)
+    with open(report, "r", encoding="utf8") as report_file:
+        issues = json.load(report_file)
+    with open(previous, "r", encoding="utf8") as previous_file:
+        issues.extend(issue for issue in json.load(previous_file) if issue.get("file") not in analyzed)
+    # An issue of a header is reported through each unit including it
+    merged, keys = [], set()
+    for issue in issues:
+        if infer_issue_key(issue) not in keys:
+            keys.add(infer_issue_key(issue))
+            merged.append(issue)
+    with open(report, "w", encoding="utf8") as report_file:
+        json.dump(merged, report_file)
+
+
+def run_infer(base_dir: str, headers, jobs: int, database: str = "compile_commands.json", project: str = ""):
+    """
+    Run Infer on the translation units of a compilation database that changed
+    since the previous analysis and write its report to infer-out/report.json
+
+    :param base_dir: base directory of the project
+    :param headers: paths of the headers of the project, relative to base_dir
+    :param jobs: number of Infer jobs
+    :param database: (optional) path of the compilation database, relative to base_dir
+    :param project: (optional) identity of the project, default: project_id(base_dir)
+    :raises subprocess.CalledProcessError: if Infer failed
+    """
+    with state_dir("infer", base_dir, project) as results_dir:
+        version = subprocess.run(["infer", "--version"], stdout=subprocess.PIPE, check=True,
+                                 universal_newlines=True).stdout.splitlines()[0]
+        units = compilation_units(base_dir, database)
+        digest = headers_digest(base_dir, headers)
+        changed = infer_changes(results_dir, version, units, digest, os.path.abspath(base_dir))
+        options = ["--quiet", f"--results-dir={results_dir}"]
+        # The manifest is only valid once Infer succeeded
+        manifest_path = os.path.join(results_dir, INFER_MANIFEST)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        if changed is None:
+            LOGGER.info("Infer: analyzing all the %d translation units", len(units))
+            subprocess.run(["infer", "run", *options, f"--jobs={jobs}", "--compilation-database", database],
+                           cwd=base_dir, check=True)
+        elif changed:
+            callers = calling_units(base_dir, list(units), changed)
+            LOGGER.info("Infer: analyzing %d changed translation units of %d, and %d units calling them",
+                        len(changed), len(units), len(callers))
+            changed_database = os.path.join(results_dir, "cnes-changed-compile_commands.json")
+            with open(changed_database, "w", encoding="utf8") as database_file:
+                json.dump([units[path]["entry"] for path in changed], database_file)
+            changed_index = os.path.join(results_dir, "cnes-changed-files.txt")
+            # The callers are already captured, their procedures are analyzed again
+            with open(changed_index, "w", encoding="utf8") as index_file:
+                index_file.write("".join(f"{path}\n" for path in changed + callers))
+            # The reactive analysis overwrites the report with the issues of the changed units only
+            previous_report = os.path.join(results_dir, "cnes-previous-report.json")
+            os.replace(os.path.join(results_dir, "report.json"), previous_report)
+            subprocess.run(["infer", "capture", *options, "--continue", "--compilation-database", changed_database],
+                           cwd=base_dir, check=True)
+            subprocess.run(["infer", "analyze", *options, f"--jobs={jobs}", "--reactive",
+                            f"--changed-files-index={changed_index}"],
+                           cwd=base_dir, check=True)
+            merge_infer_reports(previous_report, os.path.join(results_dir, "report.json"), changed + callers)
+        else:
+            LOGGER.info("Infer: no translation unit changed since the previous analysis")
+        with open(manifest_path, "w", encoding="utf8") as manifest_file:
+            json.dump({"version": version, "headers": digest, "base_dir": os.path.abspath(base_dir),
+                       "units": {path: unit["hash"] for path, unit in units.items()}}, manifest_file)
+        os.makedirs(os.path.join(base_dir, "infer-out"), exist_ok=True)
+        shutil.copyfile(os.path.join(results_dir, "report.json"),
+                        os.path.join(base_dir, "infer-out", "report.json"))
@@ -0,0 +1,290 @@
+"""
+Conversion of the reports of the embedded tools to generic external issues
+
+SonarQube imports the issues of any tool from a JSON file in its generic
+format (sonar.externalIssuesReportPaths). The reports of the embedded
+tools are converted to it as streams: the XML reports are read with
+iterparse, the JSON ones item by item, and the issues are written as
+soon as they are read, so that the memory used does not grow with the
+size of the report:
+    - cppcheck: XML version 2 (cppcheck-report.xml),
+    - checkstyle: checkstyle XML, as written by ShellCheck (shellcheck-report.xml),
+    - pylint: text with the template of the README (pylint-report.txt),
+    - pylint-json: JSON array of pylint (--output-format=json),
+    - infer: JSON array of Infer (infer-out/report.json).
+
+The paths of the reports are remapped to be relative to the base
+directory of the project (sonar.projectBaseDir): relative paths are
+resolved from the directory the tool ran in, and prefixes of paths
+produced on another machine can be replaced beforehand.
+"""
+
+import json
+import os
+import re
+from xml.etree import ElementTree
+
+# Severity and type of the issues for the levels of each tool
+CPPCHECK_LEVELS = {
+    'error': ("CRITICAL", "BUG"),
+    'warning': ("MAJOR", "BUG"),
+    'style': ("MINOR", "CODE_SMELL"),
+    'performance': ("MINOR", "CODE_SMELL"),
+    'portability': ("MINOR", "CODE_SMELL"),
+    'information': ("INFO", "CODE_SMELL")
+}
+CHECKSTYLE_LEVELS = {
+    'error': ("MAJOR", "BUG"),
+    'warning': ("MAJOR", "CODE_SMELL"),
+    'info': ("MINOR", "CODE_SMELL"),
+    'style': ("INFO", "CODE_SMELL")
+}
+PYLINT_LEVELS = {
+    'F': ("CRITICAL", "BUG"),
+    'E': ("MAJOR", "BUG"),
+    'W': ("MAJOR", "CODE_SMELL"),
+    'R': ("MINOR", "CODE_SMELL"),
+    'C': ("MINOR", "CODE_SMELL"),
+    'I': ("INFO", "CODE_SMELL")
+}
+INFER_LEVELS = {
+    'ERROR': ("CRITICAL", "BUG"),
+    'WARNING': ("MAJOR", "BUG"),
+    'INFO': ("INFO", "CODE_SMELL")
+}
+DEFAULT_LEVEL = ("MAJOR", "CODE_SMELL")
+# Line of a pylint report with the template of the README
+PYLINT_LINE = re.compile(r"^(?P<path>[^:\n]+):(?P<line>\d+): \[(?P<msg_id>[A-Z]\d+)\((?P<symbol>[^)]*)\), "
+                         r"(?P<obj>[^\]]*)\] (?P<msg>.*)$")
+WHITESPACE = re.compile(r"\s*")
+CHUNK_SIZE = 1 << 16
+
+
+class PathMapper:
+    """
+    This class remaps the paths of a report to the base directory of the project.
+    """
+    def __init__(self, base_dir: str, source_dir: str = None, path_map=()):
+        """
+        :param base_dir: base directory of the project (sonar.projectBaseDir)
+        :param source_dir: (optional) directory the tool ran in, default: base_dir
+        :param path_map: (optional) (prefix, replacement) pairs applied first to the paths
+        """
+        self.base_dir = os.path.abspath(base_dir)
+        self.source_dir = os.path.abspath(source_dir or base_dir)
+        self.path_map = [(prefix.rstrip("/"), replacement.rstrip("/")) for prefix, replacement in path_map]
+
+    def remap(self, path: str) -> str:
+        """
+        :param path: path of a file in a report
+        :returns: its path relative to the base directory, or an absolute path if it is outside of it
+        """
+        for prefix, replacement in self.path_map:
+            if path == prefix or path.startswith(f"{prefix}/"):
+                path = replacement + path[len(prefix):]
+                break
+        path = os.path.normpath(os.path.join(self.source_dir, path))
+        relative = os.path.relpath(path, self.base_dir)
+        return path if relative.startswith("..") else relative
+
+
+def issue(engine: str, rule: str, level: tuple, message: str, path: str, line) -> dict:
+    """
+    Build an issue in the generic format
+
+    :param engine: id of the tool
+    :param rule: id of the rule of the tool
+    :param level: severity and type of the issue
+    :param message: message of the issue
+    :param path: path of the file of the issue
+    :param line: line of the issue, the issue is on the file if it is not a positive number
+    :returns: the issue
+    """
+    severity, issue_type = level
+    location = {"message": message, "filePath": path}
+    line = int(line or 0)
+    if line > 0:
+        location["textRange"] = {"startLine": line}
+    return {"engineId": engine, "ruleId": rule, "severity": severity, "type": issue_type,
+            "primaryLocation": location}
+
+
+def iter_elements(stream, tags):
+    """
+    Parse an XML document incrementally
+
+    :param stream: binary stream of the document
+    :param tags: tags of the elements to yield
+    :returns: a generator of (element, parent) pairs, the elements are removed from
+              the tree once the next one is read
+    """
+    parents = []
+    for event, element in ElementTree.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            parents.append(element)
+            continue
+        parents.pop()
+        if element.tag in tags:
+            parent = parents[-1] if parents else None
+            yield element, parent
+            if parent is not None:
+                parent.remove(element)
+            element.clear()
+
+
+def iter_json_array(stream, chunk_size: int = CHUNK_SIZE):
+    """
+    Parse a JSON array incrementally
+
+    :param stream: text stream of the array
+    :param chunk_size: (optional) number of characters read at once
+    :returns: a generator of the items of the array
+    :raises ValueError: if the document is not a JSON array
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    index = 0
+    eof = False
+    # Next token: "[" (start), an item or "]" (first), an item (item), "," or "]" (next)
+    state = "start"
+    while True:
+        index = WHITESPACE.match(buffer, index).end()
+        if index < len(buffer):
+            char = buffer[index]
+            if state == "start":
+                if char != "[":
+                    raise ValueError("The report is not a JSON array")
+                index += 1
+                state = "first"
+                continue
+            if state in ("first", "next") and char == "]":
+                return
+            if state == "next":
+                if char != ",":
+                    raise ValueError(f"Unexpected character in the JSON array: {char}")
+                index += 1
+                state = "item"
+                continue
+            try:
+                item, end = decoder.raw_decode(buffer, index)
+            except json.JSONDecodeError:
+                # The item may continue in the next chunk
+                if eof:
+                    raise
+            else:
+                # A number may also continue in the next chunk
+                if end < len(buffer) or eof:
+                    yield item
+                    index = end
+                    state = "next"
+                    continue
+        elif eof:
+            raise ValueError("Unexpected end of the JSON array")
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[index:] + chunk
+        index = 0
+
+
+def cppcheck_issues(report, paths: PathMapper):
+    """
+    :param report: binary stream of a cppcheck report (XML version 2)
+    :param paths: remapper of the paths of the report
+    :returns: a generator of the issues of the report
+    """
+    for error, _ in iter_elements(report, ("error",)):
+        location = error.find("location")
+        # Errors without location (e.g. missingInclude) are about the analysis, not about a file
+        if location is None:
+            continue
+        yield issue("cppcheck", error.get("id"), CPPCHECK_LEVELS.get(error.get("severity"), DEFAULT_LEVEL),
+                    error.get("verbose") or error.get("msg"), paths.remap(location.get("file")),
+                    location.get("line"))
+
+
+def checkstyle_issues(report, paths: PathMapper, engine: str = "shellcheck"):
+    """
+    :param report: binary stream of a checkstyle report
+    :param paths: remapper of the paths of the report
+    :param engine: (optional) id of the tool that wrote the report
+    :returns: a generator of the issues of the report
+    """
+    for error, file_element in iter_elements(report, ("error",)):
+        # ShellCheck names its rules ShellCheck.SC1234
+        rule = error.get("source", "").rsplit(".", 1)[-1]
+        yield issue(engine, rule, CHECKSTYLE_LEVELS.get(error.get("severity"), DEFAULT_LEVEL),
+                    error.get("message"), paths.remap(file_element.get("name")), error.get("line"))
+
+
+def pylint_issues(report, paths: PathMapper):
+    """
+    :param report: text stream of a pylint report with the template of the README
+    :param paths: remapper of the paths of the report
+    :returns: a generator of the issues of the report
+    """
+    for line in report:
+        match = PYLINT_LINE.match(line.rstrip("\n"))
+        if match:
+            yield issue("pylint", match["msg_id"], PYLINT_LEVELS.get(match["msg_id"][0], DEFAULT_LEVEL),
+                        match["msg"], paths.remap(match["path"]), match["line"])
+
+
+def pylint_json_issues(report, paths: PathMapper):
+    """
+    :param report: text stream of a pylint report in JSON
+    :param paths: remapper of the paths of the report
+    :returns: a generator of the issues of the report
+    """
+    for message in iter_json_array(report):
+        yield issue("pylint", message["message-id"], PYLINT_LEVELS.get(message["message-id"][0], DEFAULT_LEVEL),
+                    message["message"], paths.remap(message["path"]), message.get("line"))
+
+
+def infer_issues(report, paths: PathMapper):
+    """
+    :param report: text stream of an Infer report (report.json)
+    :param paths: remapper of the paths of the report
+    :returns: a generator of the issues of the report
+    """
+    for bug in iter_json_array(report):
+        yield issue("infer", bug["bug_type"], INFER_LEVELS.get(bug.get("severity"), DEFAULT_LEVEL),
+                    bug["qualifier"], paths.remap(bug["file"]), bug.get("line"))
+
+
+# Formats of the reports: (function, whether the report is read as binary)
+FORMATS = {
+    'cppcheck': (cppcheck_issues, True),
+    'checkstyle': (checkstyle_issues, True),
+    'pylint': (pylint_issues, False),
+    'pylint-json': (pylint_json_issues, False),
+    'infer': (infer_issues, False)
+}
+
+
+def convert(report_format: str, report: str, output: str, paths: PathMapper) -> int:
+    """
+    Convert a report to the generic format of the external issues
+
+    :param report_format: format of the report (see FORMATS)
+    :param report: path of the report
+    :param output: path of the JSON file of the issues
+    :param paths: remapper of the paths of the report
+    :returns: the number of issues
+    :raises ValueError: if the report cannot be parsed
+    """
+    function, binary = FORMATS[report_format]
+    count = 0
+    try:
+        with open(report, "rb") if binary else open(report, "r", encoding="utf8") as report_file, \
+                open(f"{output}.tmp", "w", encoding="utf8") as output_file:
+            output_file.write('{"issues": [\n')
+            for converted in function(report_file, paths):
+                output_file.write(",\n" if count else "")
+                output_file.write(json.dumps(converted))
+                count += 1
+            output_file.write("\n]}\n")
+    except (ElementTree.ParseError, KeyError, ValueError) as error:
+        os.remove(f"{output}.tmp")
+        raise ValueError(f"{report}: cannot read the report ({error})") from error
+    os.replace(f"{output}.tmp", output)
+    return count
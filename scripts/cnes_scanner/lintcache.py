@@ -0,0 +1,523 @@
+"""
+Content-hash result cache for pylint and shellcheck
+
+The results of each file are cached under a key made of:
+    - the version of the tool (and of astroid and Python for pylint),
+    - the hash of the configuration (pylintrc, shell dialect),
+    - the path of the file and the hash of its content,
+    - for pylint, the paths and the hashes of the Python files of the
+      project it imports, directly or not (see dependency_keys).
+The messages of pylint are cached with their path relative to the working
+directory: their absolute path and their module are derived from it when
+the report is rendered, so that they follow the mount point and the
+packages of the project.
+Only the files without a cached result are linted; the results of all
+the files are then merged back into one report identical to the one of
+a full run (pylint-report.txt in the template of the README, or the
+checkstyle XML of shellcheck).
+
+The pylint messages computed over several modules at once (cyclic-import,
+duplicate-code) are not cached: when the pylintrc enables them, they are
+computed by a pass of pylint on all the files with only these messages
+enabled, and reported after the ones of the files, like a full run does.
+
+Limits:
+    - the imports of a Python file are found by their names in the tree of
+      the working directory, without the other directories of sys.path;
+    - the result of a shell script does not depend on the files it sources,
+      as if they did not change;
+    - the pylint score is the one of a run without previous statistics
+      (--persistent=n), since the cache has no history.
+
+Environment variables:
+    CNES_LINT_CACHE_DIR: directory of the cache,
+                         default: $SONAR_USER_HOME/cache/cnes-lint
+"""
+
+import ast
+import configparser
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from . import cache
+
+LOGGER = logging.getLogger(__name__)
+
+# Default evaluation of pylint 2.17, overridden by the "evaluation" option of a pylintrc
+PYLINT_EVALUATION = "max(0, 0 if fatal else 10.0 - ((float(5 * error + warning + refactor + convention) / statement) * 10))"
+# Messages of pylint computed over several modules, with their id and their checker
+PYLINT_CROSS_MODULE = {'cyclic-import': ('R0401', 'imports'), 'duplicate-code': ('R0801', 'similarities')}
+# Fields of a pylint message, available in the message template
+PYLINT_FIELDS = ('msg_id', 'symbol', 'msg', 'C', 'category', 'confidence', 'abspath', 'path',
+                 'module', 'obj', 'line', 'column', 'end_line', 'end_column')
+
+
+def default_cache_dir() -> str:
+    """
+    :returns: the directory of the cache, in the cache mounted for the scanner
+    """
+    return os.environ.get("CNES_LINT_CACHE_DIR") or os.path.join(
+        os.environ.get("SONAR_USER_HOME") or os.path.expanduser("~/.sonar"), "cache", "cnes-lint")
+
+
+def file_digest(path: str) -> str:
+    """
+    :returns: the SHA-256 of the content of a file
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as content:
+        for block in iter(lambda: content.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    This class stores the results of a tool, one JSON file per source file.
+    """
+    def __init__(self, tool: str, config_key: str, cache_dir: str = ""):
+        """
+        :param tool: name of the tool
+        :param config_key: version and configuration of the tool
+        :param cache_dir: (optional) directory of the cache, default: default_cache_dir()
+        """
+        self.directory = os.path.join(cache_dir or default_cache_dir(), tool)
+        self.config_key = hashlib.sha256(config_key.encode("utf-8")).hexdigest()
+
+    def key(self, base_dir: str, path: str, dependencies: str = "") -> str:
+        """
+        :param base_dir: directory the path is relative to
+        :param path: path of the file, as given to the tool
+        :param dependencies: (optional) key of the files the results also depend on
+        :returns: the key of the results of a file
+        """
+        return hashlib.sha256(f"{self.config_key}\0{path}\0{file_digest(os.path.join(base_dir, path))}\0"
+                              f"{dependencies}".encode("utf-8")).hexdigest()
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str):
+        """
+        :returns: the cached results, None if there are none
+        """
+        try:
+            with open(self._entry(key), "r", encoding="utf8") as entry:
+                results = json.load(entry)
+        except (OSError, ValueError):
+            return None
+        # Recently used entries are the last evicted (see cache)
+        cache.touch(self._entry(key))
+        return results
+
+    def put(self, key: str, results):
+        """
+        Store results atomically: readers never see a partial entry
+        """
+        entry = self._entry(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", encoding="utf8", dir=os.path.dirname(entry),
+                                         suffix=".tmp", delete=False) as tmp:
+            json.dump(results, tmp)
+        os.replace(tmp.name, entry)
+
+    def lookup(self, base_dir: str, files, dependencies: dict = None):
+        """
+        Split files between the ones with cached results and the others
+
+        :param base_dir: directory the paths are relative to
+        :param files: paths of the files
+        :param dependencies: (optional) key of the files each file depends on (see dependency_keys)
+        :returns: the keys of the files, the cached results by file and the files to lint
+        """
+        dependencies = dependencies or {}
+        keys = {path: self.key(base_dir, path, dependencies.get(path, "")) for path in files}
+        cached = {}
+        for path, key in keys.items():
+            results = self.get(key)
+            if results is not None:
+                cached[path] = results
+        misses = [path for path in files if path not in cached]
+        LOGGER.info("%s cache: %d hits, %d misses", os.path.basename(self.directory), len(cached), len(misses))
+        return keys, cached, misses
+
+
+# pylint
+def python_index(base_dir: str) -> dict:
+    """
+    :returns: the Python files of the tree of a directory (relative to it), by the names they may be imported with
+    """
+    index = {}
+    for directory, dirs, names in os.walk(base_dir):
+        dirs[:] = [name for name in dirs if not name.startswith(".")]
+        for name in names:
+            if name.endswith(".py"):
+                path = os.path.relpath(os.path.join(directory, name), base_dir)
+                parts = path[:-len(".py")].split(os.sep)
+                if parts[-1] == "__init__":
+                    parts.pop()
+                # The file is imported relatively to any directory of its path on sys.path
+                for start in range(len(parts)):
+                    index.setdefault(".".join(parts[start:]), []).append(path)
+    return index
+
+
+def imported_names(base_dir: str, path: str) -> set:
+    """
+    :param base_dir: directory the path is relative to
+    :param path: path of a Python file
+    :returns: the names of the modules and packages the file may import, the relative imports
+              resolved from its path
+    """
+    try:
+        with open(os.path.join(base_dir, path), "rb") as source:
+            tree = ast.parse(source.read(), path)
+    except (OSError, SyntaxError, ValueError):
+        return set()
+    package = [part for part in os.path.dirname(path).split(os.sep) if part]
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            parent = []
+            if node.level:
+                parent = package[:len(package) - node.level + 1] if node.level - 1 <= len(package) else []
+            module = ".".join(parent + ([node.module] if node.module else []))
+            # The imported names may be modules of the package
+            names.update(".".join(filter(None, (module, alias.name))) for alias in node.names)
+            if module:
+                names.add(module)
+    # Importing a module imports its packages
+    return {".".join(name.split(".")[:end]) for name in names for end in range(1, name.count(".") + 2)}
+
+
+def dependency_keys(base_dir: str, files) -> dict:
+    """
+    Hash the Python files of a project imported by files, directly or not:
+    the results of pylint on a file depend on them (e.g. no-member, import-error)
+
+    :param base_dir: directory the paths are relative to
+    :param files: paths of the files
+    :returns: the key of the dependencies of each file
+    """
+    index = python_index(base_dir)
+    imports, digests = {}, {}
+
+    def imported(path):
+        if path not in imports:
+            imports[path] = {dependency for name in imported_names(base_dir, path)
+                             for dependency in index.get(name, ())}
+        return imports[path]
+
+    def digest(path):
+        if path not in digests:
+            try:
+                digests[path] = file_digest(os.path.join(base_dir, path))
+            except OSError:
+                digests[path] = ""
+        return digests[path]
+
+    keys = {}
+    for path in files:
+        closure, pending = set(), [os.path.normpath(path)]
+        while pending:
+            for dependency in imported(pending.pop()) - closure:
+                closure.add(dependency)
+                pending.append(dependency)
+        closure.discard(os.path.normpath(path))
+        keys[path] = "\0".join(f"{dependency}\0{digest(dependency)}" for dependency in sorted(closure))
+    return keys
+
+
+def pylint_module(path: str) -> str:
+    """
+    :param path: path of a Python file
+    :returns: the name of its module, as pylint names it: its path from the first directory of
+              its path which is not a package
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    names = [] if name == "__init__.py" else [os.path.splitext(name)[0]]
+    while os.path.isfile(os.path.join(directory, "__init__.py")):
+        directory, package = os.path.split(directory)
+        names.insert(0, package)
+    return ".".join(names)
+
+
+def pylint_config(rcfile: str):
+    """
+    Read the options of a pylintrc used to render a report
+
+    :returns: the evaluation expression and whether to display the score
+    """
+    parser = configparser.ConfigParser(interpolation=None, strict=False)
+    parser.read(rcfile, encoding="utf8")
+    evaluation, score = PYLINT_EVALUATION, True
+    for section in parser.sections():
+        evaluation = parser.get(section, "evaluation", fallback=evaluation)
+        score = parser.getboolean(section, "score", fallback=score)
+    return evaluation, score
+
+
+def pylint_cross_module(rcfile: str) -> list:
+    """
+    :returns: the messages computed over several modules which a pylintrc enables
+    """
+    parser = configparser.ConfigParser(interpolation=None, strict=False)
+    parser.read(rcfile, encoding="utf8")
+    disabled, enabled = set(), set()
+    for section in parser.sections():
+        for option, names in (("disable", disabled), ("enable", enabled)):
+            names.update(name.strip() for name in parser.get(section, option, fallback="").split(","))
+    selected = []
+    for symbol, (msg_id, checker) in PYLINT_CROSS_MODULE.items():
+        # A message is selected by its symbol, its id, its category, its checker or "all"
+        names = {symbol, msg_id, msg_id[0], checker, "all"}
+        if names & enabled or not names & disabled:
+            selected.append(symbol)
+    return selected
+
+
+def lint_pylint(files, rcfile: str, jobs: int = 1, options=()):
+    """
+    Run pylint in-process and collect its results by file
+
+    :param files: paths of the files to lint, relative to the working directory
+    :param rcfile: pylintrc to use
+    :param jobs: (optional) number of pylint jobs
+    :param options: (optional) other options of pylint, e.g. to select the messages
+    :returns: for each file, its messages (in emission order, without their absolute path and their
+              module, see render_pylint) and its number of statements, and the other messages in
+              emission order: the ones computed over several modules and the ones which are not on
+              a file (e.g. on the pylintrc)
+    :raises ValueError: if pylint reports a message on a Python file which is not linted
+    """
+    # pylint is only available in the image, it is imported when needed
+    from pylint.lint import Run  # pylint: disable=import-outside-toplevel
+    from pylint.reporters import CollectingReporter  # pylint: disable=import-outside-toplevel
+
+    results = {path: {"messages": [], "statements": 0} for path in files}
+    if not files:
+        return results, []
+    # pylint reports the paths of the modules it expands, normalized
+    paths = {os.path.abspath(path): path for path in files}
+    reporter = CollectingReporter()
+    run = Run([f"--rcfile={rcfile}", f"--jobs={jobs}", "--persistent=n", *options, *files],
+              reporter=reporter, exit=False)
+    # Modules of the files, as expanded by pylint (also when linting in parallel)
+    for item in run.linter._iterate_file_descrs(files):  # pylint: disable=protected-access
+        path = paths.get(os.path.abspath(item.filepath))
+        if path is not None:
+            results[path]["statements"] = run.linter.stats.by_module.get(item.name, {}).get("statement", 0)
+    other = []
+    for message in reporter.messages:
+        fields = {field: getattr(message, field) for field in PYLINT_FIELDS}
+        fields["confidence"] = message.confidence.name
+        path = paths.get(os.path.abspath(message.path)) if message.path else None
+        if path is not None and message.symbol not in PYLINT_CROSS_MODULE:
+            # Derived from the path when rendering (see render_pylint)
+            del fields["abspath"], fields["module"]
+            results[path]["messages"].append(fields)
+        elif path is None and message.path.endswith(".py"):
+            raise ValueError(f"pylint reported {message.path}, which is none of the linted files")
+        else:
+            other.append(fields)
+    return results, other
+
+
+def render_pylint(results, files, template: str, evaluation: str, score: bool, other=()) -> str:
+    """
+    Render the results of pylint like its text reporter with a message template
+
+    :param results: results by file (see lint_pylint)
+    :param files: files in the order pylint reports them
+    :param template: message template
+    :param evaluation: evaluation expression of the score
+    :param score: whether to display the score
+    :param other: (optional) other messages (see lint_pylint)
+    :returns: the report
+    """
+    # pylint reports the messages on the pylintrc first, and the ones computed over several modules last
+    messages = [message for message in other if message["symbol"] not in PYLINT_CROSS_MODULE]
+    modules = {}
+    for path in files:
+        for message in results[path]["messages"]:
+            if message["path"] not in modules:
+                modules[message["path"]] = pylint_module(message["path"])
+            messages.append(dict(message, abspath=os.path.abspath(message["path"]), module=modules[message["path"]]))
+    messages.extend(message for message in other if message["symbol"] in PYLINT_CROSS_MODULE)
+    lines = []
+    modules = set()
+    stats = {"fatal": 0, "error": 0, "warning": 0, "refactor": 0, "convention": 0, "info": 0,
+             "statement": sum(results[path]["statements"] for path in files)}
+    for message in messages:
+        if message["module"] not in modules:
+            modules.add(message["module"])
+            lines.append(f"************* Module {message['module']}" if message["module"] else "************* ")
+        fields = dict(message, end_line=message["end_line"] or "", end_column=message["end_column"] or "")
+        lines.append(template.format(**fields))
+        stats[message["category"]] = stats.get(message["category"], 0) + 1
+    report = "".join(f"{line}\n" for line in lines)
+    if score and stats["statement"]:
+        try:
+            # Same evaluation as pylint, from the trusted pylintrc
+            note = eval(evaluation, {}, stats)  # pylint: disable=eval-used
+            evaluation_message = f"Your code has been rated at {note:.2f}/10"
+        except Exception as error:  # pylint: disable=broad-except
+            evaluation_message = f"An exception occurred while rating: {error}"
+        report += f"\n{'-' * len(evaluation_message)}\n{evaluation_message}\n\n"
+    return report
+
+
+def cross_module_pylint(files, rcfile: str, jobs: int = 1):
+    """
+    Run pylint on all the files with only the messages computed over several modules
+
+    :param files: paths of all the files, relative to the working directory
+    :param rcfile: pylintrc to use
+    :param jobs: (optional) number of pylint jobs
+    :returns: the messages computed over several modules, None if the pylintrc enables none of them
+    """
+    enabled = pylint_cross_module(rcfile)
+    if not enabled or not files:
+        return None
+    _, other = lint_pylint(files, rcfile, jobs, ["--disable=all", f"--enable={','.join(enabled)}"])
+    # The messages on the pylintrc are also reported by the run of the files
+    return [message for message in other if message["symbol"] in PYLINT_CROSS_MODULE]
+
+
+def cached_pylint_results(files, rcfile: str, jobs: int = 1, cache_dir: str = "", use_cache: bool = True,
+                          cross_module: bool = True):
+    """
+    Collect the results of pylint on Python files, reusing the cached results of unchanged files
+
+    :param files: paths of the files, relative to the working directory
+    :param rcfile: pylintrc to use
+    :param jobs: (optional) number of pylint jobs for the files to lint
+    :param cache_dir: (optional) directory of the cache
+    :param use_cache: (optional) whether to reuse and store the results of the files, default: True
+    :param cross_module: (optional) whether to compute the messages over several modules, default: True
+    :returns: the results by file and the other messages (see lint_pylint): the ones which are not on a
+              file, then the ones computed over several modules
+    """
+    # pylint is only available in the image, it is imported when needed
+    import astroid  # pylint: disable=import-outside-toplevel
+    import pylint  # pylint: disable=import-outside-toplevel
+
+    if not use_cache and cross_module:
+        # A single run, like the pylint command line
+        return lint_pylint(files, rcfile, jobs)
+    result_cache = None
+    keys, results, misses = {}, {}, list(files)
+    if use_cache:
+        with open(rcfile, "rb") as config:
+            config_key = f"pylint {pylint.__version__} astroid {astroid.__version__} python {sys.version}\0" \
+                         f"{hashlib.sha256(config.read()).hexdigest()}"
+        result_cache = ResultCache("pylint", config_key, cache_dir)
+        keys, results, misses = result_cache.lookup(".", files, dependency_keys(".", files))
+    other = None
+    if misses:
+        # The messages computed over several modules depend on all the files, they are not cached
+        lint_results, other = lint_pylint(misses, rcfile, jobs, [f"--disable={','.join(PYLINT_CROSS_MODULE)}"])
+        for path, file_results in lint_results.items():
+            if result_cache is not None:
+                result_cache.put(keys[path], file_results)
+            results[path] = file_results
+    if result_cache is not None:
+        # The messages on the pylintrc are cached with the configuration, for the runs without misses
+        if other is None:
+            other = result_cache.get(result_cache.config_key)
+        else:
+            result_cache.put(result_cache.config_key, other)
+    other = other or []
+    if cross_module:
+        other += cross_module_pylint(files, rcfile, jobs) or []
+    return results, other
+
+
+def cached_pylint(files, rcfile: str, template: str, output: str, jobs: int = 1, cache_dir: str = "",
+                  use_cache: bool = True):
+    """
+    Lint Python files with pylint, reusing the cached results of unchanged files,
+    and write a report in the text format with a message template
+
+    :param files: paths of the files, relative to the working directory
+    :param rcfile: pylintrc to use
+    :param template: message template
+    :param output: path of the report
+    :param jobs: (optional) number of pylint jobs for the files to lint
+    :param cache_dir: (optional) directory of the cache
+    :param use_cache: (optional) whether to reuse and store the results of the files, default: True
+    """
+    results, other = cached_pylint_results(files, rcfile, jobs, cache_dir, use_cache)
+    evaluation, score = pylint_config(rcfile)
+    with open(output, "w", encoding="utf8") as report:
+        report.write(render_pylint(results, files, template, evaluation, score, other))
+
+
+# shellcheck
+def split_checkstyle(output: str):
+    """
+    Split the checkstyle output of shellcheck
+
+    :returns: the header, the <file> blocks and the footer
+    """
+    start = output.find("<file ")
+    end = output.rfind("</checkstyle>")
+    if start < 0 or start > end:
+        start = end
+    return output[:start], output[start:end], output[end:]
+
+
+def cached_shellcheck(files, output: str, base_dir: str = ".", shell: str = "", jobs: int = 1,
+                      cache_dir: str = "", use_cache: bool = True):
+    """
+    Lint shell scripts with shellcheck, reusing the cached results of unchanged
+    files, and write a report in the checkstyle format
+
+    :param files: paths of the files, relative to base_dir
+    :param output: path of the report
+    :param base_dir: (optional) directory shellcheck runs in, default: the working directory
+    :param shell: (optional) shell dialect given to shellcheck (-s)
+    :param jobs: (optional) number of shellcheck processes for the files to lint
+    :param cache_dir: (optional) directory of the cache
+    :param use_cache: (optional) whether to reuse and store the results of the files, default: True
+    """
+    command = ["shellcheck", "-f", "checkstyle"] + (["-s", shell] if shell else [])
+    result_cache = None
+    keys, results, misses = {}, {}, list(files)
+    if use_cache:
+        version = subprocess.run(["shellcheck", "--version"], stdout=subprocess.PIPE, check=True,
+                                 universal_newlines=True).stdout
+        result_cache = ResultCache("shellcheck", f"{version}\0{' '.join(command)}", cache_dir)
+        keys, results, misses = result_cache.lookup(base_dir, files)
+
+    def lint(path):
+        # shellcheck exits with 1 when it finds issues
+        process = subprocess.run(command + [path], cwd=base_dir, stdout=subprocess.PIPE, check=False,
+                                 universal_newlines=True)
+        if process.returncode not in (0, 1):
+            raise subprocess.CalledProcessError(process.returncode, command + [path])
+        header, blocks, footer = split_checkstyle(process.stdout)
+        return {"header": header, "blocks": blocks, "footer": footer}
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for path, file_results in zip(misses, pool.map(lint, misses)):
+            if result_cache is not None:
+                result_cache.put(keys[path], file_results)
+            results[path] = file_results
+    header, footer = "<?xml version='1.0' encoding='UTF-8'?>\n<checkstyle version='4.3'>\n", "</checkstyle>\n"
+    if files:
+        header, footer = results[files[0]]["header"], results[files[0]]["footer"]
+    with open(output, "w", encoding="utf8") as report:
+        report.write(header)
+        for path in files:
+            report.write(results[path]["blocks"])
+        report.write(footer)
+
@@ -0,0 +1,272 @@
+"""
+pylint server
+
+The pylint-server mode of the entrypoint runs a long-lived Python process
+listening on a unix socket, in which pylint, astroid, the CNES checkers
+and the ASTs of the standard library and of the installed packages stay
+loaded between runs. Each request sends the working directory and the
+arguments of a pylint command line; pylint runs in the server and its
+standard output and standard error are streamed back as frames, followed
+by its exit status, so that the client prints the same output as the
+pylint command line and exits with the same status.
+
+The runs are serialized, each one in a child process forked from the
+server: the options of its pylintrc (including the settings of astroid),
+the plugins it registers and the ASTs of the linted project are dropped
+with the child, so that the next run sees the changes of the files and
+does not inherit the configuration of the previous one. The server only
+keeps what it loaded when it started: pylint, astroid, the modules of the
+plugins of the CNES pylintrcs (imported, not registered) and the ASTs of
+the standard library.
+
+Environment variables:
+    CNES_PYLINT_SOCKET: socket of the pylint server,
+                        default: /tmp/cnes-pylint-server.sock
+"""
+
+import configparser
+import contextlib
+import glob
+import importlib
+import io
+import logging
+import os
+import site
+import socket
+import socketserver
+import struct
+import sys
+import sysconfig
+import tempfile
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = "/tmp/cnes-pylint-server.sock"
+# pylintrcs whose plugins are loaded when the server starts
+WARMUP_RCFILES = "/opt/python/pylintrc_*"
+# Frames of a response: channel (1 byte) and length (4 bytes) of the payload
+FRAME_HEADER = struct.Struct(">BI")
+EXIT, STDOUT, STDERR = 0, 1, 2
+
+
+def socket_path() -> str:
+    """
+    :returns: the path of the socket of the pylint server
+    """
+    return os.environ.get("CNES_PYLINT_SOCKET") or DEFAULT_SOCKET
+
+
+class FrameWriter(io.TextIOBase):
+    """
+    This class writes the text of a channel to a socket, as frames.
+    """
+    def __init__(self, stream, channel: int):
+        """
+        :param stream: binary stream of the socket
+        :param channel: channel of the frames (STDOUT or STDERR)
+        """
+        super().__init__()
+        self.stream = stream
+        self.channel = channel
+
+    @property
+    def encoding(self):
+        return "utf-8"
+
+    def write(self, text):
+        data = text.encode("utf-8")
+        if data:
+            self.stream.write(FRAME_HEADER.pack(self.channel, len(data)) + data)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def installed_dirs() -> tuple:
+    """
+    :returns: the directories of the standard library and of the installed packages
+    """
+    paths = sysconfig.get_paths()
+    directories = {paths[name] for name in ("stdlib", "platstdlib", "purelib", "platlib")}
+    directories.update(site.getsitepackages())
+    return tuple(os.path.join(os.path.realpath(directory), "") for directory in directories)
+
+
+def forget_project_modules(installed: tuple):
+    """
+    Drop the ASTs of the modules which are not installed and the caches of astroid
+    depending on them, to lint the changes of the files in the next run
+
+    :param installed: directories of the installed modules (see installed_dirs)
+    """
+    # pylint is only available in the image, it is imported when needed
+    import astroid.context  # pylint: disable=import-outside-toplevel
+    from astroid import MANAGER  # pylint: disable=import-outside-toplevel
+    from astroid.inference_tip import clear_inference_tip_cache  # pylint: disable=import-outside-toplevel
+
+    for name, module in list(MANAGER.astroid_cache.items()):
+        if module.file and not os.path.realpath(module.file).startswith(installed):
+            del MANAGER.astroid_cache[name]
+    # The lookups of the modules also remember the ones which were not found
+    MANAGER._mod_file_cache.clear()  # pylint: disable=protected-access
+    clear_inference_tip_cache()
+    getattr(astroid.context, "_invalidate_cache", lambda: None)()
+
+
+def run_pylint(args, stdout, stderr) -> int:
+    """
+    Run a pylint command line in this process
+
+    :param args: arguments of pylint
+    :param stdout: text stream of the standard output
+    :param stderr: text stream of the standard error
+    :returns: the exit status of pylint
+    """
+    # pylint is only available in the image, it is imported when needed
+    from pylint.lint import Run  # pylint: disable=import-outside-toplevel
+
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            Run(list(args))
+        except SystemExit as status:
+            if status.code is None or isinstance(status.code, int):
+                return status.code or 0
+            print(status.code, file=sys.stderr)
+            return 1
+        except Exception as error:  # pylint: disable=broad-except
+            print(f"pylint failed: {error!r}", file=sys.stderr)
+            return 1
+    return 0
+
+
+def run_forked(args, output) -> int:
+    """
+    Run a pylint command line in a child process, whose changes to the state
+    of pylint and astroid are dropped with it, and stream its output as frames
+
+    :param args: arguments of pylint
+    :param output: binary stream of the socket
+    :returns: the exit status of pylint
+    """
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            status = run_pylint(args, FrameWriter(output, STDOUT), FrameWriter(output, STDERR))
+            output.flush()
+        finally:
+            os._exit(status)
+    _, wait_status = os.waitpid(pid, 0)
+    return os.WEXITSTATUS(wait_status) if os.WIFEXITED(wait_status) else 1
+
+
+class PylintHandler(socketserver.StreamRequestHandler):
+    """
+    This class runs the pylint command line of a request.
+    """
+    def handle(self):
+        request = self.rfile.read().decode("utf-8").split("\0")
+        working_dir, args = request[0], request[1:]
+        previous_dir = os.getcwd()
+        try:
+            os.chdir(working_dir)
+            status = run_forked(args, self.wfile)
+        except OSError as error:
+            FrameWriter(self.wfile, STDERR).write(f"{error}\n")
+            status = 1
+        finally:
+            os.chdir(previous_dir)
+        self.wfile.write(FRAME_HEADER.pack(EXIT, 4) + struct.pack(">i", status))
+        LOGGER.info("pylint %s in %s: exit status %d", " ".join(args), working_dir, status)
+
+
+def rcfile_plugins(rcfile: str) -> list:
+    """
+    :returns: the modules of the plugins of a pylintrc (load-plugins)
+    """
+    parser = configparser.ConfigParser(interpolation=None, strict=False)
+    parser.read(rcfile, encoding="utf8")
+    plugins = []
+    for section in parser.sections():
+        plugins.extend(name.strip() for name in parser.get(section, "load-plugins", fallback="").split(","))
+    return [name for name in plugins if name]
+
+
+def warm_up(rcfiles):
+    """
+    Load pylint, astroid and the ASTs of the standard library by linting a module
+    with the default options, and import the plugins of pylintrcs: the options of
+    the pylintrcs are left to each run (see run_forked)
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        module = os.path.join(directory, "warmup.py")
+        with open(module, "w", encoding="utf8") as module_file:
+            module_file.write('"""Warm up"""\nimport os\nimport sys\n')
+        rcfile = os.path.join(directory, "pylintrc")
+        with open(rcfile, "w", encoding="utf8") as rcfile_file:
+            rcfile_file.write("[MASTER]\n")
+        run_pylint([f"--rcfile={rcfile}", "--persistent=n", module], io.StringIO(), io.StringIO())
+    for plugin in sorted({plugin for rcfile in rcfiles for plugin in rcfile_plugins(rcfile)}):
+        try:
+            importlib.import_module(plugin)
+        except ImportError as error:
+            LOGGER.warning("Cannot import the pylint plugin %s: %s", plugin, error)
+    forget_project_modules(installed_dirs())
+
+
+def serve(socket_file: str = "", rcfiles=None):
+    """
+    Run the pylint server until it is interrupted
+
+    :param socket_file: (optional) socket to listen on, default: socket_path()
+    :param rcfiles: (optional) pylintrcs to warm up, default: the ones of WARMUP_RCFILES
+    """
+    socket_file = socket_file or socket_path()
+    warm_up(sorted(glob.glob(WARMUP_RCFILES)) if rcfiles is None else rcfiles)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(socket_file)
+    with socketserver.UnixStreamServer(socket_file, PylintHandler) as server:
+        LOGGER.info("pylint server listening on %s", socket_file)
+        try:
+            server.serve_forever()
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(socket_file)
+
+
+def read_exactly(stream, size: int) -> bytes:
+    """
+    :returns: the next bytes of a stream
+    :raises ConnectionError: if the stream ends before
+    """
+    data = stream.read(size)
+    if len(data) < size:
+        raise ConnectionError("The pylint server closed the connection before the end of the run")
+    return data
+
+
+def lint(args, working_dir: str = "", socket_file: str = "") -> int:
+    """
+    Run a pylint command line in the pylint server and copy its output
+
+    :param args: arguments of pylint
+    :param working_dir: (optional) directory pylint runs in, default: the working directory
+    :param socket_file: (optional) socket of the pylint server, default: socket_path()
+    :returns: the exit status of pylint
+    """
+    request = "\0".join([os.path.abspath(working_dir or os.getcwd()), *args])
+    outputs = {STDOUT: sys.stdout.buffer, STDERR: sys.stderr.buffer}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_file or socket_path())
+        client.sendall(request.encode("utf-8"))
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile("rb") as response:
+            while True:
+                channel, length = FRAME_HEADER.unpack(read_exactly(response, FRAME_HEADER.size))
+                payload = read_exactly(response, length)
+                if channel == EXIT:
+                    for output in outputs.values():
+                        output.flush()
+                    return struct.unpack(">i", payload)[0]
+                outputs[channel].write(payload)
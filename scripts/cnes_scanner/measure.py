@@ -0,0 +1,93 @@
+"""
+Resource usage of a command
+
+The command runs as a child of this process: its wall time, its CPU time
+(user and system, of all the processes it waited for) and the peak
+resident set size of its largest process are measured by the kernel
+(getrusage of the children). The peak RSS of a process also counts the
+memory of the interpreter it was forked from, before its exec: it has a
+floor of a few MiB.
+
+SIGTERM, SIGINT and SIGHUP are forwarded to the command while it runs: as
+the final command of the entrypoint, this process is the PID 1 of the
+container, for which the kernel drops the signals without a handler, so
+that docker stop would otherwise wait for its timeout and kill the command.
+"""
+
+import contextlib
+import json
+import resource
+import signal
+import subprocess
+import sys
+import time
+
+# Signals forwarded to the measured command
+FORWARDED_SIGNALS = (signal.SIGTERM, signal.SIGINT, signal.SIGHUP)
+
+
+@contextlib.contextmanager
+def forwarded_signals(process):
+    """
+    Forward the signals stopping this process to a child process while in the context
+
+    :param process: the child process (subprocess.Popen)
+    """
+    def forward(signum, _):
+        with contextlib.suppress(ProcessLookupError):
+            process.send_signal(signum)
+
+    previous = {signum: signal.signal(signum, forward) for signum in FORWARDED_SIGNALS}
+    try:
+        yield process
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+
+
+def measure(command, cwd: str = None, on_line=None) -> dict:
+    """
+    Run a command and measure its resource usage
+
+    :param command: command line, as a list of arguments
+    :param cwd: (optional) directory to run the command in
+    :param on_line: (optional) function called with each line of the standard output of
+                    the command, which is still copied to the standard output
+    :returns: the wall time and CPU time (in seconds), the peak RSS (in KiB) and the exit status
+              (negative if the command was killed by a signal)
+    """
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.monotonic()
+    with subprocess.Popen(command, cwd=cwd, stdout=None if on_line is None else subprocess.PIPE) as process, \
+            forwarded_signals(process):
+        if on_line is not None:
+            for line in process.stdout:
+                sys.stdout.buffer.write(line)
+                sys.stdout.buffer.flush()
+                on_line(line.decode("utf-8", errors="replace").rstrip("\r\n"))
+        process.wait()
+    returncode = process.returncode
+    wall = time.monotonic() - start
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return {
+        "wall": round(wall, 3),
+        "cpu": round(cpu, 3),
+        "max_rss_kb": after.ru_maxrss,
+        "returncode": returncode
+    }
+
+
+def write_measure(command, output: str, cwd: str = None) -> dict:
+    """
+    Run a command and write its resource usage to a JSON file
+
+    :param command: command line, as a list of arguments
+    :param output: path of the JSON file
+    :param cwd: (optional) directory to run the command in
+    :returns: the resource usage (see measure)
+    """
+    usage = measure(command, cwd)
+    with open(output, "w", encoding="utf8") as usage_file:
+        json.dump(usage, usage_file)
+    return usage
@@ -0,0 +1,238 @@
+"""
+Timing and resource metrics of the stages of the entrypoint
+
+When CNES_METRICS is set, each stage run by the entrypoint (the embedded
+tools of the analyze and pr modes, then the final command, usually the
+sonar-scanner) records its wall time, CPU time and peak RSS. The output
+of the sonar-scanner is parsed for:
+    - the duration of each sensor ("Sensor ... (done) | time=...ms")
+      and the name of the sensors that did not log one,
+    - the duration of the other steps ("... (done) | time=...ms"),
+    - the duration of the upload of the analysis report,
+    - the used and committed heap of the JVM when the analysis ends
+      ("Final Memory"), not its peak: the peak memory of the sonar-scanner
+      is the peak RSS of its stage.
+A sensor or a step run several times (e.g. once per module) is recorded
+with the sum of its durations, and the Prometheus textfile has a single
+series per metric and labels: the values of the stages of the same name
+are summed, or their maximum is kept for the memory and the exit status.
+
+The metrics are written next to the project, in the directory given by
+CNES_METRICS_DIR (default: the base directory of the project):
+    - cnes-scanner-metrics.json, which gathers the stages of a run,
+    - cnes-scanner-metrics.prom (Prometheus textfile) if CNES_METRICS
+      contains "prometheus".
+
+Environment variables:
+    CNES_METRICS: comma-separated formats of the metrics (json, prometheus),
+                  default: none, the metrics are disabled
+    CNES_METRICS_DIR: directory of the metrics, default: the base directory of the project
+    CNES_METRICS_RUN: id of the run of the entrypoint, the stages of a run are
+                      gathered in the same files (set by the entrypoint)
+"""
+
+import json
+import os
+import re
+import resource
+import subprocess
+import time
+
+from . import measure
+
+METRICS_FILE = "cnes-scanner-metrics"
+FORMATS = ("json", "prometheus")
+# Lines of the output of the sonar-scanner, with or without timestamps (-X)
+SENSOR_DONE = re.compile(r"INFO: Sensor (?P<name>.+) \(done\) \| time=(?P<ms>\d+)ms")
+SENSOR_START = re.compile(r"INFO: Sensor (?P<name>.+)$")
+STEP_DONE = re.compile(r"INFO: (?P<name>.+) \(done\) \| time=(?P<ms>\d+)ms")
+UPLOAD = re.compile(r"INFO: Analysis report uploaded in (?P<ms>\d+)ms")
+FINAL_MEMORY = re.compile(r"INFO: Final Memory: (?P<used>\d+)M/(?P<total>\d+)M")
+
+
+def formats() -> list:
+    """
+    :returns: the formats of the metrics to write, none if the metrics are disabled
+    """
+    return [name for name in os.environ.get("CNES_METRICS", "").lower().split(",") if name in FORMATS]
+
+
+class ScannerOutput:
+    """
+    This class collects the metrics logged by the sonar-scanner.
+    """
+    def __init__(self):
+        self.sensors = {}
+        self.steps = {}
+        self.upload = None
+        self.jvm_heap_at_exit_mb = {}
+
+    def parse(self, line: str):
+        """
+        Collect the metrics of a line of the output
+        """
+        match = SENSOR_DONE.search(line)
+        if match:
+            # A sensor runs once per module
+            self.sensors[match["name"]] = (self.sensors.get(match["name"]) or 0) + int(match["ms"]) / 1000
+            return
+        match = STEP_DONE.search(line)
+        if match:
+            self.steps[match["name"]] = self.steps.get(match["name"], 0) + int(match["ms"]) / 1000
+            return
+        match = SENSOR_START.search(line)
+        if match:
+            # Started sensors are known even if they do not log their duration
+            self.sensors.setdefault(match["name"], None)
+            return
+        match = UPLOAD.search(line)
+        if match:
+            self.upload = int(match["ms"]) / 1000
+            return
+        match = FINAL_MEMORY.search(line)
+        if match:
+            self.jvm_heap_at_exit_mb = {"used": int(match["used"]), "committed": int(match["total"])}
+
+    def metrics(self) -> dict:
+        """
+        :returns: the metrics collected
+        """
+        return {
+            "sensors": self.sensors,
+            "steps": self.steps,
+            "upload": self.upload,
+            "jvm_heap_at_exit_mb": self.jvm_heap_at_exit_mb
+        }
+
+
+def record_stage(metrics_dir: str, stage: dict):
+    """
+    Add a stage to the metrics of the current run and write them in the enabled formats
+
+    :param metrics_dir: directory of the metrics
+    :param stage: metrics of the stage, with at least its name
+    """
+    run = os.environ.get("CNES_METRICS_RUN", "")
+    path = os.path.join(metrics_dir, f"{METRICS_FILE}.json")
+    metrics = {"run": run, "stages": []}
+    try:
+        with open(path, "r", encoding="utf8") as previous_file:
+            previous = json.load(previous_file)
+        # The stages of previous runs are replaced
+        if run and previous.get("run") == run:
+            metrics = previous
+    except (OSError, ValueError):
+        pass
+    metrics["stages"].append(stage)
+    with open(path, "w", encoding="utf8") as metrics_file:
+        json.dump(metrics, metrics_file, indent=2)
+    if "prometheus" in formats():
+        with open(os.path.join(metrics_dir, f"{METRICS_FILE}.prom"), "w", encoding="utf8") as textfile:
+            textfile.write(prometheus(metrics))
+
+
+def run_stage(name: str, command, metrics_dir: str) -> int:
+    """
+    Run a command as a stage of the entrypoint and record its metrics
+
+    :param name: name of the stage
+    :param command: command line, as a list of arguments
+    :param metrics_dir: directory of the metrics
+    :returns: the exit status of the command
+    """
+    output = ScannerOutput()
+    usage = measure.measure(command, on_line=output.parse)
+    stage = {"name": name, **usage}
+    if name == "sonar-scanner":
+        stage.update(output.metrics())
+    record_stage(metrics_dir, stage)
+    return usage["returncode"]
+
+
+def time_stage(name: str, metrics_dir: str, function, *args, **kwargs):
+    """
+    Run a function as a stage of the entrypoint and record its metrics,
+    the function is given a dictionary to fill with the wall time of its tools (timings)
+
+    :param name: name of the stage
+    :param metrics_dir: directory of the metrics
+    :param function: function to run
+    :returns: the result of the function
+    """
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.monotonic()
+    timings = {}
+    returncode = 1
+    try:
+        result = function(*args, timings=timings, **kwargs)
+        returncode = 0
+        return result
+    except subprocess.CalledProcessError as error:
+        returncode = error.returncode
+        raise
+    finally:
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        record_stage(metrics_dir, {
+            "name": name,
+            "wall": round(time.monotonic() - start, 3),
+            "cpu": round((after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime), 3),
+            "max_rss_kb": after.ru_maxrss,
+            "returncode": returncode,
+            "tools": timings
+        })
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def prometheus(metrics: dict) -> str:
+    """
+    Render metrics in the Prometheus text format
+
+    :param metrics: metrics of a run (as written to the JSON file)
+    :returns: the textfile
+    """
+    # Type, description and aggregation of the samples of the same labels of each metric
+    families = {
+        "cnes_scanner_stage_seconds": ("gauge", "Wall time of a stage of the entrypoint", sum, {}),
+        "cnes_scanner_stage_cpu_seconds": ("gauge", "CPU time of a stage of the entrypoint", sum, {}),
+        "cnes_scanner_stage_max_rss_bytes": ("gauge", "Peak RSS of the largest process of a stage", max, {}),
+        "cnes_scanner_stage_exit_status": ("gauge", "Exit status of a stage of the entrypoint", max, {}),
+        "cnes_scanner_tool_seconds": ("gauge", "Wall time of an embedded tool", sum, {}),
+        "cnes_scanner_sensor_seconds": ("gauge", "Duration of a sensor of the sonar-scanner", sum, {}),
+        "cnes_scanner_step_seconds": ("gauge", "Duration of a step of the sonar-scanner", sum, {}),
+        "cnes_scanner_upload_seconds": ("gauge", "Duration of the upload of the analysis report", sum, {}),
+        "cnes_scanner_jvm_heap_at_exit_bytes": ("gauge", "Used and committed heap of the JVM of the sonar-scanner "
+                                                "when the analysis ends", max, {})
+    }
+
+    def add(name, labels, value):
+        families[name][3].setdefault(labels, []).append(value)
+
+    for stage in metrics["stages"]:
+        labels = f'stage="{_label(stage["name"])}"'
+        add("cnes_scanner_stage_seconds", labels, stage["wall"])
+        add("cnes_scanner_stage_cpu_seconds", labels, stage["cpu"])
+        add("cnes_scanner_stage_max_rss_bytes", labels, stage["max_rss_kb"] * 1024)
+        add("cnes_scanner_stage_exit_status", labels, stage["returncode"])
+        for tool, seconds in stage.get("tools", {}).items():
+            add("cnes_scanner_tool_seconds", f'tool="{_label(tool)}"', seconds)
+        for sensor, seconds in stage.get("sensors", {}).items():
+            if seconds is not None:
+                add("cnes_scanner_sensor_seconds", f'sensor="{_label(sensor)}"', seconds)
+        for step, seconds in stage.get("steps", {}).items():
+            add("cnes_scanner_step_seconds", f'step="{_label(step)}"', seconds)
+        if stage.get("upload") is not None:
+            add("cnes_scanner_upload_seconds", "", stage["upload"])
+        for kind, megabytes in stage.get("jvm_heap_at_exit_mb", {}).items():
+            add("cnes_scanner_jvm_heap_at_exit_bytes", f'kind="{kind}"', megabytes * 1024 * 1024)
+    lines = []
+    for name, (metric_type, description, aggregate, samples) in families.items():
+        if samples:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, values in samples.items():
+                value = round(aggregate(values), 3)
+                lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+    return "".join(f"{line}\n" for line in lines)
@@ -0,0 +1,193 @@
+"""
+Prewarm of the cache of the sonar-scanner
+
+The sonar-scanner downloads the scanner engine and the plugins of the
+server at the beginning of each analysis, unless they are already in its
+cache ($SONAR_USER_HOME/cache/<md5 of the file>/<name of the file>).
+This module fills the cache with the files of a server (under the lock
+of each file, with a use-stamp recording them for the eviction, see
+cache), checks their MD5 checksums against the ones
+published by the server, and writes a manifest of the cache keyed by
+the version of the server:
+    $SONAR_USER_HOME/cache/cnes-prewarm/<server version>.json
+
+It can also write the build context of an image derived from this one,
+with the cache baked in.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from . import cache
+
+LOGGER = logging.getLogger(__name__)
+
+# Number of concurrent downloads
+DOWNLOADS = 8
+# Dockerfile of the derived image with the cache baked in
+DERIVED_DOCKERFILE = """\
+# Image with the cache of the sonar-scanner prewarmed for SonarQube {version}
+FROM {base_image}
+COPY --chown=sonar-scanner:sonar-scanner cache/ /opt/sonar-scanner/.sonar/cache/
+"""
+
+
+def default_cache_dir() -> str:
+    """
+    :returns: the cache directory of the sonar-scanner
+    """
+    return os.path.join(os.environ.get("SONAR_USER_HOME") or os.path.expanduser("~/.sonar"), "cache")
+
+
+class ServerFiles:
+    """
+    This class lists and downloads the files the sonar-scanner needs from a server.
+    """
+    def __init__(self, url: str, token: str = ""):
+        """
+        :param url: URL of the server
+        :param token: (optional) token of a user of the server
+        """
+        self.url = url.rstrip("/")
+        self.headers = {}
+        if token:
+            self.headers["Authorization"] = "Basic " + base64.b64encode(f"{token}:".encode("utf-8")).decode("ascii")
+
+    def open(self, api: str, **params):
+        """
+        Send a GET request to the server
+
+        :returns: the response, a file-like object
+        """
+        query = f"?{urllib.parse.urlencode(params)}" if params else ""
+        return urllib.request.urlopen(urllib.request.Request(f"{self.url}/{api}{query}", headers=self.headers))
+
+    def version(self) -> str:
+        """
+        :returns: the version of the server
+        """
+        with self.open("api/server/version") as response:
+            return response.read().decode("utf-8").strip()
+
+    def files(self):
+        """
+        List the files of the scanner engine and of the plugins
+
+        :returns: a list of (name, md5, api, params) to download each file
+        """
+        files = []
+        with self.open("batch/index") as response:
+            for line in response.read().decode("utf-8").splitlines():
+                name, _, md5 = line.partition("|")
+                if md5:
+                    files.append((name, md5, "batch/file", {"name": name}))
+        with self.open("api/plugins/installed") as response:
+            for plugin in json.load(response)["plugins"]:
+                files.append((plugin["filename"], plugin["hash"], "api/plugins/download", {"plugin": plugin["key"]}))
+        return files
+
+
+def md5sum(path: str) -> str:
+    """
+    :returns: the MD5 of the content of a file
+    """
+    digest = hashlib.md5()
+    with open(path, "rb") as content:
+        for block in iter(lambda: content.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fetch(server: ServerFiles, cache_dir: str, name: str, md5: str, api: str, params: dict) -> bool:
+    """
+    Download a file to the cache, unless it is already there
+
+    :returns: whether the file was downloaded
+    :raises ValueError: if the checksum of the downloaded file does not match
+    """
+    target = os.path.join(cache_dir, md5, name)
+    # The containers sharing the cache wait for the one downloading the file
+    with cache.locked(cache_dir, md5):
+        if os.path.isfile(target) and md5sum(target) == md5:
+            cache.stamp(cache_dir, md5)
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Downloaded next to the target and moved once checked: the cache never holds a partial file
+        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(target), suffix=".tmp", delete=False) as tmp:
+            try:
+                with server.open(api, **params) as response:
+                    shutil.copyfileobj(response, tmp)
+            except BaseException:
+                os.remove(tmp.name)
+                raise
+        if md5sum(tmp.name) != md5:
+            os.remove(tmp.name)
+            raise ValueError(f"Checksum mismatch for {name}: expected {md5}")
+        os.replace(tmp.name, target)
+        cache.stamp(cache_dir, md5)
+    return True
+
+
+def prewarm(url: str, token: str = "", version: str = "", cache_dir: str = "") -> dict:
+    """
+    Fill the cache of the sonar-scanner with the files of a server
+
+    :param url: URL of the server
+    :param token: (optional) token of a user of the server
+    :param version: (optional) expected version of the server
+    :param cache_dir: (optional) cache directory, default: $SONAR_USER_HOME/cache
+    :returns: the manifest of the cache
+    :raises ValueError: if the version of the server is not the expected one or a checksum does not match
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    server = ServerFiles(url, token)
+    server_version = server.version()
+    if version and server_version != version:
+        raise ValueError(f"{url} runs SonarQube {server_version}, not {version}")
+    files = server.files()
+    with ThreadPoolExecutor(max_workers=DOWNLOADS) as pool:
+        downloaded = list(pool.map(lambda file: fetch(server, cache_dir, *file), files))
+    LOGGER.info("%d files downloaded, %d already in the cache", sum(downloaded), len(files) - sum(downloaded))
+    manifest = {
+        "server": {"url": server.url, "version": server_version},
+        "files": [{"name": name, "md5": md5, "path": f"{md5}/{name}"} for name, md5, _, _ in files]
+    }
+    manifest_path = os.path.join(cache_dir, "cnes-prewarm", f"{server_version}.json")
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", encoding="utf8", dir=os.path.dirname(manifest_path), suffix=".tmp",
+                                     delete=False) as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(manifest_file.name, manifest_path)
+    LOGGER.info("Manifest written to %s", manifest_path)
+    return manifest
+
+
+def write_image_context(manifest: dict, context_dir: str, base_image: str, cache_dir: str = ""):
+    """
+    Write the build context of an image derived from this one with the cache baked in
+
+    :param manifest: manifest of the cache (see prewarm)
+    :param context_dir: directory of the build context
+    :param base_image: image to derive from
+    :param cache_dir: (optional) cache directory the manifest describes, default: $SONAR_USER_HOME/cache
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    version = manifest["server"]["version"]
+    for cached in manifest["files"]:
+        target = os.path.join(context_dir, "cache", cached["path"])
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copy2(os.path.join(cache_dir, cached["path"]), target)
+    manifest_target = os.path.join(context_dir, "cache", "cnes-prewarm", f"{version}.json")
+    os.makedirs(os.path.dirname(manifest_target), exist_ok=True)
+    shutil.copy2(os.path.join(cache_dir, "cnes-prewarm", f"{version}.json"), manifest_target)
+    with open(os.path.join(context_dir, "Dockerfile"), "w", encoding="utf8") as dockerfile:
+        dockerfile.write(DERIVED_DOCKERFILE.format(version=version, base_image=base_image))
+    LOGGER.info("Build context of the derived image written to %s", context_dir)
@@ -0,0 +1,215 @@
+"""
+Resources available to the container
+
+The CPUs and the memory of the container are the ones of its cgroup
+(v2: cpu.max and memory.max, v1: cpu.cfs_quota_us, cpu.cfs_period_us
+and memory.limit_in_bytes), bounded by the CPUs the process may run on
+and by the memory of the host. They size:
+    - the heap (-Xmx) and the processors (-XX:ActiveProcessorCount) of
+      the JVM of the sonar-scanner, unless its options already set them,
+    - the jobs of the embedded tools (see analyze), bounded by the
+      memory a job of each tool needs.
+
+Environment variables:
+    CNES_AUTOTUNE: set to "no" to ignore the limits of the cgroup and to
+                   leave the options of the JVM unchanged, default: yes
+    CNES_CPUS: number of CPUs of the container, default: detected
+    CNES_MEMORY: memory of the container (e.g. 4G), default: detected
+"""
+
+import logging
+import math
+import os
+import re
+
+from .cache import parse_size
+
+LOGGER = logging.getLogger(__name__)
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+# Heap of the sonar-scanner, in percent of the memory of the container
+HEAP_PERCENT = 50
+# Smallest heap given to the sonar-scanner (in MiB)
+MIN_HEAP = 256
+# Memory of a job of each tool (in MiB)
+TOOL_JOB_MEMORY = {'cppcheck': 256, 'infer': 1024, 'pylint': 256, 'shellcheck': 64}
+# Options of the JVM sizing its heap
+HEAP_OPTIONS = re.compile(r"(^|\s)-(Xmx|XX:MaxHeapSize=|XX:MaxRAM=|XX:MaxRAMPercentage=|XX:MaxRAMFraction=)")
+
+
+def autotune_enabled() -> bool:
+    """
+    :returns: whether the resources are derived from the limits of the cgroup
+    """
+    return os.environ.get("CNES_AUTOTUNE", "yes").lower() not in ("no", "false", "0")
+
+
+def cgroup_paths() -> dict:
+    """
+    :returns: the path of the cgroup of the process for each controller of cgroup v1, and for "" (cgroup v2)
+    """
+    paths = {}
+    try:
+        with open("/proc/self/cgroup", "r", encoding="utf8") as cgroups:
+            for line in cgroups:
+                _, controllers, path = line.rstrip("\n").split(":", 2)
+                for controller in controllers.split(","):
+                    paths[controller] = path
+    except (OSError, ValueError):
+        pass
+    return paths
+
+
+def read_cgroup(paths: dict, controller: str, name: str):
+    """
+    Read a file of the cgroup of the process
+
+    :param paths: paths of the cgroup of the process (see cgroup_paths)
+    :param controller: controller of cgroup v1 (e.g. memory), "" for cgroup v2
+    :param name: name of the file
+    :returns: the content of the file, None if there is none
+    """
+    mount = os.path.join(CGROUP_ROOT, controller) if controller else CGROUP_ROOT
+    path = paths.get(controller, "/").lstrip("/")
+    # With a cgroup namespace, the cgroup of the container is mounted as the root
+    for directory in (os.path.join(mount, path), mount):
+        try:
+            with open(os.path.join(directory, name), "r", encoding="utf8") as cgroup_file:
+                return cgroup_file.read().strip()
+        except OSError:
+            continue
+    return None
+
+
+def cpu_quota(paths: dict):
+    """
+    :param paths: paths of the cgroup of the process (see cgroup_paths)
+    :returns: the CPU quota of the cgroup of the process (in CPUs), None if there is none
+    """
+    try:
+        cpu_max = read_cgroup(paths, "", "cpu.max")
+        if cpu_max is not None:
+            quota, _, period = cpu_max.partition(" ")
+            return None if quota == "max" else int(quota) / int(period or 100000)
+        quota = read_cgroup(paths, "cpu", "cpu.cfs_quota_us")
+        period = read_cgroup(paths, "cpu", "cpu.cfs_period_us")
+        if quota is None or period is None or int(quota) <= 0:
+            return None
+        return int(quota) / int(period)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def physical_memory() -> int:
+    """
+    :returns: the memory of the host, in bytes
+    """
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+
+def memory_limit(paths: dict):
+    """
+    :param paths: paths of the cgroup of the process (see cgroup_paths)
+    :returns: the memory limit of the cgroup of the process (in bytes), None if there is none
+    """
+    limit = read_cgroup(paths, "", "memory.max")
+    if limit is None:
+        limit = read_cgroup(paths, "memory", "memory.limit_in_bytes")
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return None
+    # cgroup v1 reports no limit as a huge number
+    return limit if 0 < limit < physical_memory() else None
+
+
+def affinity_cpus() -> int:
+    """
+    :returns: the number of CPUs the process may run on
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def configured_cpus(value: str) -> int:
+    """
+    :param value: value of CNES_CPUS
+    :returns: the number of CPUs
+    :raises ValueError: if it is not a positive number of CPUs
+    """
+    try:
+        cpus = int(value)
+    except ValueError:
+        cpus = 0
+    if cpus < 1:
+        raise ValueError(f"Invalid CNES_CPUS: {value} (expected a positive number of CPUs, e.g. 4)")
+    return cpus
+
+
+def configured_memory(value: str) -> int:
+    """
+    :param value: value of CNES_MEMORY
+    :returns: the memory, in bytes
+    :raises ValueError: if it is not a positive size
+    """
+    try:
+        memory = parse_size(value)
+    except ValueError:
+        memory = 0
+    if memory < 1:
+        raise ValueError(f"Invalid CNES_MEMORY: {value} (expected a size with an optional K, M, G or T suffix, "
+                         "e.g. 4G)")
+    return memory
+
+
+def limits() -> dict:
+    """
+    Read the resources of the container, once for all the tools and sonar-scanners of a command
+
+    :returns: the CPUs and the memory (in bytes) of the container, and where they come from
+    :raises ValueError: if CNES_CPUS or CNES_MEMORY is invalid
+    """
+    cpus, cpus_from = affinity_cpus(), "affinity"
+    memory, memory_from = physical_memory(), "host"
+    if autotune_enabled():
+        paths = cgroup_paths()
+        quota = cpu_quota(paths)
+        if quota is not None and math.ceil(quota) < cpus:
+            cpus, cpus_from = max(1, math.ceil(quota)), "cgroup quota"
+        limit = memory_limit(paths)
+        if limit is not None:
+            memory, memory_from = limit, "cgroup limit"
+    if os.environ.get("CNES_CPUS"):
+        cpus, cpus_from = configured_cpus(os.environ["CNES_CPUS"]), "CNES_CPUS"
+    if os.environ.get("CNES_MEMORY"):
+        memory, memory_from = configured_memory(os.environ["CNES_MEMORY"]), "CNES_MEMORY"
+    return {"cpus": cpus, "cpus_from": cpus_from, "memory": memory, "memory_from": memory_from}
+
+
+def tool_jobs(tool: str, cpus: int, memory: int) -> int:
+    """
+    :param tool: name of the tool
+    :param cpus: number of CPUs given to the tool
+    :param memory: memory given to the tool, in bytes
+    :returns: the number of jobs of the tool, bounded by the memory a job needs
+    """
+    return max(1, min(cpus, memory // (TOOL_JOB_MEMORY.get(tool, 256) << 20)))
+
+
+def jvm_options(options: str, memory: int, cpus: int) -> str:
+    """
+    Size the heap and the processors of a JVM, unless its options already set them
+
+    :param options: options of the JVM
+    :param memory: memory given to the JVM, in bytes
+    :param cpus: number of CPUs given to the JVM
+    :returns: the options of the JVM
+    """
+    added = []
+    if not HEAP_OPTIONS.search(options):
+        added.append(f"-Xmx{max(MIN_HEAP, (memory >> 20) * HEAP_PERCENT // 100)}m")
+    if "-XX:ActiveProcessorCount=" not in options:
+        added.append(f"-XX:ActiveProcessorCount={cpus}")
+    return " ".join(option for option in (options.strip(), *added) if option)
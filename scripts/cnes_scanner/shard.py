@@ -0,0 +1,199 @@
+"""
+pylint sharded across the nodes of a CI matrix
+
+The Python files of a project are split into N shards, the same way on
+every node: each node lints its shard and writes its results (by file,
+see lintcache.lint_pylint) to a JSON file, and a final step merges the
+results of all the shards into one report, rendered like the one of
+a single node (`python3 -m cnes_scanner lint pylint`, see lintcache):
+    - the messages are in the order of the list of all the files,
+    - the score is computed from the statements of all the files,
+    - the messages which are not on a file (e.g. on the pylintrc) are
+      the ones of the shards, reported once,
+    - the messages computed over several modules (cyclic-import,
+      duplicate-code) are left out of the shards, and computed by the
+      merge step with a pass of pylint on all the files (see
+      lintcache.cross_module_pylint): it needs the sources of the project.
+
+The files are assigned to the shards to balance their estimated cost
+(costliest first, to the least loaded shard):
+    - size: the size of each file,
+    - history: the time spent on each file by a previous run (written
+      by the merge step), the size of the new files is converted to a
+      time with the average time per byte of the known ones.
+
+Environment variables:
+    CI_NODE_TOTAL: default number of shards (as set by GitLab CI parallel jobs)
+    CI_NODE_INDEX: default index of the shard of the node, from 1
+"""
+
+import json
+import logging
+import os
+import time
+
+from . import lintcache
+
+LOGGER = logging.getLogger(__name__)
+
+WEIGHTS = ("size", "history")
+
+
+def read_history(history: str) -> dict:
+    """
+    :param history: path of the history written by a previous merge, if any
+    :returns: the time spent on each file, empty if there is no history
+    """
+    if not history:
+        return {}
+    try:
+        with open(history, "r", encoding="utf8") as history_file:
+            return json.load(history_file)
+    except (OSError, ValueError):
+        LOGGER.warning("No history in %s, the files are split by size", history)
+        return {}
+
+
+def file_costs(files, weights: str = "size", history: str = "") -> dict:
+    """
+    Estimate the cost of linting each file
+
+    :param files: paths of the files, relative to the working directory
+    :param weights: (optional) estimation of the cost (see WEIGHTS)
+    :param history: (optional) path of the history, for the history weights
+    :returns: the cost of each file
+    """
+    sizes = {path: os.path.getsize(path) for path in files}
+    times = read_history(history) if weights == "history" else {}
+    known = [path for path in files if path in times]
+    known_size = sum(sizes[path] for path in known)
+    if not known or not known_size:
+        return sizes
+    rate = sum(times[path] for path in known) / known_size
+    return {path: times.get(path, sizes[path] * rate) for path in files}
+
+
+def split(files, count: int, weights: str = "size", history: str = "") -> list:
+    """
+    Split files into shards of balanced costs, the same way on every node
+
+    :param files: paths of the files, relative to the working directory
+    :param count: number of shards
+    :param weights: (optional) estimation of the cost of the files (see WEIGHTS)
+    :param history: (optional) path of the history, for the history weights
+    :returns: the files of each shard, in the order of the list of all the files
+    """
+    costs = file_costs(files, weights, history)
+    loads = [0.0] * count
+    assigned = {}
+    # Costly files first, ties broken by path so that every node gets the same shards
+    for path in sorted(files, key=lambda path: (-costs[path], path)):
+        index = min(range(count), key=lambda shard: (loads[shard], shard))
+        assigned[path] = index
+        loads[index] += costs[path]
+    return [[path for path in files if assigned[path] == index] for index in range(count)]
+
+
+def shard_files(files, count: int, index: int, weights: str = "size", history: str = "") -> list:
+    """
+    :param files: paths of all the files, relative to the working directory
+    :param count: number of shards
+    :param index: index of the shard, from 1
+    :param weights: (optional) estimation of the cost of the files (see WEIGHTS)
+    :param history: (optional) path of the history, for the history weights
+    :returns: the files of a shard (see split)
+    :raises ValueError: if the index is not the one of a shard
+    """
+    if not 1 <= index <= count:
+        raise ValueError(f"The index of the shard must be between 1 and {count}, not {index}")
+    return split(files, count, weights, history)[index - 1]
+
+
+def run_shard(files, count: int, index: int, rcfile: str, output: str, jobs: int = 1, weights: str = "size",
+              history: str = "", use_cache: bool = True):
+    """
+    Lint the files of a shard with pylint and write its results
+
+    :param files: paths of all the files, relative to the working directory, in the order of the report
+    :param count: number of shards
+    :param index: index of the shard, from 1
+    :param rcfile: pylintrc to use
+    :param output: path of the JSON file of the results of the shard
+    :param jobs: (optional) number of pylint jobs
+    :param weights: (optional) estimation of the cost of the files (see WEIGHTS)
+    :param history: (optional) path of the history, for the history weights
+    :param use_cache: (optional) whether to reuse the cached results of unchanged files (see lintcache)
+    :raises ValueError: if the index is not the one of a shard
+    """
+    paths = shard_files(files, count, index, weights, history)
+    LOGGER.info("Shard %d/%d: %d of %d files", index, count, len(paths), len(files))
+    start = time.monotonic()
+    results, other = lintcache.cached_pylint_results(paths, rcfile, jobs, use_cache=use_cache, cross_module=False)
+    evaluation, score = lintcache.pylint_config(rcfile)
+    with open(output, "w", encoding="utf8") as shard_file:
+        json.dump({
+            "shard": index,
+            "shards": count,
+            "files": list(files),
+            "rcfile": rcfile,
+            "evaluation": evaluation,
+            "score": score,
+            "wall": round(time.monotonic() - start, 3),
+            "sizes": {path: os.path.getsize(path) for path in paths},
+            "results": results,
+            "messages": other
+        }, shard_file)
+
+
+def merge(shard_outputs, template: str, output: str, history: str = "", jobs: int = 1):
+    """
+    Merge the results of all the shards into one pylint report
+
+    :param shard_outputs: paths of the JSON files of the results of the shards
+    :param template: message template
+    :param output: path of the report
+    :param history: (optional) path of the history to write, for the history weights of the next runs
+    :param jobs: (optional) number of pylint jobs of the pass on all the files
+    :raises ValueError: if the shards are not the ones of a single split, or do not cover each file once
+    """
+    shards = []
+    for shard_output in shard_outputs:
+        with open(shard_output, "r", encoding="utf8") as shard_file:
+            shards.append(json.load(shard_file))
+    if not shards:
+        raise ValueError("No shard to merge")
+    files = shards[0]["files"]
+    count = shards[0]["shards"]
+    if any(shard["files"] != files or shard["shards"] != count or shard["rcfile"] != shards[0]["rcfile"]
+           for shard in shards):
+        raise ValueError("The shards were not split from the same files with the same pylintrc")
+    indexes = sorted(shard["shard"] for shard in shards)
+    if indexes != list(range(1, count + 1)):
+        raise ValueError(f"Expected the {count} shards once each, got {indexes}")
+    results = {}
+    for shard in shards:
+        overlap = sorted(set(shard["results"]) & set(results))
+        if overlap:
+            raise ValueError(f"{', '.join(overlap)} linted by several shards (split with different histories?)")
+        results.update(shard["results"])
+    uncovered = [path for path in files if path not in results] or sorted(set(results) - set(files))
+    if uncovered:
+        raise ValueError(f"The shards do not cover the files exactly: {', '.join(uncovered)}")
+    # Each shard reports the messages which are not on a file, e.g. on the pylintrc
+    other = []
+    for shard in sorted(shards, key=lambda shard: shard["shard"]):
+        other.extend(message for message in shard["messages"] if message not in other)
+    # The messages computed over several modules depend on the files of all the shards
+    other += lintcache.cross_module_pylint(files, shards[0]["rcfile"], jobs) or []
+    with open(output, "w", encoding="utf8") as report:
+        report.write(lintcache.render_pylint(results, files, template, shards[0]["evaluation"], shards[0]["score"],
+                                              other))
+    if history:
+        # The time of a shard is spread over its files by size
+        times = {}
+        for shard in shards:
+            total = sum(shard["sizes"].values())
+            for path, size in shard["sizes"].items():
+                times[path] = round(shard["wall"] * size / total, 6) if total else 0.0
+        with open(history, "w", encoding="utf8") as history_file:
+            json.dump(times, history_file, indent=2, sort_keys=True)
@@ -0,0 +1,62 @@
+"""
+Client of the warm sonar-scanner
+
+The warm mode of the entrypoint runs a long-lived sonar-scanner
+(WarmScanner) listening on a unix socket. Each request sends the working
+directory and the arguments of an analysis, the logs of the analysis are
+streamed back and followed by its exit status.
+
+Environment variables:
+    CNES_WARM_SOCKET: socket of the warm sonar-scanner,
+                      default: /tmp/cnes-warm-scanner.sock
+"""
+
+import os
+import socket
+import sys
+
+DEFAULT_SOCKET = "/tmp/cnes-warm-scanner.sock"
+# Properties read from the environment by the sonar-scanner, given explicitly to the warm one
+ENV_PROPERTIES = (
+    ("SONAR_HOST_URL", "sonar.host.url"),
+    ("SONAR_TOKEN", "sonar.token"),
+    ("SONAR_LOGIN", "sonar.login"),
+    ("SONAR_PASSWORD", "sonar.password"),
+    ("SONAR_PROJECT_BASE_DIR", "sonar.projectBaseDir")
+)
+
+
+def socket_path() -> str:
+    """
+    :returns: the path of the socket of the warm sonar-scanner
+    """
+    return os.environ.get("CNES_WARM_SOCKET") or DEFAULT_SOCKET
+
+
+def scan(scanner_args, working_dir: str = "", output=None, socket_file: str = "") -> int:
+    """
+    Run an analysis with the warm sonar-scanner
+
+    :param scanner_args: arguments of the sonar-scanner
+    :param working_dir: (optional) directory the analysis is run from, default: the working directory
+    :param output: (optional) binary stream to copy the logs to, default: the standard output
+    :param socket_file: (optional) socket of the warm sonar-scanner, default: socket_path()
+    :returns: the exit status of the analysis
+    """
+    output = output or sys.stdout.buffer
+    args = [f"-D{key}={os.environ[name]}" for name, key in ENV_PROPERTIES
+            if os.environ.get(name) and not any(arg.startswith(f"-D{key}=") for arg in scanner_args)]
+    args.extend(scanner_args)
+    request = "\0".join([os.path.abspath(working_dir or os.getcwd()), *args])
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_file or socket_path())
+        client.sendall(request.encode("utf-8"))
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile("rb") as response:
+            for line in response:
+                if line.startswith(b"\0"):
+                    return int(line[1:])
+                output.write(line)
+                output.flush()
+    raise ConnectionError("The warm sonar-scanner closed the connection before the end of the analysis")
+
@@ -13,17 +13,132 @@ add_env_var_as_env_prop() {
   fi
 }
 
+# Cache shared by the containers of the host (see cnes_scanner/cache.py): fill it
+# under locks with the files of the server, then evict its least recently used entries
+prepare_cache() {
+  if [[ "${CNES_CACHE_POPULATE:-no}" =~ ^(yes|true|1)$ ]] && [ -n "${SONAR_HOST_URL:-}" ]; then
+    python3 -m cnes_scanner prewarm || echo "WARN: the cache was not populated, the sonar-scanner will download its files" >&2
+  fi
+  if [ -n "${CNES_CACHE_MAX_SIZE:-}" ]; then
+    python3 -m cnes_scanner evict || echo "WARN: the cache was not evicted" >&2
+  fi
+}
+
+# Shared lock of the cache held until the sonar-scanner exits (the file descriptor is inherited
+# through exec): the eviction leaves the files of the sonar-scanner alone while it runs
+hold_scanner_lock() {
+  local lock_dir="${SONAR_USER_HOME:-$HOME/.sonar}/cache/.cnes-locks"
+  if mkdir -p "$lock_dir" 2>/dev/null && touch "$lock_dir/scanner.lock" 2>/dev/null; then
+    exec {scanner_lock}>>"$lock_dir/scanner.lock"
+    flock -s "$scanner_lock"
+  fi
+}
+
+# Warm sonar-scanner started by the batch mode (see cnes_scanner/batch.py): the batch already
+# prepared the cache, holds its lock and gave the options of the JVM
+warm_worker=no
+if [[ "${CNES_WARM_WORKER:-no}" =~ ^(yes|true|1)$ ]]; then
+  warm_worker=yes
+fi
+
+# Class data sharing archive generated at build time, options of the user come after it
+cds_archive="${SONAR_SCANNER_HOME:-/opt/sonar-scanner}/lib/sonar-scanner.jsa"
+if [ -f "$cds_archive" ] && [ "$warm_worker" = no ]; then
+  export SONAR_SCANNER_OPTS="-XX:SharedArchiveFile=$cds_archive ${SONAR_SCANNER_OPTS:-}"
+fi
+
+# Heap and processors of the JVM sized to the CPU quota and the memory limit of the container
+# (see cnes_scanner/resources.py), the options given in SONAR_SCANNER_OPTS win
+tune_jvm() {
+  local autotune="${CNES_AUTOTUNE:-yes}" options
+  case "${autotune,,}" in
+    no|false|0) return ;;
+  esac
+  if options="$(python3 -m cnes_scanner jvm-options)"; then
+    export SONAR_SCANNER_OPTS="$options"
+  fi
+}
+
+# Metrics of the stages (see cnes_scanner/metrics.py): the stages of this run are gathered
+if [ -n "${CNES_METRICS:-}" ]; then
+  export CNES_METRICS_RUN="${CNES_METRICS_RUN:-$(date +%s%N)-$$}"
+fi
+
 # if nothing is passed, assume we want to run sonar-scanner
 if [[ "$#" == 0 ]]; then
   set -- sonar-scanner
 fi
 
+# analyze mode: run the embedded tools concurrently, then the sonar-scanner
+# with the remaining arguments and the properties of the reports produced
+if [[ "$1" = 'analyze' ]]; then
+  analysis_props="$(python3 -m cnes_scanner "$@")"
+  declare -a analysis_args=()
+  if [ -n "$analysis_props" ]; then
+    mapfile -t analysis_args <<< "$analysis_props"
+  fi
+  set -- sonar-scanner "${analysis_args[@]}" "${@:2}"
+fi
+
+# pr mode: run the embedded tools on the files changed since a base ref,
+# then the sonar-scanner on these files only (or nothing if none changed),
+# with the properties of the reports followed by the remaining arguments
+if [[ "$1" = 'pr' ]]; then
+  analysis_props="$(python3 -m cnes_scanner "$@")"
+  if [ -z "$analysis_props" ]; then
+    exit 0
+  fi
+  mapfile -t analysis_args <<< "$analysis_props"
+  set -- sonar-scanner "${analysis_args[@]}"
+fi
+
+# prewarm: fill the cache of the sonar-scanner with the files of a server
+if [[ "$1" = 'prewarm' ]]; then
+  exec python3 -m cnes_scanner "$@"
+fi
+
+# batch mode: analyze all the sub-projects (directories with a sonar-project.properties)
+# with a bounded number of warm sonar-scanners
+if [[ "$1" = 'batch' ]]; then
+  prepare_cache
+  hold_scanner_lock
+  exec python3 -m cnes_scanner "$@"
+fi
+
+# pylint server: keep pylint, astroid and the CNES checkers loaded between the runs
+# of `python3 -m cnes_scanner pylint-client` (e.g. through docker exec)
+if [[ "$1" = 'pylint-server' ]]; then
+  exec python3 -m cnes_scanner "$@"
+fi
+
+# warm mode: run a long-lived sonar-scanner serving the analyses requested
+# with `python3 -m cnes_scanner warm-scan` (e.g. through docker exec)
+if [[ "$1" = 'warm' ]]; then
+  if [ "$warm_worker" = no ]; then
+    prepare_cache
+    hold_scanner_lock
+    tune_jvm
+  fi
+  # The class data sharing archive needs the classpath of its training run (the one of the
+  # sonar-scanner script, with the physical path of its home) as a prefix of the classpath
+  scanner_lib="$(cd -P "$SONAR_SCANNER_HOME/lib" && pwd)"
+  cli_jars=("$scanner_lib"/sonar-scanner-cli-*.jar)
+  # shellcheck disable=SC2086
+  exec java -Djava.awt.headless=true $SONAR_SCANNER_OPTS \
+    -classpath "${cli_jars[0]}:$scanner_lib/cnes-warm-scanner.jar" \
+    -Dscanner.home="$SONAR_SCANNER_HOME" \
+    WarmScanner "${CNES_WARM_SOCKET:-/tmp/cnes-warm-scanner.sock}" "$SONAR_SCANNER_HOME/conf/sonar-scanner.properties"
+fi
+
 # if first arg looks like a flag, assume we want to run sonar-scanner with flags
 if [[ "${1#-}" != "${1}" ]] || [[ -z "$(command -v "${1}")" ]]; then
   set -- sonar-scanner "$@"
 fi
 
 if [[ "$1" = 'sonar-scanner' ]]; then
+  prepare_cache
+  hold_scanner_lock
+  tune_jvm
   add_env_var_as_env_prop "${SONAR_LOGIN:-}" "sonar.login"
   add_env_var_as_env_prop "${SONAR_PASSWORD:-}" "sonar.password"
   add_env_var_as_env_prop "${SONAR_PROJECT_BASE_DIR:-}" "sonar.projectBaseDir"
@@ -32,4 +147,9 @@ if [[ "$1" = 'sonar-scanner' ]]; then
   fi
 fi
 
+# Record the metrics of the final command if they are enabled
+if [ -n "${CNES_METRICS:-}" ]; then
+  exec python3 -m cnes_scanner metrics -- "$@"
+fi
+
 exec "$@"
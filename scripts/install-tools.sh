@@ -0,0 +1,65 @@
+#!/bin/bash
+
+# Install the embedded tools of some languages when the image is built
+# (see the flavors in the Dockerfile).
+#
+# Usage: install-tools.sh <language>...
+#   with a language among: cxx, python, shell
+
+set -euo pipefail
+
+declare -a packages=()
+for language in "$@"; do
+  case "$language" in
+    cxx)
+      packages+=(
+        # Needed by Infer
+        "libsqlite3-0=3.34.1-*"
+        "libtinfo5=6.2*"
+        "python2.7=2.7.18-*"
+        # Compilation tools needed by Infer
+        "gcc=4:10.2.1-*"
+        "g++=4:10.2.1-*"
+        "clang=1:11.0-*"
+        "make=4.3-*"
+      )
+      ;;
+    python)
+      packages+=("python3-pip=20.3.4-*")
+      ;;
+    shell)
+      packages+=("shellcheck=0.7.1-*")
+      ;;
+    *)
+      echo "Unknown language: $language" >&2
+      exit 1
+      ;;
+  esac
+done
+
+apt-get update
+mkdir -p /usr/share/man/man1
+apt-get install -y --no-install-recommends "${packages[@]}"
+rm -rf /var/lib/apt/lists/*
+rm -rf /usr/local/man
+
+for language in "$@"; do
+  case "$language" in
+    cxx)
+      ln -s "/opt/infer-linux64-v1.1.0/bin/infer" /usr/local/bin/infer
+      ;;
+    python)
+      pip install --no-cache-dir \
+        setuptools-scm==7.1.0 \
+        pytest-runner==6.0.0 \
+        wrapt==1.15.0 \
+        six==1.16.0 \
+        lazy-object-proxy==1.9.0 \
+        mccabe==0.7.0 \
+        isort==5.12.0 \
+        typed-ast==1.5.4 \
+        astroid==2.15.2 \
+        pylint==2.17.2
+      ;;
+  esac
+done
@@ -0,0 +1,165 @@
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.net.StandardProtocolFamily;
+import java.net.UnixDomainSocketAddress;
+import java.nio.channels.Channels;
+import java.nio.channels.ServerSocketChannel;
+import java.nio.channels.SocketChannel;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.Paths;
+import java.util.Arrays;
+import java.util.HashMap;
+import java.util.List;
+import java.util.Map;
+import java.util.Properties;
+
+import org.sonarsource.scanner.api.EmbeddedScanner;
+import org.sonarsource.scanner.api.LogOutput;
+
+/**
+ * Long-lived sonar-scanner running analyses requested on a unix socket.
+ *
+ * The JVM, the scanner engine downloaded from the server and its classes
+ * stay loaded between analyses. Analyses run one at a time.
+ *
+ * Request: the working directory of the client and the arguments of the
+ * sonar-scanner (-Dkey=value or -X), separated by NUL characters, up to
+ * the end of the stream.
+ * Response: the logs of the analysis, then a line made of a NUL character
+ * followed by the exit status.
+ *
+ * Usage: java -cp sonar-scanner-cli.jar:cnes-warm-scanner.jar WarmScanner socket global.properties
+ */
+public final class WarmScanner {
+    /** Version of the scanner CLI of the image, sent to the server */
+    private static final String SCANNER_VERSION = "4.8.0.2856";
+    /**
+     * Properties of the connection to the server, given to the engine with the global properties
+     * (the other properties are the ones of an analysis): the engine is started again when they change
+     */
+    private static final List<String> SERVER_PROPERTIES = Arrays.asList(
+        "sonar.host.url", "sonar.login", "sonar.password", "sonar.token", "sonar.userHome", "sonar.ws.timeout");
+
+    private final Path globalConf;
+    private final ClientLogOutput logOutput = new ClientLogOutput();
+    private EmbeddedScanner scanner;
+    private Map<String, String> globalProperties;
+
+    private WarmScanner(Path globalConf) {
+        this.globalConf = globalConf;
+    }
+
+    /** Logs of the engine, sent to the client of the current analysis */
+    private static final class ClientLogOutput implements LogOutput {
+        private volatile PrintStream client = System.out;
+
+        @Override
+        public void log(String formattedMessage, Level level) {
+            client.println(level + ": " + formattedMessage);
+        }
+    }
+
+    public static void main(String[] args) throws IOException {
+        if (args.length != 2) {
+            System.err.println("Usage: WarmScanner <socket> <global properties>");
+            System.exit(2);
+        }
+        Path socket = Paths.get(args[0]);
+        WarmScanner warmScanner = new WarmScanner(Paths.get(args[1]));
+        Files.deleteIfExists(socket);
+        try (ServerSocketChannel server = ServerSocketChannel.open(StandardProtocolFamily.UNIX)) {
+            server.bind(UnixDomainSocketAddress.of(socket));
+            System.out.println("INFO: Warm sonar-scanner listening on " + socket);
+            while (true) {
+                try (SocketChannel channel = server.accept()) {
+                    warmScanner.serve(channel);
+                } catch (IOException e) {
+                    System.err.println("ERROR: Client disconnected: " + e.getMessage());
+                }
+            }
+        }
+    }
+
+    private void serve(SocketChannel channel) throws IOException {
+        InputStream input = Channels.newInputStream(channel);
+        String[] request = new String(input.readAllBytes(), StandardCharsets.UTF_8).split("\0");
+        OutputStream output = Channels.newOutputStream(channel);
+        PrintStream client = new PrintStream(output, true, StandardCharsets.UTF_8);
+        logOutput.client = client;
+        int status;
+        try {
+            status = analyze(Paths.get(request[0]), Arrays.copyOfRange(request, 1, request.length));
+        } catch (Exception e) {
+            client.println("ERROR: Error during SonarScanner execution");
+            client.println("ERROR: " + e.getMessage());
+            status = 1;
+        } finally {
+            logOutput.client = System.out;
+        }
+        client.println("\0" + status);
+    }
+
+    private int analyze(Path workingDir, String[] args) throws IOException {
+        Map<String, String> cli = new HashMap<>();
+        for (String arg : args) {
+            if (arg.startsWith("-D") && arg.contains("=")) {
+                cli.put(arg.substring(2, arg.indexOf('=')), arg.substring(arg.indexOf('=') + 1));
+            } else if ("-X".equals(arg) || "--debug".equals(arg)) {
+                cli.put("sonar.verbose", "true");
+            } else {
+                throw new IllegalArgumentException("Unsupported argument in warm mode: " + arg);
+            }
+        }
+        // Same precedence as the sonar-scanner: global < project < command line
+        Properties properties = new Properties();
+        load(properties, globalConf);
+        Path baseDir = workingDir.resolve(cli.getOrDefault("sonar.projectBaseDir", "")).normalize();
+        load(properties, baseDir.resolve(cli.getOrDefault("project.settings", "sonar-project.properties")));
+        properties.putAll(cli);
+        properties.setProperty("sonar.projectBaseDir", baseDir.toString());
+        Map<String, String> analysis = new HashMap<>();
+        for (String key : properties.stringPropertyNames()) {
+            analysis.put(key, properties.getProperty(key));
+        }
+
+        // The global properties stay in the engine: the ones of a project would leak into the next ones
+        Properties globalConfProperties = new Properties();
+        load(globalConfProperties, globalConf);
+        Map<String, String> global = new HashMap<>();
+        for (String key : globalConfProperties.stringPropertyNames()) {
+            global.put(key, globalConfProperties.getProperty(key));
+        }
+        for (String key : SERVER_PROPERTIES) {
+            if (analysis.containsKey(key)) {
+                global.put(key, analysis.get(key));
+            }
+        }
+        if (scanner == null || !global.equals(globalProperties)) {
+            // The engine of other global properties (another server) replaces the previous one
+            if (scanner != null) {
+                EmbeddedScanner previous = scanner;
+                scanner = null;
+                previous.stop();
+            }
+            scanner = EmbeddedScanner.create("ScannerCLI", SCANNER_VERSION, logOutput)
+                .addGlobalProperties(global);
+            scanner.start();
+            globalProperties = global;
+        }
+        scanner.execute(analysis);
+        logOutput.log("EXECUTION SUCCESS", LogOutput.Level.INFO);
+        return 0;
+    }
+
+    private static void load(Properties properties, Path file) throws IOException {
+        if (Files.isRegularFile(file)) {
+            try (InputStream input = Files.newInputStream(file)) {
+                properties.load(input);
+            }
+        }
+    }
+}
@@ -0,0 +1,228 @@
+"""
+Benchmark of the tools and of the sonar-scanner of the CNES sonar-scanner image
+
+Projects of a configurable size are generated from the dummy projects of
+the tests (one seed file per language, whose identifiers are renamed in
+each copy so that no two files are duplicates). Each tool then runs on them in a
+container of the image, under ``python3 -m cnes_scanner measure``, which
+records its wall time, CPU time and peak RSS:
+    - cppcheck,
+    - Infer (on a generated compilation database),
+    - pylint with each CNES pylintrc,
+    - ShellCheck,
+    - sonar-scanner (only if a server is given).
+The results are written to a JSON file, which can later be used as the
+baseline of another run to detect performance regressions.
+
+Usage (from the tests/ folder):
+    python3 benchmark.py --files 1000 --output results.json
+    python3 benchmark.py --files 1000 --output results.json --baseline baseline.json
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import docker
+
+# Seed file of each language, relative to the tests/ folder, the folder of its copies
+# and the identifiers renamed in each copy
+SEEDS = {
+    'c': ("c_cpp/cppcheck/main.c", "c", ".c", ("main", "a")),
+    'python': ("python/src/simplecaesar.py", "py", ".py",
+               ("shift", "choice", "word", "letters", "encoded", "letter", "x")),
+    'shell': ("shell/src/script.sh", "sh", ".sh", ("foo", "var", "files", "args", "name"))
+}
+# Files per generated directory
+FILES_PER_DIR = 100
+PYLINTRCS = ("pylintrc_RNC2015_A_B", "pylintrc_RNC2015_C", "pylintrc_RNC2015_D")
+# Measured resources, compared to the baseline
+METRICS = ("wall", "cpu", "max_rss_kb")
+# Folder the project is mounted on in the containers
+CONTAINER_DIR = "/usr/src"
+
+
+def rename_identifiers(content: str, identifiers, number: int) -> str:
+    """
+    :param content: content of a seed file
+    :param identifiers: identifiers of the seed file
+    :param number: number of the copy
+    :returns: the content of the copy, with the number appended to the identifiers
+    """
+    pattern = re.compile(r"\b(" + "|".join(identifiers) + r")\b")
+    return pattern.sub(lambda match: f"{match.group(1)}_{number}", content)
+
+
+def generate_project(project_dir: str, files: int, languages=tuple(SEEDS)) -> dict:
+    """
+    Generate a project by copying the seed files of some languages, with their
+    identifiers renamed in each copy (see rename_identifiers)
+
+    :param project_dir: directory of the project, created if needed
+    :param files: total number of files, split evenly between the languages
+    :param languages: (optional) languages of the project, default: all
+    :returns: the number of files of each language
+    """
+    tests_dir = Path(__file__).parent
+    counts = {}
+    for index, language in enumerate(languages):
+        seed, folder, extension, identifiers = SEEDS[language]
+        content = (tests_dir / seed).read_text(encoding="utf8")
+        counts[language] = files // len(languages) + (1 if index < files % len(languages) else 0)
+        for number in range(counts[language]):
+            path = Path(project_dir, folder, f"dir_{number // FILES_PER_DIR}", f"file_{number}{extension}")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(rename_identifiers(content, identifiers, number), encoding="utf8")
+    if counts.get('c'):
+        # Compilation database of Infer, with the paths seen from the containers
+        database = [{"directory": CONTAINER_DIR, "file": str(path.relative_to(project_dir)),
+                     "command": f"gcc -c {path.relative_to(project_dir)} -o /dev/null"}
+                    for path in sorted(Path(project_dir, "c").rglob("*.c"))]
+        Path(project_dir, "compile_commands.json").write_text(json.dumps(database), encoding="utf8")
+    return counts
+
+
+def tool_commands(counts: dict, jobs: int = 1, sonar_url: str = "", sonar_token: str = "") -> dict:
+    """
+    Build the command lines of the benchmarked tools for a generated project
+
+    :param counts: number of files of each language (see generate_project)
+    :param jobs: (optional) number of jobs of the tools that support it
+    :param sonar_url: (optional) URL of a SonarQube server, to benchmark the sonar-scanner
+    :param sonar_token: (optional) token to analyze projects on the server
+    :returns: the command line (list of arguments) of each benchmark
+    """
+    commands = {}
+    if counts.get('c'):
+        commands['cppcheck'] = ["cppcheck", "--quiet", "--xml-version=2", f"-j{jobs}",
+                                "--output-file=cppcheck-report.xml", "c"]
+        commands['infer'] = ["infer", "run", "--quiet", f"--jobs={jobs}",
+                             "--compilation-database", "compile_commands.json"]
+    if counts.get('python'):
+        for rcfile in PYLINTRCS:
+            commands[f"pylint-{rcfile}"] = ["bash", "-c", f"pylint --exit-zero --rcfile=/opt/python/{rcfile} "
+                                            f"--persistent=n --recursive=y -r n -j{jobs} py > pylint-report.txt"]
+    if counts.get('shell'):
+        commands['shellcheck'] = ["bash", "-c", "find sh -name '*.sh' -print0 "
+                                  "| xargs -0 shellcheck -f checkstyle > shellcheck-report.xml || true"]
+    if sonar_url:
+        commands['sonar-scanner'] = ["sonar-scanner", f"-Dsonar.host.url={sonar_url}",
+                                     f"-Dsonar.login={sonar_token}", "-Dsonar.projectKey=cnes-benchmark",
+                                     "-Dsonar.sources=.", "-Dsonar.scm.disabled=true"]
+    return commands
+
+
+def run_benchmarks(project_dir: str, commands: dict, image: str = "lequal/sonar-scanner",
+                   network: str = None) -> dict:
+    """
+    Run each benchmark in a container of the image and collect the resource usage
+
+    :param project_dir: directory of the generated project
+    :param commands: command lines of the benchmarks (see tool_commands)
+    :param image: (optional) image to benchmark
+    :param network: (optional) docker network of the containers (to reach a server)
+    :returns: the resource usage of each benchmark
+    """
+    docker_client = docker.from_env()
+    results = {}
+    for name, command in commands.items():
+        print(f"Benchmarking {name}...", file=sys.stderr)
+        docker_client.containers.run(image,
+            ["python3", "-m", "cnes_scanner", "measure", f"--output=.benchmark-{name}.json", "--", *command],
+            auto_remove=True,
+            network=network,
+            user=f"{os.getuid()}:{os.getgid()}",
+            volumes={project_dir: {'bind': CONTAINER_DIR, 'mode': 'rw'}},
+            working_dir=CONTAINER_DIR)
+        results[name] = json.loads(Path(project_dir, f".benchmark-{name}.json").read_text(encoding="utf8"))
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.2):
+    """
+    Compare the results of a benchmark to a baseline
+
+    :param results: results of the benchmark (as written to the JSON file)
+    :param baseline: results of a previous benchmark
+    :param tolerance: (optional) allowed relative increase of a metric, default: 20%
+    :returns: the regressions, as (benchmark, metric, baseline value, value) tuples
+    """
+    regressions = []
+    for name, usage in results["tools"].items():
+        reference = baseline.get("tools", {}).get(name)
+        if not reference:
+            continue
+        for metric in METRICS:
+            if usage[metric] > reference[metric] * (1 + tolerance):
+                regressions.append((name, metric, reference[metric], usage[metric]))
+    return regressions
+
+
+def benchmark(files: int, languages=tuple(SEEDS), jobs: int = 1, image: str = "lequal/sonar-scanner",
+              sonar_url: str = "", sonar_token: str = "", network: str = None) -> dict:
+    """
+    Generate a project and benchmark the tools of the image on it
+
+    :param files: number of files of the project
+    :param languages: (optional) languages of the project, default: all
+    :param jobs: (optional) number of jobs of the tools that support it
+    :param image: (optional) image to benchmark
+    :param sonar_url: (optional) URL of a SonarQube server (from the containers), to benchmark the sonar-scanner
+    :param sonar_token: (optional) token to analyze projects on the server
+    :param network: (optional) docker network of the containers (to reach the server)
+    :returns: the results of the benchmark
+    """
+    project_dir = tempfile.mkdtemp(prefix="cnes-benchmark-")
+    try:
+        counts = generate_project(project_dir, files, languages)
+        commands = tool_commands(counts, jobs, sonar_url, sonar_token)
+        return {
+            "image": image,
+            "files": counts,
+            "jobs": jobs,
+            "tools": run_benchmarks(project_dir, commands, image, network)
+        }
+    finally:
+        shutil.rmtree(project_dir, ignore_errors=True)
+
+
+def main(argv=None) -> int:
+    """
+    Run the benchmark from the command line
+
+    :returns: 1 if a regression was found compared to the baseline, 0 otherwise
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the tools of the CNES sonar-scanner image")
+    parser.add_argument("--files", type=int, default=1000, help="number of files of the generated project")
+    parser.add_argument("--languages", default=",".join(SEEDS), help="comma-separated languages of the project")
+    parser.add_argument("--jobs", type=int, default=1, help="number of jobs of the tools that support it")
+    parser.add_argument("--image", default="lequal/sonar-scanner", help="image to benchmark")
+    parser.add_argument("--sonar-url", default="", help="URL of a server to benchmark the sonar-scanner")
+    parser.add_argument("--sonar-token", default="", help="token to analyze projects on the server")
+    parser.add_argument("--network", default=None, help="docker network to reach the server")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file of the results")
+    parser.add_argument("--baseline", default="", help="JSON file of the results to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative increase of a metric")
+    args = parser.parse_args(argv)
+
+    results = benchmark(args.files, tuple(args.languages.split(",")), args.jobs, args.image,
+                        args.sonar_url, args.sonar_token, args.network)
+    Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf8")
+    for name, usage in results["tools"].items():
+        print(f"{name}: {usage['wall']}s wall, {usage['cpu']}s CPU, {usage['max_rss_kb']} KiB peak RSS")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf8"))
+        regressions = compare(results, baseline, args.tolerance)
+        for name, metric, reference, value in regressions:
+            print(f"Regression of {name}: {metric} went from {reference} to {value}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,388 @@
+"""
+Fixtures shared by the integration tests of CNES sonar-scanner
+
+The SonarQube server is a session fixture. When the tests are distributed
+with pytest-xdist (``pytest -n auto``), the first worker needing it
+launches the lequal/sonarqube container and the others reuse it. It is
+stopped by the controller at the end of the session, once all the workers
+are done: a worker cannot tell whether another one is about to use it.
+Each worker has its own analysis token and a suffix to make the keys of
+its projects and Quality Profiles unique.
+
+The commands of the tests run in a single lequal/sonar-scanner container
+per session (see ScannerContainer), unless SCANNER_REUSE is "no".
+"""
+
+import os
+import shlex
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+
+import docker
+import pytest
+from filelock import FileLock
+
+import sonarqube_wait
+from sonarqube_client import SonarQubeClient
+from sonarqube_stub import StubSonarQube
+
+
+def pytest_configure(config):
+    """
+    Register the markers of the tests
+    """
+    config.addinivalue_line("markers", "server: the test needs a lequal/sonarqube server (slow tier)")
+    if not hasattr(config, "workerinput"):
+        # Directory of the state of the server, shared by the controller with its workers
+        config.sonarqube_dir = tempfile.mkdtemp(prefix="cnes-sonarqube-")
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    """
+    Give the directory of the state of the server to a pytest-xdist worker
+    """
+    node.workerinput["sonarqube_dir"] = node.config.sonarqube_dir
+
+
+def pytest_sessionfinish(session):
+    """
+    Stop the lequal/sonarqube container launched for the session, once all the workers are done
+    """
+    config = session.config
+    if hasattr(config, "workerinput"):
+        return
+    started = Path(config.sonarqube_dir) / "sonarqube.started"
+    if started.exists() and started.read_text() == "launched":
+        SonarQubeServer("master").stop()
+    shutil.rmtree(config.sonarqube_dir, ignore_errors=True)
+
+
+def sonarqube_dir(config) -> Path:
+    """
+    :returns: the directory of the state of the server, shared by the controller and its workers
+    """
+    if hasattr(config, "workerinput"):
+        return Path(config.workerinput["sonarqube_dir"])
+    return Path(config.sonarqube_dir)
+
+
+class SonarQubeServer:
+    """
+    This class gives access to the lequal/sonarqube server used by the tests.
+    Its settings can be given with environment variables.
+
+    Environment variables:
+        RUN: whether or not to run a lequal/sonarqube container and create a
+             bridge network, default "yes", if you already have a running
+             container, set it to "no" and provide information through the
+             other variables.
+        SONARQUBE_CONTAINER_NAME: the name to give to the container running
+                                  the lequal/sonarqube image.
+        SONARQUBE_ADMIN_PASSWORD: the password of the admin account on the server.
+        SONARQUBE_URL: URL of lequal/sonarqube container if already running
+                        without trailing / from the scanner container.
+                        e.g. http://mycontainer:9000
+                        Use it only if no container name was given.
+        SONARQUBE_LOCAL_URL: URL of lequal/sonarqube container if already running
+                            without trailing / from the host.
+                            e.g. http://localhost:9000
+        SONARQUBE_TAG: the tag of the lequal/sonarqube image to use.
+                        e.g. latest
+        SONARQUBE_NETWORK: the name of the docker bridge used.
+    """
+    RUN = os.environ.get('RUN', "yes") == "yes"
+    SONARQUBE_CONTAINER_NAME = os.environ.get("SONARQUBE_CONTAINER_NAME", "lequalsonarqube")
+    SONARQUBE_ADMIN_PASSWORD = os.environ.get("SONARQUBE_ADMIN_PASSWORD", "adminpassword")
+    SONARQUBE_URL = os.environ.get("SONARQUBE_URL", f"http://{SONARQUBE_CONTAINER_NAME}:9000")
+    SONARQUBE_LOCAL_URL = os.environ.get("SONARQUBE_LOCAL_URL", "http://localhost:9000")
+    SONARQUBE_TAG = os.environ.get("SONARQUBE_TAG", "latest")
+    SONARQUBE_NETWORK = os.environ.get("SONARQUBE_NETWORK", "sonarbridge")
+
+    def __init__(self, worker: str):
+        """
+        :param worker: id of the pytest-xdist worker ("master" if not distributed)
+        """
+        self.worker = worker
+        self.token_name = f"global_token_{worker}"
+        self.token = ""
+        self.client = SonarQubeClient(self.SONARQUBE_LOCAL_URL, ("admin", self.SONARQUBE_ADMIN_PASSWORD))
+
+    def start(self):
+        """
+        Launch a lequal/sonarqube container in a new bridge network
+        """
+        docker_client = docker.from_env()
+        print(f"Creating bridge network (name={self.SONARQUBE_NETWORK})...")
+        docker_client.networks.create(self.SONARQUBE_NETWORK)
+        print(f"Launching lequal/sonarqube container (name={self.SONARQUBE_CONTAINER_NAME})...")
+        docker_client.containers.run(f"lequal/sonarqube:{self.SONARQUBE_TAG}",
+            name=self.SONARQUBE_CONTAINER_NAME,
+            detach=True,
+            auto_remove=True,
+            environment={"SONARQUBE_ADMIN_PASSWORD": self.SONARQUBE_ADMIN_PASSWORD},
+            ports={9000: 9000},
+            network=self.SONARQUBE_NETWORK)
+
+    def stop(self):
+        """
+        Stop the container and remove the bridge network
+        """
+        print(f"Stopping {self.SONARQUBE_CONTAINER_NAME}...")
+        docker_client = docker.from_env()
+        docker_client.containers.get(self.SONARQUBE_CONTAINER_NAME).stop()
+        print(f"Removing bridge network {self.SONARQUBE_NETWORK}...")
+        network = docker_client.networks.get(self.SONARQUBE_NETWORK)
+        # The scanner containers of the workers may still be connected to it
+        for container in network.containers:
+            network.disconnect(container, force=True)
+        network.remove()
+
+    def generate_token(self):
+        """
+        Retrieve a SonarQube token with global analysis for this worker
+        """
+        self.token = self.client.post("api/user_tokens/generate",
+            name=self.token_name,
+            type="GLOBAL_ANALYSIS_TOKEN",
+            login="admin")["token"]
+
+    def revoke_token(self):
+        """
+        Revoke the token of this worker
+        """
+        self.client.post("api/user_tokens/revoke", name=self.token_name)
+
+
+class ScannerContainer:
+    """
+    This class runs the commands of the tests in a container of the
+    lequal/sonar-scanner image, through its entrypoint.
+
+    By default, a single container is started for the session and each
+    command runs in it with docker exec, instead of paying for the creation
+    and the removal of a container each time. The root of the project is
+    mounted in /usr/src and the sonar-scanner cache in .sonarcache.
+    The output of the commands is streamed line by line.
+
+    Environment variables:
+        SCANNER_REUSE: whether or not to run the commands in a single container
+                       per session, default "yes", with "no" each command runs
+                       in its own container.
+    """
+    REUSE = os.environ.get("SCANNER_REUSE", "yes") == "yes"
+    IMAGE = "lequal/sonar-scanner"
+    ENTRYPOINT = "/usr/bin/entrypoint.sh"
+
+    def __init__(self, root_dir: str):
+        """
+        :param root_dir: root of the project, mounted in the containers
+        """
+        self.root_dir = root_dir
+        self.user = f"{os.getuid()}:{os.getgid()}"
+        self.volumes = {
+            root_dir: {'bind': '/usr/src', 'mode': 'rw'},
+            f"{root_dir}/.sonarcache": {'bind': '/opt/sonar-scanner/.sonar/cache', 'mode': 'rw'}
+        }
+        self.container = None
+        self.networks = set()
+
+    def start(self):
+        """
+        Launch the long-lived container, if the commands run in a single one
+        """
+        os.makedirs(os.path.join(self.root_dir, '.sonarcache'), exist_ok=True)
+        if self.REUSE:
+            print("Launching lequal/sonar-scanner container...")
+            self.container = docker.from_env().containers.run(self.IMAGE,
+                ["sleep", "infinity"],
+                entrypoint=[],
+                detach=True,
+                auto_remove=True,
+                init=True,
+                user=self.user,
+                volumes=self.volumes)
+
+    def stop(self):
+        """
+        Stop the long-lived container, if any
+        """
+        if self.container is not None:
+            print("Stopping lequal/sonar-scanner container...")
+            self.container.stop(timeout=1)
+            self.container = None
+            self.networks.clear()
+
+    def stream(self, cmd, working_dir: str = "", environment: dict = None, network: str = None):
+        """
+        Run a command through the entrypoint of the image and stream its output
+
+        :param cmd: command line (a string or a list of arguments)
+        :param working_dir: (optional) folder to run the command in (relative to the root of the project)
+        :param environment: (optional) environment variables of the command
+        :param network: (optional) docker network to reach (e.g. the one of the server)
+        :returns: a generator of the lines of the standard output of the command
+        :raises docker.errors.ContainerError: if the command fails
+        """
+        docker_client = docker.from_env()
+        if isinstance(cmd, str):
+            cmd = shlex.split(cmd)
+        stderr = []
+        if self.container is None:
+            container = docker_client.containers.run(self.IMAGE, cmd,
+                detach=True,
+                environment=environment,
+                network=network,
+                user=self.user,
+                volumes=self.volumes,
+                working_dir=f"/usr/src/{working_dir}")
+            try:
+                yield from self._lines(container.attach(stdout=True, stderr=False, stream=True, logs=True))
+                exit_code = container.wait()['StatusCode']
+                stderr.append(container.logs(stdout=False, stderr=True))
+            finally:
+                container.remove(force=True)
+        else:
+            container = self.container
+            if network and network not in self.networks:
+                docker_client.networks.get(network).connect(container)
+                self.networks.add(network)
+            exec_id = docker_client.api.exec_create(container.id, [self.ENTRYPOINT, *cmd],
+                environment=environment,
+                user=self.user,
+                workdir=f"/usr/src/{working_dir}")['Id']
+            yield from self._lines(self._demux(docker_client.api.exec_start(exec_id, stream=True, demux=True), stderr))
+            exit_code = docker_client.api.exec_inspect(exec_id)['ExitCode']
+        if exit_code != 0:
+            raise docker.errors.ContainerError(container, exit_code, cmd, self.IMAGE, b''.join(stderr).decode("utf-8"))
+
+    @staticmethod
+    def _demux(chunks, stderr: list):
+        """
+        Keep the chunks of the standard output and collect the ones of the standard error
+        """
+        for stdout_chunk, stderr_chunk in chunks:
+            if stderr_chunk:
+                stderr.append(stderr_chunk)
+            if stdout_chunk:
+                yield stdout_chunk
+
+    @staticmethod
+    def _lines(chunks):
+        """
+        Split chunks of output into lines (with their line feed)
+        """
+        pending = b''
+        for chunk in chunks:
+            pending += chunk
+            *lines, pending = pending.split(b'\n')
+            for line in lines:
+                yield line.decode("utf-8") + "\n"
+        if pending:
+            yield pending.decode("utf-8")
+
+    def run(self, cmd, working_dir: str = "", environment: dict = None, network: str = None) -> str:
+        """
+        Run a command through the entrypoint of the image (see stream)
+
+        :returns: the standard output of the command
+        """
+        return "".join(self.stream(cmd, working_dir, environment, network))
+
+    def missing_lines(self, cmd, expected_lines, working_dir: str = "", environment: dict = None,
+                      network: str = None) -> list:
+        """
+        Run a command through the entrypoint of the image (see stream) and
+        look for lines in its output as it is streamed
+
+        :param expected_lines: parts of lines expected in the output
+        :returns: the expected lines missing from the output, in order
+        """
+        missing = list(expected_lines)
+        for line in self.stream(cmd, working_dir, environment, network):
+            missing = [expected for expected in missing if expected not in line]
+        return missing
+
+
+@pytest.fixture(scope="session")
+def sonarqube(request):
+    """
+    Launch (or reuse) a lequal/sonarqube container and wait for it to be up
+
+    The first worker of the session needing the container launches it, under
+    a lock shared by all the workers, and records it in a file: the controller
+    stops it at the end of the session (see pytest_sessionfinish).
+    """
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "master")
+    shared_dir = sonarqube_dir(request.config)
+    started = shared_dir / "sonarqube.started"
+    lock = FileLock(str(shared_dir / "sonarqube.lock"))
+    server = SonarQubeServer(worker)
+
+    with lock:
+        if not started.exists():
+            if server.RUN:
+                server.start()
+            else:
+                print(f"Using container {server.SONARQUBE_CONTAINER_NAME} and network {server.SONARQUBE_NETWORK}")
+            started.write_text("launched" if server.RUN else "reused")
+            # Create cache folder for sonar-scanner
+            os.makedirs(os.path.join(Path(os.getcwd()).parent, '.sonarcache'), exist_ok=True)
+        # Wait for the SonarQube server inside it to be set up
+        print(f"Waiting for {server.SONARQUBE_CONTAINER_NAME} to be up...")
+        sonarqube_wait.wait_cnes_sonarqube_ready(server.SONARQUBE_CONTAINER_NAME, server.client)
+    server.generate_token()
+
+    yield server
+
+    server.revoke_token()
+    server.client.close()
+
+
+@pytest.fixture(scope="session")
+def scanner():
+    """
+    Launch the lequal/sonar-scanner container of the session (see ScannerContainer)
+    """
+    container = ScannerContainer(str(Path(os.getcwd()).parent))
+    container.start()
+    yield container
+    container.stop()
+
+
+@pytest.fixture(scope="session")
+def sonarqube_stub():
+    """
+    Start an in-process stand-in for the SonarQube server
+    """
+    with StubSonarQube() as stub:
+        stub.client = SonarQubeClient(stub.url)
+        yield stub
+        stub.client.close()
+
+
+@pytest.fixture
+def tmp_project():
+    """
+    Build temporary projects from the sources of the dummy projects.
+    They are created in the root of the repository, which is the folder
+    mounted in the containers, and removed after the test.
+
+    :returns: a function taking the names of the dummy projects to merge
+              and returning the path of the new project (relative to the root)
+    """
+    root_dir = Path(os.getcwd()).parent
+    projects = []
+
+    def build(*dummy_projects):
+        project = f"tests/tmp-project-{uuid.uuid4().hex[:8]}"
+        for dummy_project in dummy_projects:
+            shutil.copytree(root_dir / "tests" / dummy_project / "src", root_dir / project / "src", dirs_exist_ok=True)
+        projects.append(root_dir / project)
+        return project
+
+    yield build
+    for project in projects:
+        shutil.rmtree(project, ignore_errors=True)
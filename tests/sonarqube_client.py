@@ -0,0 +1,107 @@
+"""
+Client of the SonarQube Web API shared by the integration tests
+
+All the requests of a client go through one keep-alive session, with
+its credentials and retries on transient errors. Issues are counted on
+the server side (``ps=1`` and ``total``, or facets) so that counts stay
+correct on projects with more issues than the size of a page; the full
+list of issues is streamed page by page when it is needed.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Largest page size accepted by api/issues/search
+MAX_PAGE_SIZE = 500
+# api/issues/search cannot return results past this rank
+MAX_ISSUES = 10000
+
+
+class SonarQubeClient:
+    """
+    This class sends requests to the Web API of a SonarQube server.
+
+    Example (not a doctest):
+        client = SonarQubeClient("http://localhost:9000", ("admin", "adminpassword"))
+        client.count_issues(componentKeys="python-dummy-project")
+    """
+    def __init__(self, url: str, auth=None, retries: int = 5):
+        """
+        :param url: URL of the server without trailing /
+        :param auth: (optional) credentials forwarded to requests
+        :param retries: (optional) number of retries on connection errors and 502/503/504 responses
+        """
+        self.url = url
+        self.session = requests.Session()
+        self.session.auth = auth
+        adapter = HTTPAdapter(max_retries=Retry(total=retries, backoff_factor=0.5,
+            status_forcelist=(502, 503, 504), raise_on_status=False))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        """
+        Close the connections of the session
+        """
+        self.session.close()
+
+    def get(self, api: str, **params) -> dict:
+        """
+        Send a GET request to a web service
+
+        :param api: path of the web service (e.g. api/issues/search)
+        :param params: parameters of the request
+        :returns: the JSON response
+        """
+        return self.session.get(f"{self.url}/{api}", params=params).json()
+
+    def post(self, api: str, files=None, **data) -> dict:
+        """
+        Send a POST request to a web service
+
+        :param api: path of the web service (e.g. api/projects/create)
+        :param files: (optional) files to upload, forwarded to requests
+        :param data: parameters of the request
+        :returns: the JSON response, empty if the service returns nothing
+        """
+        response = self.session.post(f"{self.url}/{api}", data=data, files=files)
+        return response.json() if response.content else {}
+
+    def count_issues(self, **params) -> int:
+        """
+        Count the issues matching a search without retrieving them
+
+        :param params: parameters of api/issues/search (e.g. componentKeys, rules, statuses)
+        :returns: the number of issues
+        """
+        return self.get("api/issues/search", ps=1, **params)['total']
+
+    def count_issues_by_status(self, **params) -> dict:
+        """
+        Count the issues matching a search for each status
+
+        :param params: parameters of api/issues/search (e.g. componentKeys, rules)
+        :returns: the number of issues by status
+        """
+        facets = self.get("api/issues/search", ps=1, facets="statuses", **params)['facets']
+        statuses = next(facet for facet in facets if facet['property'] == 'statuses')
+        return {value['val']: value['count'] for value in statuses['values']}
+
+    def iter_issues(self, page_size: int = MAX_PAGE_SIZE, **params):
+        """
+        Stream the issues matching a search, page by page.
+        The server returns at most the first 10000 issues of a search,
+        narrow it (e.g. with rules or statuses) to go beyond.
+
+        :param page_size: (optional) number of issues by request
+        :param params: parameters of api/issues/search (e.g. componentKeys, rules, statuses)
+        :returns: generator of issues
+        """
+        page = 1
+        while True:
+            response = self.get("api/issues/search", ps=page_size, p=page, **params)
+            yield from response['issues']
+            if page * page_size >= min(response['total'], MAX_ISSUES):
+                return
+            page += 1
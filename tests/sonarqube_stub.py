@@ -0,0 +1,401 @@
+"""
+In-process stand-in for the lequal/sonarqube server
+
+It implements, in memory, the part of the Web API used by the tests:
+    - api/system/status and api/server/version
+    - api/user_tokens/* (generate, revoke, search)
+    - api/projects/* (create, delete, search)
+    - api/qualityprofiles/* (search, copy, delete, add_project,
+      activate_rule, deactivate_rule)
+    - api/issues/search (with paging and facets)
+    - api/ce/* (submit, task, activity)
+
+A zip archive uploaded to ``api/ce/submit`` is processed by a background
+Compute Engine thread that derives issues from the pylint
+(``pylint-report.txt``, text format of the README) and cppcheck
+(``cppcheck-report.xml``, XML version 2) reports found in it. Other
+entries of the archive are ignored.
+
+The stand-in cannot receive an analysis of the sonar-scanner: it serves
+neither the engine, the plugins and the settings the scanner loads
+(batch/*, api/plugins/*, api/settings/*) nor reads the protobuf report it
+uploads, and it does not run the import sensors of the language plugins.
+The archives are built by the tests from the reports of the tools, so the
+stand-in only checks that these reports are in the format the sensors
+read; the import of the reports by an analysis is tested against a
+lequal/sonarqube container.
+"""
+
+import email
+import email.policy
+import io
+import itertools
+import json
+import queue
+import re
+import threading
+import uuid
+import zipfile
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Line of a pylint report written with the README template:
+# {path}:{line}: [{msg_id}({symbol}), {obj}] {msg}
+PYLINT_LINE = re.compile(r'^(?P<path>[^:\s][^:]*):(?P<line>\d+): \[(?P<msg_id>[A-Z]\d+)\((?P<symbol>[\w-]+)\), (?P<obj>[^\]]*)\] (?P<msg>.*)$')
+PYLINT_SEVERITIES = {'F': 'BLOCKER', 'E': 'CRITICAL', 'W': 'MAJOR', 'R': 'MINOR', 'C': 'MINOR', 'I': 'INFO'}
+CPPCHECK_SEVERITIES = {'error': 'CRITICAL', 'warning': 'MAJOR', 'portability': 'MINOR',
+                       'performance': 'MINOR', 'style': 'MINOR', 'information': 'INFO'}
+# Web services implemented by the stand-in (api/<service>/<action>)
+WEB_SERVICES = (
+    'system_status', 'server_version',
+    'user_tokens_generate', 'user_tokens_revoke', 'user_tokens_search',
+    'projects_create', 'projects_delete', 'projects_search',
+    'qualityprofiles_search', 'qualityprofiles_copy', 'qualityprofiles_delete', 'qualityprofiles_add_project',
+    'qualityprofiles_activate_rule', 'qualityprofiles_deactivate_rule',
+    'issues_search',
+    'ce_submit', 'ce_task', 'ce_activity'
+)
+# Facets of api/issues/search implemented by the stand-in, and the field of the issues they count
+ISSUE_FACETS = {'statuses': 'status', 'rules': 'rule', 'severities': 'severity', 'types': 'type'}
+# Maximum number of issues returned by api/issues/search, as on a real server
+MAX_ISSUES = 10000
+
+
+class ApiError(Exception):
+    """
+    Error returned to the client of the stand-in server
+
+    :param status: HTTP status of the response
+    :param message: error message
+    """
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def pylint_issues(report):
+    """
+    Derive issues from a pylint report in text format
+
+    :param report: lines of the report
+    :returns: generator of (rule, path, line, message, severity)
+    """
+    for line in report:
+        match = PYLINT_LINE.match(line.rstrip('\n'))
+        if match:
+            yield (f"external_pylint:{match['msg_id']}", match['path'], int(match['line']),
+                   match['msg'], PYLINT_SEVERITIES.get(match['msg_id'][0], 'MAJOR'))
+
+
+def cppcheck_issues(report):
+    """
+    Derive issues from a cppcheck report in XML version 2
+
+    :param report: file object of the report
+    :returns: generator of (rule, path, line, message, severity)
+    """
+    for _, element in ET.iterparse(report):
+        if element.tag != 'error':
+            continue
+        location = element.find('location')
+        if location is not None:
+            yield (f"cppcheck:{element.get('id')}", location.get('file'), int(location.get('line', 0)),
+                   element.get('msg'), CPPCHECK_SEVERITIES.get(element.get('severity'), 'MAJOR'))
+        element.clear()
+
+
+# Report importers of the stand-in, by file name
+IMPORTERS = {
+    'pylint-report.txt': lambda data: pylint_issues(io.TextIOWrapper(data, encoding='utf-8')),
+    'cppcheck-report.xml': cppcheck_issues
+}
+
+
+class StubSonarQube:
+    """
+    This class is the state of the stand-in server and its HTTP front.
+
+    Example (not a doctest):
+        with StubSonarQube() as stub:
+            requests.get(f"{stub.url}/api/system/status").json()
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        """
+        :param host: address to listen on
+        :param port: port to listen on, 0 to pick a free one
+        """
+        self.lock = threading.Lock()
+        self.tokens = {}
+        self.projects = {}
+        self.profiles = {}
+        self.project_profiles = {}
+        self.issues = []
+        self.tasks = {}
+        self._ids = itertools.count(1)
+        self._queue = queue.Queue()
+        for language in ('py', 'cxx', 'java', 'shell', 'f77', 'f90'):
+            self._create_profile("Sonar way", language, default=True)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._threads = [
+            threading.Thread(target=self._server.serve_forever, daemon=True),
+            threading.Thread(target=self._compute_engine, daemon=True)
+        ]
+
+    @property
+    def url(self) -> str:
+        """URL of the stand-in server"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Start serving requests and processing reports"""
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        """Stop the stand-in server"""
+        self._queue.put(None)
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # State helpers
+    def _new_key(self, prefix: str) -> str:
+        return f"{prefix}{next(self._ids):06d}"
+
+    def _create_profile(self, name: str, language: str, default: bool = False, rules=()):
+        key = self._new_key("qp")
+        self.profiles[key] = {"key": key, "name": name, "language": language,
+                              "isDefault": default, "rules": set(rules)}
+        return self.profiles[key]
+
+    def _find_profile(self, params):
+        if params.get('key'):
+            profile = self.profiles.get(params['key'])
+        else:
+            profile = next((profile for profile in self.profiles.values()
+                            if profile['name'] == params.get('qualityProfile')
+                            and profile['language'] == params.get('language')), None)
+        if profile is None:
+            raise ApiError(404, "Quality Profile not found")
+        return profile
+
+    def _project(self, key: str):
+        if key not in self.projects:
+            raise ApiError(404, f"Project '{key}' not found")
+        return self.projects[key]
+
+    @staticmethod
+    def _public_profile(profile):
+        return {name: value for name, value in profile.items() if name != 'rules'}
+
+    # Web services
+    def system_status(self, _):
+        return {"status": "UP"}
+
+    def server_version(self, _):
+        return "stub"
+
+    def user_tokens_generate(self, params):
+        if params.get('name') in self.tokens:
+            raise ApiError(400, f"A user token with name '{params['name']}' already exists")
+        token = {"name": params.get('name'), "login": params.get('login', 'admin'),
+                 "type": params.get('type', 'USER_TOKEN'), "token": uuid.uuid4().hex}
+        self.tokens[token['name']] = token
+        return token
+
+    def user_tokens_revoke(self, params):
+        self.tokens.pop(params.get('name'), None)
+
+    def user_tokens_search(self, _):
+        return {"login": "admin", "userTokens": [
+            {"name": token['name'], "type": token['type']} for token in self.tokens.values()]}
+
+    def projects_create(self, params):
+        key = params.get('project')
+        if key in self.projects:
+            raise ApiError(400, f"Could not create Project with key: \"{key}\". A similar key already exists: \"{key}\"")
+        self.projects[key] = {"key": key, "name": params.get('name', key), "qualifier": "TRK"}
+        return {"project": self.projects[key]}
+
+    def projects_delete(self, params):
+        key = self._project(params.get('project'))['key']
+        del self.projects[key]
+        self.issues = [issue for issue in self.issues if issue['project'] != key]
+        self.project_profiles = {assignment: profile for assignment, profile in self.project_profiles.items()
+                                 if assignment[0] != key}
+
+    def projects_search(self, params):
+        keys = params.get('projects', '').split(',') if params.get('projects') else list(self.projects)
+        components = [self.projects[key] for key in keys if key in self.projects]
+        return {"paging": {"pageIndex": 1, "pageSize": 100, "total": len(components)}, "components": components}
+
+    def qualityprofiles_search(self, params):
+        profiles = [self._public_profile(profile) for profile in self.profiles.values()
+                    if params.get('language', profile['language']) == profile['language']
+                    and params.get('qualityProfile', profile['name']) == profile['name']]
+        return {"profiles": profiles}
+
+    def qualityprofiles_copy(self, params):
+        source = self._find_profile({"key": params.get('fromKey')})
+        copy = self._create_profile(params.get('toName'), source['language'], rules=source['rules'])
+        return self._public_profile(copy)
+
+    def qualityprofiles_delete(self, params):
+        profile = self._find_profile(params)
+        if profile['isDefault']:
+            raise ApiError(400, "A default profile cannot be deleted")
+        del self.profiles[profile['key']]
+
+    def qualityprofiles_add_project(self, params):
+        profile = self._find_profile(params)
+        self._project(params.get('project'))
+        self.project_profiles[(params['project'], profile['language'])] = profile['key']
+
+    def qualityprofiles_activate_rule(self, params):
+        self._find_profile(params)['rules'].add(params.get('rule'))
+
+    def qualityprofiles_deactivate_rule(self, params):
+        self._find_profile(params)['rules'].discard(params.get('rule'))
+
+    def issues_search(self, params):
+        def selected(issue, name, field):
+            return not params.get(name) or issue[field] in params[name].split(',')
+
+        issues = [issue for issue in self.issues
+                  if selected(issue, 'componentKeys', 'project') and selected(issue, 'rules', 'rule')
+                  and selected(issue, 'statuses', 'status')]
+        page_size = min(int(params.get('ps', 100)), 500)
+        page = int(params.get('p', 1))
+        if page * page_size > MAX_ISSUES:
+            raise ApiError(400, f"Can return only the first {MAX_ISSUES} results. {page * page_size}th result asked.")
+        facets = []
+        for facet in filter(None, params.get('facets', '').split(',')):
+            if facet not in ISSUE_FACETS:
+                raise ApiError(400, f"Value of parameter 'facets' ({facet}) must be one of: {sorted(ISSUE_FACETS)}")
+            field = ISSUE_FACETS[facet]
+            counts = {}
+            for issue in issues:
+                counts[issue[field]] = counts.get(issue[field], 0) + 1
+            facets.append({"property": facet,
+                           "values": [{"val": value, "count": count} for value, count in sorted(counts.items())]})
+        return {"total": len(issues), "p": page, "ps": page_size,
+                "paging": {"pageIndex": page, "pageSize": page_size, "total": len(issues)},
+                "issues": issues[(page - 1) * page_size:page * page_size], "facets": facets}
+
+    def ce_submit(self, params):
+        key = params.get('projectKey')
+        if key not in self.projects:
+            self.projects_create({"project": key, "name": params.get('projectName', key)})
+        task = {"id": self._new_key("task"), "type": "REPORT", "componentKey": key, "status": "PENDING"}
+        self.tasks[task['id']] = task
+        self._queue.put((task, params.get('report', b'')))
+        return {"taskId": task['id'], "projectId": key}
+
+    def ce_task(self, params):
+        if params.get('id') not in self.tasks:
+            raise ApiError(404, f"No activity found for task '{params.get('id')}'")
+        return {"task": dict(self.tasks[params['id']])}
+
+    def ce_activity(self, params):
+        tasks = [dict(task) for task in self.tasks.values()
+                 if params.get('component', task['componentKey']) == task['componentKey']]
+        return {"tasks": tasks}
+
+    # Compute Engine
+    def _compute_engine(self):
+        """Process the submitted reports one at a time, like a real server"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            task, report = item
+            with self.lock:
+                task['status'] = 'IN_PROGRESS'
+            try:
+                issues = list(self._derive_issues(task['componentKey'], report))
+            except Exception as error:  # pylint: disable=broad-except
+                # A task never stays PENDING: any error of the processing fails it, like on a real server
+                with self.lock:
+                    task.update(status='FAILED', errorMessage=str(error))
+                continue
+            with self.lock:
+                self.issues = [issue for issue in self.issues if issue['project'] != task['componentKey']] + issues
+                task['status'] = 'SUCCESS'
+
+    def _derive_issues(self, project: str, report: bytes):
+        with zipfile.ZipFile(io.BytesIO(report)) as archive:
+            for name in archive.namelist():
+                importer = IMPORTERS.get(name.rsplit('/', 1)[-1])
+                if importer is None:
+                    continue
+                with archive.open(name) as data:
+                    for rule, path, line, message, severity in importer(data):
+                        yield {"key": uuid.uuid4().hex, "rule": rule, "severity": severity,
+                               "component": f"{project}:{path}", "project": project, "line": line,
+                               "message": message, "status": "OPEN", "type": "CODE_SMELL"}
+
+    # HTTP front
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Route the requests to the web services of the stand-in"""
+
+            def do_GET(self):
+                self._dispatch(parse_qs(urlparse(self.path).query))
+
+            def do_POST(self):
+                params = parse_qs(urlparse(self.path).query)
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                content_type = self.headers.get('Content-Type', '')
+                if content_type.startswith('multipart/form-data'):
+                    message = email.message_from_bytes(
+                        f"Content-Type: {content_type}\r\n\r\n".encode('utf-8') + body, policy=email.policy.HTTP)
+                    for part in message.iter_parts():
+                        name = part.get_param('name', header='content-disposition')
+                        payload = part.get_payload(decode=True)
+                        params[name] = [payload if part.get_filename() else payload.decode('utf-8')]
+                else:
+                    params.update(parse_qs(body.decode('utf-8')))
+                self._dispatch(params)
+
+            def _dispatch(self, params):
+                path = urlparse(self.path).path.strip('/')
+                service = path[len('api/'):].replace('/', '_') if path.startswith('api/') else None
+                try:
+                    if service not in WEB_SERVICES:
+                        raise ApiError(404, f"Unknown url : /{path}")
+                    with stub.lock:
+                        response = getattr(stub, service)({name: values[-1] for name, values in params.items()})
+                except ApiError as error:
+                    self._reply(error.status, {"errors": [{"msg": str(error)}]})
+                else:
+                    self._reply(200 if response is not None else 204, response)
+
+            def _reply(self, status, response):
+                # A text response (e.g. api/server/version) is sent as plain text, like on a real server
+                if isinstance(response, str):
+                    body, content_type = response.encode('utf-8'), 'text/plain'
+                else:
+                    body = json.dumps(response).encode('utf-8') if response is not None else b''
+                    content_type = 'application/json'
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                # Keep the output of pytest clean
+                pass
+
+        return Handler
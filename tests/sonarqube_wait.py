@@ -0,0 +1,161 @@
+"""
+Wait helpers for the integration tests of CNES sonar-scanner
+
+They replace fixed sleeps with event-driven waits:
+    - the server is ready once the CNES configuration script logged it
+      (read from a followed log stream) or, when the container cannot be
+      inspected, once ``api/system/status`` reports the server as UP;
+    - an analysis is processed once the Compute Engine task referenced in
+      the ``report-task.txt`` file of the scanner is done.
+"""
+
+import threading
+import time
+
+import docker
+import requests
+
+# Line logged by the lequal/sonarqube image once it is configured
+READY_LINE = b'[INFO] CNES SonarQube: ready!'
+# Final statuses of a Compute Engine task
+CE_TASK_DONE = ('SUCCESS', 'FAILED', 'CANCELED')
+
+
+def backoff(initial: float = 0.5, factor: float = 1.5, maximum: float = 10.0):
+    """
+    Generate the successive delays of an exponential backoff
+
+    :param initial: first delay (in seconds)
+    :param factor: multiplier applied to the delay after each try
+    :param maximum: upper bound of a delay (in seconds)
+    """
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * factor, maximum)
+
+
+def wait_log_line(container_name: str, line: bytes = READY_LINE, timeout: float = 600):
+    """
+    Wait for a line to be logged by a container.
+    The logs are followed as a stream, so they are read only once.
+
+    :param container_name: name of the container
+    :param line: line to look for
+    :param timeout: maximum time to wait (in seconds)
+    :raises RuntimeError: if the container stops before logging the line
+    :raises TimeoutError: if the line is not logged in time
+    """
+    container = docker.from_env().containers.get(container_name)
+    logs = container.logs(stream=True, follow=True)
+    timed_out = threading.Event()
+
+    def close():
+        timed_out.set()
+        logs.close()
+
+    # The stream blocks until the container logs something: it is closed at the deadline
+    deadline = threading.Timer(timeout, close)
+    deadline.start()
+    pending = b''
+    try:
+        for chunk in logs:
+            pending += chunk
+            *lines, pending = pending.split(b'\n')
+            if any(line in log_line for log_line in lines) or line in pending:
+                return
+    except (OSError, ValueError, AttributeError):
+        # Reading the stream closed at the deadline
+        if not timed_out.is_set():
+            raise
+    finally:
+        deadline.cancel()
+    if timed_out.is_set():
+        raise TimeoutError(f"{container_name} did not log {line.decode('utf-8')} after {timeout}s")
+    raise RuntimeError(f"{container_name} stopped before logging {line.decode('utf-8')}")
+
+
+def wait_server_status(client, timeout: float = 600):
+    """
+    Poll ``api/system/status`` with a backoff until the server is UP.
+
+    :param client: client of the server (sonarqube_client.SonarQubeClient)
+    :param timeout: maximum time to wait (in seconds)
+    :raises TimeoutError: if the server is not UP in time
+    """
+    deadline = time.monotonic() + timeout
+    for delay in backoff():
+        try:
+            if client.get("api/system/status").get('status') == 'UP':
+                return
+        except (requests.ConnectionError, ValueError):
+            # The server is not listening yet or is still starting
+            pass
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(f"{client.url} was not UP after {timeout}s")
+        time.sleep(delay)
+
+
+def wait_cnes_sonarqube_ready(container_name: str, client, timeout: float = 600):
+    """
+    Wait for a lequal/sonarqube server to be configured.
+    Follow the logs of its container if it can be found, otherwise poll
+    the status of the server.
+
+    :param container_name: name of the container running lequal/sonarqube
+    :param client: client of the server (sonarqube_client.SonarQubeClient)
+    :param timeout: maximum time to wait (in seconds)
+    """
+    try:
+        wait_log_line(container_name, timeout=timeout)
+    except docker.errors.NotFound:
+        wait_server_status(client, timeout)
+
+
+def read_report_task(path: str) -> dict:
+    """
+    Read the task-info file written by the scanner at the end of an analysis
+
+    :param path: path to the report-task.txt file
+    :returns: the properties of the file as a dictionary
+    """
+    properties = {}
+    with open(path, "r", encoding="utf8") as report_task:
+        for line in report_task:
+            key, sep, value = line.strip().partition('=')
+            if sep:
+                properties[key] = value
+    return properties
+
+
+def wait_ce_task(client, task_id: str, timeout: float = 300) -> dict:
+    """
+    Poll ``api/ce/task`` with a backoff until a Compute Engine task is done.
+
+    :param client: client of the server (sonarqube_client.SonarQubeClient)
+    :param task_id: id of the task
+    :param timeout: maximum time to wait (in seconds)
+    :returns: the task as returned by the server
+    :raises TimeoutError: if the task is not done in time
+    """
+    deadline = time.monotonic() + timeout
+    for delay in backoff():
+        task = client.get("api/ce/task", id=task_id)['task']
+        if task['status'] in CE_TASK_DONE:
+            return task
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(f"Task {task_id} was still {task['status']} after {timeout}s")
+        time.sleep(delay)
+
+
+def wait_analysis_processed(client, report_task_path: str, timeout: float = 300) -> dict:
+    """
+    Wait for the server to process the last analysis of a project.
+
+    :param client: client of the server (sonarqube_client.SonarQubeClient)
+    :param report_task_path: path to the report-task.txt file of the analysis
+    :param timeout: maximum time to wait (in seconds)
+    :returns: the Compute Engine task of the analysis
+    """
+    task_id = read_report_task(report_task_path)['ceTaskId']
+    return wait_ce_task(client, task_id, timeout)
@@ -7,131 +7,76 @@ Pytest documentation: https://docs.pytest.org/en/stable/contents.html
 """
 
 import filecmp
+import io
+import json
 import os
+import shutil
 import time
+import zipfile
+import zlib
 from pathlib import Path
 
 import docker
-import requests
+import pytest
 
+import benchmark
+import sonarqube_wait
 
+
+@pytest.mark.server
 class TestCNESSonarScanner:
     """
     This class test the lequal/sonar-scanner image.
     It runs a container of the lequal/sonarqube image and run analysis with
     lequal/sonar-scanner.
     It does not build any image.
-    Tests can be parametered with environment variables.
-
-    Environment variables:
-        RUN: whether or not to run a lequal/sonarqube container and create a
-             bridge network, default "yes", if you already have a running
-             container, set it to "no" and provide information through the
-             other variables.
-        SONARQUBE_CONTAINER_NAME: the name to give to the container running
-                                  the lequal/sonarqube image.
-        SONARQUBE_ADMIN_PASSWORD: the password of the admin account on the server.
-        SONARQUBE_URL: URL of lequal/sonarqube container if already running
-                        without trailing / from the scanner container.
-                        e.g. http://mycontainer:9000
-                        Use it only if no container name was given.
-        SONARQUBE_LOCAL_URL: URL of lequal/sonarqube container if already running
-                            without trailing / from the host.
-                            e.g. http://localhost:9000
-        SONARQUBE_TAG: the tag of the lequal/sonarqube image to use.
-                        e.g. latest
-        SONARQUBE_NETWORK: the name of the docker bridge used.
+    Tests can be parametered with environment variables
+    (see SonarQubeServer in conftest.py).
+
+    The tests can run concurrently with pytest-xdist: the project keys,
+    the working directory of the scanner and the Quality Profiles modified
+    by a test are suffixed with the id of the worker running it.
     """
     # Class variables
-    RUN = os.environ.get('RUN', "yes") == "yes"
-    SONARQUBE_CONTAINER_NAME = os.environ.get("SONARQUBE_CONTAINER_NAME", "lequalsonarqube")
-    SONARQUBE_ADMIN_PASSWORD = os.environ.get("SONARQUBE_ADMIN_PASSWORD", "adminpassword")
-    SONARQUBE_URL = os.environ.get("SONARQUBE_URL", f"http://{SONARQUBE_CONTAINER_NAME}:9000")
-    SONARQUBE_LOCAL_URL = os.environ.get("SONARQUBE_LOCAL_URL", "http://localhost:9000")
-    SONARQUBE_TAG = os.environ.get("SONARQUBE_TAG", "latest")
-    SONARQUBE_NETWORK = os.environ.get("SONARQUBE_NETWORK", "sonarbridge")
     _SONAR_SCANNER_IMAGE = "lequal/sonar-scanner"
     _PROJECT_ROOT_DIR = str(Path(os.getcwd()).parent)
+    SONARQUBE_URL = ""
+    SONARQUBE_NETWORK = ""
     SONARQUBE_TOKEN = ""
+    WORKER = ""
+    WORK_DIR = ".scannerwork"
+    client = None
+    scanner = None
 
-    # Setup and Teardown
-    @classmethod
-    def setup_class(cls):
+    # Setup
+    @pytest.fixture(autouse=True, scope="class")
+    def _sonarqube_server(self, request, sonarqube, scanner):
         """
-        Set up the tests
-        Launch a lequal/sonarqube container and wait for it to be up
+        Give the tests access to the lequal/sonarqube server
+        and to the lequal/sonar-scanner container of the session
         """
-        docker_client = docker.from_env()
-        # Launch a CNES SonarQube container
-        if cls.RUN:
-            print(f"Creating bridge network (name={cls.SONARQUBE_NETWORK})...")
-            docker_client.networks.create(cls.SONARQUBE_NETWORK)
-            print(f"Launching lequal/sonarqube container (name={cls.SONARQUBE_CONTAINER_NAME})...")
-            docker_client.containers.run(f"lequal/sonarqube:{cls.SONARQUBE_TAG}",
-                name=cls.SONARQUBE_CONTAINER_NAME,
-                detach=True,
-                auto_remove=True,
-                environment={"SONARQUBE_ADMIN_PASSWORD": cls.SONARQUBE_ADMIN_PASSWORD},
-                ports={9000: 9000},
-                network=cls.SONARQUBE_NETWORK)
-        else:
-            print(f"Using container {cls.SONARQUBE_CONTAINER_NAME} and network {cls.SONARQUBE_NETWORK}")
-
-        # Create cache folder for sonar-scanner
-        cache_dir_path = os.path.join(cls._PROJECT_ROOT_DIR, '.sonarcache')
-        if not os.path.exists(cache_dir_path):
-            os.makedirs(cache_dir_path)
-        # Wait for the SonarQube server inside it to be set up
-        print(f"Waiting for {cls.SONARQUBE_CONTAINER_NAME} to be up...")
-        cls.wait_cnes_sonarqube_ready(cls.SONARQUBE_CONTAINER_NAME)
-        # Retrieve the token
-        cls.get_sonarqube_token()
-
-    @classmethod
-    def teardown_class(cls):
-        """
-        Stop the container
-        """
-        # Revoke the token
-        requests.post(f"{cls.SONARQUBE_LOCAL_URL}/api/user_tokens/revoke",
-                      auth=("admin", cls.SONARQUBE_ADMIN_PASSWORD),
-                    params={
-                        "name": "global_token"
-                    })
-        if cls.RUN:
-            print(f"Stopping {cls.SONARQUBE_CONTAINER_NAME}...")
-            docker_client = docker.from_env()
-            docker_client.containers.get(cls.SONARQUBE_CONTAINER_NAME).stop()
-            print(f"Removing bridge network {cls.SONARQUBE_NETWORK}...")
-            docker_client.networks.get(cls.SONARQUBE_NETWORK).remove()
+        cls = request.cls
+        cls.scanner = scanner
+        cls.client = sonarqube.client
+        cls.SONARQUBE_URL = sonarqube.SONARQUBE_URL
+        cls.SONARQUBE_NETWORK = sonarqube.SONARQUBE_NETWORK
+        cls.SONARQUBE_TOKEN = sonarqube.token
+        cls.WORKER = sonarqube.worker
+        cls.WORK_DIR = f".scannerwork-{sonarqube.worker}"
 
     # Functions
     @classmethod
-    def get_sonarqube_token(cls):
-        """
-        Retrieve SonarQube token with global analysis from the server
+    def wait_analysis_processed(cls, base_dir: str):
         """
-        sonarqube_token = requests.post(f"{cls.SONARQUBE_LOCAL_URL}/api/user_tokens/generate",
-                                            auth=("admin", cls.SONARQUBE_ADMIN_PASSWORD),
-                                            params={
-                                                "name": "global_token",
-                                                "type": "GLOBAL_ANALYSIS_TOKEN",
-                                                "login": "admin"
-                                            })
-        cls.SONARQUBE_TOKEN = sonarqube_token.json()["token"]
+        This function waits for SonarQube to process the last analysis
+        of a project and checks that it succeeded.
 
-    @classmethod
-    def wait_cnes_sonarqube_ready(cls, container_name: str, tail = "all"):
+        :param base_dir: base directory of the analysed project (relative to the root of the project)
         """
-        This function waits for SonarQube to be configured by
-        the configure.bash script.
-
-        :param container_name: name of the container running lequal/sonarqube
-        :param tail: forwarded to docker logs
-        """
-        docker_client = docker.from_env()
-        while b'[INFO] CNES SonarQube: ready!' not in docker_client.containers.get(container_name).logs(tail=tail):
-            time.sleep(10)
+        report_task = os.path.join(cls._PROJECT_ROOT_DIR, base_dir, cls.WORK_DIR, "report-task.txt")
+        task = sonarqube_wait.wait_analysis_processed(cls.client, report_task)
+        # Hint: if this test fails, look at the background tasks of the project on the server
+        assert task['status'] == 'SUCCESS'
 
     @classmethod
     def language(cls, language_name: str, language_key: str, folder: str,
@@ -150,7 +95,8 @@ class TestCNESSonarScanner:
         :param language_key: language key for SonarQube
         :param folder: folder name, relative to the tests/ folder
         :param sensors_info: array of lines of sensors to look for in the scanner output
-        :param project_key: project key (sonar.project_key of sonar-project.properties)
+        :param project_key: project key (sonar.project_key of sonar-project.properties),
+                            it is suffixed with the id of the worker
         :param nb_issues: number of issues with the Sonar way Quality Profile
         :param cnes_qp: (optional) name of the CNES Quality Profile to apply, if any
         :param nb_issues_cnes_qp: (optional) number of issues with the CNES Quality Profile, if specified
@@ -164,50 +110,42 @@ class TestCNESSonarScanner:
             )
             self.language("Java", "java", "java", sensors, "java-dummy-project", 3, "CNES_JAVA_A", 6)
         """
-        docker_client = docker.from_env()
+        project_key = f"{project_key}-{cls.WORKER}"
 
         # Inner functions to factor out some code
-        def analyse_project():
+        def analyse_project(expected_lines=()):
             """
             Factor out code analysis by the sonar-scanner
 
-            :returns: output of the analysis
+            :param expected_lines: (optional) lines to look for in the output of the analysis
+            :returns: the expected lines missing from the output
             """
             print(f"Analysing project {project_key}...")
-            output = docker_client.containers.run(cls._SONAR_SCANNER_IMAGE,
-                f"-Dsonar.projectBaseDir=/usr/src/tests/{folder} -Dsonar.login={cls.SONARQUBE_TOKEN}",
-                auto_remove=True,
+            return cls.scanner.missing_lines(
+                f"-Dsonar.projectBaseDir=/usr/src/tests/{folder} -Dsonar.projectKey={project_key} \
+                -Dsonar.working.directory={cls.WORK_DIR} -Dsonar.login={cls.SONARQUBE_TOKEN}",
+                expected_lines,
                 environment={"SONAR_HOST_URL": cls.SONARQUBE_URL},
-                network=cls.SONARQUBE_NETWORK,
-                user=f"{os.getuid()}:{os.getgid()}",
-                volumes={
-                    f"{cls._PROJECT_ROOT_DIR}": {'bind': '/usr/src', 'mode': 'rw'},
-                    f"{cls._PROJECT_ROOT_DIR}/.sonarcache": {'bind': '/opt/sonar-scanner/.sonar/cache', 'mode': 'rw'}
-                }).decode("utf-8")
-            return output
+                network=cls.SONARQUBE_NETWORK)
 
         def get_number_of_issues():
             """
             Factor out the resquest to get the number of issues of a project on SonarQube
 
-            :returns: the number of issues
+            :returns: the number of OPEN and TO_REVIEW issues
             """
-            output = requests.get(f"{cls.SONARQUBE_LOCAL_URL}/api/issues/search?componentKeys={project_key}",
-                        auth=("admin", cls.SONARQUBE_ADMIN_PASSWORD)).json()['issues']
-            issues = [ issue for issue in output if issue['status'] in ('OPEN', 'TO_REVIEW') ]
-            return len(issues)
+            statuses = cls.client.count_issues_by_status(componentKeys=project_key)
+            return statuses.get('OPEN', 0) + statuses.get('TO_REVIEW', 0)
 
         # Analyse the project
-        output = analyse_project()
+        missing_sensors = analyse_project(sensors_info)
         # Make sure all non-default for this language plugins were executed by the scanner
-        for sensor_line in sensors_info:
-            # Hint: if this test fails, a plugin may not be installed correctly or a sensor is not triggered when needed
-            assert sensor_line in output
+        # Hint: if this test fails, a plugin may not be installed correctly or a sensor is not triggered when needed
+        assert not missing_sensors
         # Wait for SonarQube to process the results
-        time.sleep(8)
+        cls.wait_analysis_processed(f"tests/{folder}")
         # Check that the project was added to the server
-        output = requests.get(f"{cls.SONARQUBE_LOCAL_URL}/api/projects/search?projects={project_key}",
-                        auth=("admin", cls.SONARQUBE_ADMIN_PASSWORD)).json()
+        output = cls.client.get("api/projects/search", projects=project_key)
         # Hint: if this test fails, the project is not on the server
         assert output['components'][0]['key'] == project_key
         # Hint: if this test fails, there should be {nb_issues issues} on the {language_name}
@@ -217,59 +155,22 @@ class TestCNESSonarScanner:
         # If the language has a specific CNES Quality Profile, it must also be tested
         if cnes_qp:
             # Switch to CNES QP
-            requests.post(f"{cls.SONARQUBE_LOCAL_URL}/api/qualityprofiles/add_project",
-                auth=("admin", cls.SONARQUBE_ADMIN_PASSWORD),
-                data={
-                    "language": language_key,
-                    "project": project_key,
-                    "qualityProfile": cnes_qp
-                })
+            cls.client.post("api/qualityprofiles/add_project",
+                language=language_key,
+                project=project_key,
+                qualityProfile=cnes_qp)
             # Rerun the analysis
             analyse_project()
             # Wait for SonarQube to process the results
-            time.sleep(8)
+            cls.wait_analysis_processed(f"tests/{folder}")
             # Switch back to the Sonar way QP (in case the test needs to be rerun)
-            requests.post(f"{cls.SONARQUBE_LOCAL_URL}/api/qualityprofiles/add_project",
-                auth=("admin", cls.SONARQUBE_ADMIN_PASSWORD),
-                data={
-                    "language": language_key,
-                    "project": project_key,
-                    "qualityProfile": "Sonar way"
-                })
+            cls.client.post("api/qualityprofiles/add_project",
+                language=language_key,
+                project=project_key,
+                qualityProfile="Sonar way")
             # Hint: if this test fails, there should be {nb_issues_cnes_qp} issues on the {language_name} dummy project with the {cnes_qp} QP but {len(issues)} were found
             assert get_number_of_issues() == nb_issues_cnes_qp
 
-    @classmethod
-    def analysis_tool(cls, tool: str, cmd: str, ref_file: str, tmp_file: str, store_output: bool = True):
-        """
-        This function tests that the image can run a specified code analyzer
-        and that it keeps producing the same result given the same source code.
-
-        :param tool: tool name
-        :param cmd: tool command line
-        :param ref_file: analysis results reference file (path from the root of the project)
-        :param tmp_file: temporary results file (path from the root of the project)
-        :param store_output: (optional) store the standard output in the temporary result file, default: True
-
-        Example (not a doctest):
-            ref = "tests/c_cpp/reference-cppcheck-results.xml"
-            output = "tests/c_cpp/tmp-cppcheck-results.xml"
-            cmd = f"cppcheck --xml-version=2 tests/c_cpp/cppcheck/main.c --output-file={output}"
-            self.analysis_tool("cppcheck", cmd, ref, output, False)
-        """
-        # Run an analysis with the tool
-        docker_client = docker.from_env()
-        output = docker_client.containers.run(cls._SONAR_SCANNER_IMAGE, cmd,
-            auto_remove=True,
-            user=f"{os.getuid()}:{os.getgid()}",
-            volumes={f"{cls._PROJECT_ROOT_DIR}": {'bind': '/usr/src', 'mode': 'rw'}}).decode("utf-8")
-        if store_output:
-            with open(os.path.join(cls._PROJECT_ROOT_DIR, tmp_file), "w", encoding="utf8") as f:
-                f.write(output)
-        # Compare the result of the analysis with the reference
-        # Hint: if this test fails, look for differences with: diff {tmp_file} {ref_file}
-        assert filecmp.cmp(os.path.join(cls._PROJECT_ROOT_DIR, tmp_file), os.path.join(cls._PROJECT_ROOT_DIR, ref_file))
-
     @classmethod
     def import_analysis_results(cls, project_name: str, project_key: str,
         quality_profile: str, language_key: str, language_folder: str,
@@ -281,8 +182,8 @@ class TestCNESSonarScanner:
         must be stored in the default files.
 
         :param project_name: project name
-        :param project_key: project key
-        :param quality_profile: quality profile to use
+        :param project_key: project key, it is suffixed with the id of the worker
+        :param quality_profile: quality profile to use, a copy of it is used to leave it untouched
         :param language_key: language key
         :param language_folder: folder to run the sonar-scanner in (relative to the root of the project)
         :param source_folder: folder containing the source files (relative to the previous folder)
@@ -298,70 +199,55 @@ class TestCNESSonarScanner:
             self.import_analysis_results("CppCheck Dummy Project", "cppcheck-dummy-project",
                 "CNES_C_A", "c++", "tests/c_cpp", "cppcheck", rule_violated, expected_sensor, expected_import)
         """
+        project_key = f"{project_key}-{cls.WORKER}"
+        # Copy the Quality Profile so that the changes of this test do not impact the others
+        qp_copy = f"{quality_profile} {cls.WORKER}"
+        cls.client.post("api/qualityprofiles/delete",
+            language=language_key,
+            qualityProfile=qp_copy)
+        qp_key = cls.client.get("api/qualityprofiles/search",
+            language=language_key,
+            qualityProfile=quality_profile)['profiles'][0]['key']
+        qp_key = cls.client.post("api/qualityprofiles/copy",
+            fromKey=qp_key,
+            toName=qp_copy)['key']
         if activate_rule:
-            # Get the key of the Quality Profile to use
-            qp_key = requests.get(f"{cls.SONARQUBE_LOCAL_URL}/api/qualityprofiles/search?quality_profile={quality_profile}",
-                auth=("admin", cls.SONARQUBE_ADMIN_PASSWORD)).json()['profiles'][0]['key']
             # Activate the rule in the Quality Profile to allow the Sensor to be used
-            requests.post(f"{cls.SONARQUBE_LOCAL_URL}/api/qualityprofiles/activate_rule",
-                auth=("admin", cls.SONARQUBE_ADMIN_PASSWORD),
-                data={
-                    "key": qp_key,
-                    "rule": rule_violated
-                })
+            cls.client.post("api/qualityprofiles/activate_rule",
+                key=qp_key,
+                rule=rule_violated)
         # Create a project on SonarQube
-        errors = requests.post(f"{cls.SONARQUBE_LOCAL_URL}/api/projects/create",
-            auth=("admin", cls.SONARQUBE_ADMIN_PASSWORD),
-            data={
-                "name": project_name,
-                "project": project_key
-            }).json().get('errors', [])
+        errors = cls.client.post("api/projects/create",
+            name=project_name,
+            project=project_key).get('errors', [])
         assert not errors
         # Set its Quality Profile for the given language to the given one
-        requests.post(f"{cls.SONARQUBE_LOCAL_URL}/api/qualityprofiles/add_project",
-            auth=("admin", cls.SONARQUBE_ADMIN_PASSWORD),
-            data={
-                "language": language_key,
-                "project": project_key,
-                "qualityProfile": quality_profile
-            })
+        cls.client.post("api/qualityprofiles/add_project",
+            language=language_key,
+            project=project_key,
+            qualityProfile=qp_copy)
         # Analyse the project and collect the analysis files (that match the default names)
-        docker_client = docker.from_env()
-        analysis_output = docker_client.containers.run(cls._SONAR_SCANNER_IMAGE,
+        missing_lines = cls.scanner.missing_lines(
             f"-Dsonar.projectKey={project_key} -Dsonar.projectName=\"{project_name}\" -Dsonar.projectVersion=1.0 -Dsonar.sources={source_folder} \
-            -Dsonar.login={cls.SONARQUBE_TOKEN}",
-            auto_remove=True,
-            user=f"{os.getuid()}:{os.getgid()}",
-            volumes={
-                f"{cls._PROJECT_ROOT_DIR}": {'bind': '/usr/src', 'mode': 'rw'},
-                f"{cls._PROJECT_ROOT_DIR}/.sonarcache": {'bind': '/opt/sonar-scanner/.sonar/cache', 'mode': 'rw'}
-            },
+            -Dsonar.working.directory={cls.WORK_DIR} -Dsonar.login={cls.SONARQUBE_TOKEN}",
+            (expected_sensor, expected_import),
+            language_folder,
             environment={"SONAR_HOST_URL": cls.SONARQUBE_URL},
-            network=cls.SONARQUBE_NETWORK,
-            working_dir=f"/usr/src/{language_folder}").decode("utf-8")
-        for line in (expected_sensor, expected_import):
-            # Hint: if this test fails, the sensor for the tool or for the importation was not launched
-            assert line in analysis_output
+            network=cls.SONARQUBE_NETWORK)
+        # Hint: if this test fails, the sensor for the tool or for the importation was not launched
+        assert not missing_lines
         # Wait for SonarQube to process the results
-        time.sleep(10)
+        cls.wait_analysis_processed(language_folder)
         # Check that the issue was added to the project
-        issues = requests.get(f"{cls.SONARQUBE_LOCAL_URL}/api/issues/search?componentKeys={project_key}",
-            auth=("admin", cls.SONARQUBE_ADMIN_PASSWORD)).json()['issues']
-        nb_issues = len([ issue for issue in issues if issue['rule'] == rule_violated ])
+        nb_issues = cls.client.count_issues(componentKeys=project_key, rules=rule_violated)
         # Hint: an issue must be raised by the rule violated
         assert nb_issues == 1
         # Delete the project
-        requests.post(f"{cls.SONARQUBE_LOCAL_URL}/api/projects/delete",
-            auth=("admin", cls.SONARQUBE_ADMIN_PASSWORD),
-            data={"project": project_key})
-        if activate_rule:
-            # Deactivate the rule in the Quality Profile
-            requests.post(f"{cls.SONARQUBE_LOCAL_URL}/api/qualityprofiles/deactivate_rule",
-                auth=("admin", cls.SONARQUBE_ADMIN_PASSWORD),
-                data={
-                    "key": qp_key,
-                    "rule": rule_violated
-                })
+        cls.client.post("api/projects/delete", project=project_key)
+        # Delete the copy of the Quality Profile
+        cls.client.post("api/qualityprofiles/delete",
+            language=language_key,
+            qualityProfile=qp_copy)
 
     # Language tests
     def test_language_c_cpp(self):
@@ -426,6 +312,311 @@ class TestCNESSonarScanner:
         )
         self.language("Shell", "shell", "shell", sensors, "shell-dummy-project", 53, "RNC SHELL", 11)
 
+    # Test importation of analysis results
+    def test_import_cppcheck_results(self):
+        """
+        As a user of this image, I want to be able to import the results
+        of a CppCheck analysis to SonarQube.
+        """
+        rule_violated = "cppcheck:arrayIndexOutOfBounds"
+        expected_sensor = "INFO: Sensor CXX [cxx]"
+        expected_import = "INFO: Sensor CXX Cppcheck report import"
+        self.import_analysis_results("CppCheck Dummy Project", "cppcheck-dummy-project",
+            "RNC CPP A", "cxx", "tests/c_cpp", "cppcheck", rule_violated, expected_sensor, expected_import)
+
+    def test_import_pylint_results(self):
+        """
+        As a user of this image, I want to be able to import the results
+        of a pylint analysis to SonarQube.
+        """
+        rule_violated = "external_pylint:C0326"
+        expected_sensor = "INFO: Sensor Python Sensor [python]"
+        expected_import = "INFO: Sensor Import of Pylint issues [python]"
+        self.import_analysis_results("Pylint Dummy Project", "pylint-dummy-project",
+            "Sonar way", "py", "tests/python", "src", rule_violated, expected_sensor, expected_import)
+
+    def test_import_external_issues(self, tmp_project):
+        """
+        As a user of this image, I want to import the results of the
+        tools without an import sensor, such as ShellCheck and Infer,
+        as external issues.
+        """
+        project = tmp_project("shell")
+        project_key = f"shell-external-dummy-project-{self.WORKER}"
+        self.scanner.run(f"analyze -Dsonar.projectKey={project_key} -Dsonar.sources=src \
+            -Dsonar.working.directory={self.WORK_DIR} -Dsonar.login={self.SONARQUBE_TOKEN}",
+            project,
+            environment={"SONAR_HOST_URL": self.SONARQUBE_URL, "CNES_EXTERNAL_ISSUES": "shellcheck"},
+            network=self.SONARQUBE_NETWORK)
+        self.wait_analysis_processed(project)
+        with open(os.path.join(self._PROJECT_ROOT_DIR, project, "shellcheck-issues.json"), encoding="utf8") as report:
+            rule_violated = f"external_shellcheck:{json.load(report)['issues'][0]['ruleId']}"
+        nb_issues = self.client.count_issues(componentKeys=project_key, rules=rule_violated)
+        self.client.post("api/projects/delete", project=project_key)
+        # Hint: if this test fails, the generic report was not imported
+        assert nb_issues >= 1
+
+    def test_external_issues_imported_once(self, tmp_project):
+        """
+        As a user of this image, I want the issues of a tool with an import
+        sensor, such as pylint, to be imported once when they are imported
+        as external issues.
+        """
+        project = tmp_project("python")
+        project_key = f"python-external-once-dummy-project-{self.WORKER}"
+        self.scanner.run(f"analyze -Dsonar.projectKey={project_key} -Dsonar.sources=src \
+            -Dsonar.working.directory={self.WORK_DIR} -Dsonar.login={self.SONARQUBE_TOKEN}",
+            project,
+            environment={"SONAR_HOST_URL": self.SONARQUBE_URL, "CNES_EXTERNAL_ISSUES": "pylint"},
+            network=self.SONARQUBE_NETWORK)
+        self.wait_analysis_processed(project)
+        with open(os.path.join(self._PROJECT_ROOT_DIR, project, "pylint-issues.json"), encoding="utf8") as report:
+            converted = json.load(report)["issues"]
+        rule_violated = f"external_pylint:{converted[0]['ruleId']}"
+        expected = len([issue for issue in converted if issue["ruleId"] == converted[0]["ruleId"]])
+        nb_issues = self.client.count_issues(componentKeys=project_key, rules=rule_violated)
+        self.client.post("api/projects/delete", project=project_key)
+        # Hint: if this test fails, the import sensor of pylint imported the report a second time
+        assert nb_issues == expected
+
+    # Test the modes of the entrypoint
+    def test_warm_mode(self):
+        """
+        As a user of this image, I want a long-lived sonar-scanner to
+        run successive analyses
+        so that they do not pay for the startup of the scanner each time.
+        """
+        project_key = f"shell-warm-dummy-project-{self.WORKER}"
+        docker_client = docker.from_env()
+        scanner = docker_client.containers.run(self._SONAR_SCANNER_IMAGE, "warm",
+            detach=True,
+            auto_remove=True,
+            environment={"SONAR_HOST_URL": self.SONARQUBE_URL},
+            network=self.SONARQUBE_NETWORK,
+            user=f"{os.getuid()}:{os.getgid()}",
+            volumes={
+                f"{self._PROJECT_ROOT_DIR}": {'bind': '/usr/src', 'mode': 'rw'},
+                f"{self._PROJECT_ROOT_DIR}/.sonarcache": {'bind': '/opt/sonar-scanner/.sonar/cache', 'mode': 'rw'}
+            })
+        try:
+            sonarqube_wait.wait_log_line(scanner.name, b"INFO: Warm sonar-scanner listening")
+            # Two analyses by the same JVM
+            for _ in range(2):
+                status, output = scanner.exec_run(["python3", "-m", "cnes_scanner", "warm-scan",
+                    f"-Dsonar.projectKey={project_key}", f"-Dsonar.working.directory={self.WORK_DIR}",
+                    f"-Dsonar.login={self.SONARQUBE_TOKEN}"],
+                    workdir="/usr/src/tests/shell")
+                # Hint: if this test fails, look at the logs of the analysis in the output
+                assert status == 0, output.decode("utf-8")
+                assert "INFO: EXECUTION SUCCESS" in output.decode("utf-8")
+                self.wait_analysis_processed("tests/shell")
+        finally:
+            scanner.stop()
+            self.client.post("api/projects/delete", project=project_key)
+
+    def test_batch_mode(self, tmp_project):
+        """
+        As a user of this image, I want to analyze all the sub-projects
+        of my repository in one container
+        so that they do not pay for the startup of a container and of a scanner each.
+        """
+        project = tmp_project("shell")
+        project_dir = os.path.join(self._PROJECT_ROOT_DIR, project)
+        project_keys = {module: f"shell-batch-{module}-dummy-project-{self.WORKER}" for module in ("module-a", "module-b")}
+        for module, project_key in project_keys.items():
+            shutil.copytree(os.path.join(project_dir, "src"), os.path.join(project_dir, module, "src"))
+            with open(os.path.join(project_dir, module, "sonar-project.properties"), "w", encoding="utf8") as properties:
+                properties.write(f"sonar.projectKey={project_key}\nsonar.sources=src\n")
+        try:
+            self.scanner.run(["batch", "--jobs=2", "--report=batch-report.json", f"-Dsonar.login={self.SONARQUBE_TOKEN}",
+                f"-Dsonar.working.directory={self.WORK_DIR}"], project,
+                environment={"SONAR_HOST_URL": self.SONARQUBE_URL},
+                network=self.SONARQUBE_NETWORK)
+            with open(os.path.join(project_dir, "batch-report.json"), encoding="utf8") as report:
+                results = json.load(report)
+            # Hint: if this test fails, a sub-project was not found or its analysis failed
+            assert {module: result["status"] for module, result in results.items()} == \
+                {module: "SUCCESS" for module in project_keys}
+            for module, project_key in project_keys.items():
+                self.wait_analysis_processed(f"{project}/{module}")
+                # Hint: if this test fails, the project is not on the server
+                assert self.client.get("api/projects/search", projects=project_key)['components']
+        finally:
+            for project_key in project_keys.values():
+                self.client.post("api/projects/delete", project=project_key)
+
+    def test_batch_mode_settings(self, tmp_project):
+        """
+        As a user of this image, I want each sub-project analyzed in batch
+        mode to use its own settings
+        so that the settings of a sub-project do not leak into the next ones.
+        """
+        project = tmp_project("shell")
+        project_dir = os.path.join(self._PROJECT_ROOT_DIR, project)
+        project_keys = {module: f"shell-batch-{module}-settings-project-{self.WORKER}" for module in ("module-a", "module-b")}
+        settings = {
+            # Files only in module-a: module-b fails if its tests leak, and has no file if its exclusions leak
+            "module-a": "sonar.sources=src\nsonar.tests=tests\nsonar.exclusions=src/**\n",
+            "module-b": "sonar.sources=src\n"
+        }
+        for module, project_key in project_keys.items():
+            shutil.copytree(os.path.join(project_dir, "src"), os.path.join(project_dir, module, "src"))
+            with open(os.path.join(project_dir, module, "sonar-project.properties"), "w", encoding="utf8") as properties:
+                properties.write(f"sonar.projectKey={project_key}\n{settings[module]}")
+        shutil.copytree(os.path.join(project_dir, "src"), os.path.join(project_dir, "module-a", "tests"))
+        try:
+            # A single warm sonar-scanner analyzes both sub-projects
+            self.scanner.run(["batch", "--jobs=1", "--report=batch-report.json", f"-Dsonar.login={self.SONARQUBE_TOKEN}",
+                f"-Dsonar.working.directory={self.WORK_DIR}"], project,
+                environment={"SONAR_HOST_URL": self.SONARQUBE_URL},
+                network=self.SONARQUBE_NETWORK)
+            with open(os.path.join(project_dir, "batch-report.json"), encoding="utf8") as report:
+                results = json.load(report)
+            # Hint: if this test fails, the settings of a sub-project leaked into the next one
+            assert {module: result["status"] for module, result in results.items()} == \
+                {module: "SUCCESS" for module in project_keys}
+            for module, project_key in project_keys.items():
+                self.wait_analysis_processed(f"{project}/{module}")
+            sources = {module: [component["path"] for component in self.client.get("api/components/tree",
+                                component=project_key, qualifiers="FIL")["components"]]
+                       for module, project_key in project_keys.items()}
+            # Hint: if this test fails, the exclusions of module-a leaked into module-b
+            assert "src/script.sh" in sources["module-b"]
+            assert "src/script.sh" not in sources["module-a"]
+        finally:
+            for project_key in project_keys.values():
+                self.client.post("api/projects/delete", project=project_key)
+
+    def test_prewarm(self, tmp_project):
+        """
+        As a user of this image, I want to fill the cache of the
+        sonar-scanner before running analyses
+        so that they start without downloading the plugins of the server.
+        """
+        project = tmp_project("shell")
+        project_dir = os.path.join(self._PROJECT_ROOT_DIR, project)
+        project_key = f"shell-prewarm-dummy-project-{self.WORKER}"
+        self.scanner.run(["prewarm", f"--token={self.SONARQUBE_TOKEN}", f"--cache-dir=/usr/src/{project}/.prewarm-cache"],
+            environment={"SONAR_HOST_URL": self.SONARQUBE_URL},
+            network=self.SONARQUBE_NETWORK)
+        # Hint: if this test fails, the manifest of the cache was not written
+        manifest_dir = os.path.join(project_dir, ".prewarm-cache", "cnes-prewarm")
+        assert len(os.listdir(manifest_dir)) == 1
+        with open(os.path.join(manifest_dir, os.listdir(manifest_dir)[0]), encoding="utf8") as manifest:
+            files = json.load(manifest)["files"]
+        # Hint: if this test fails, a file of the manifest is missing from the cache
+        assert files
+        assert all(os.path.isfile(os.path.join(project_dir, ".prewarm-cache", cached["path"])) for cached in files)
+        # The analysis finds all the plugins in the cache, it needs its own container to mount it
+        docker_client = docker.from_env()
+        output = docker_client.containers.run(self._SONAR_SCANNER_IMAGE,
+            f"-X -Dsonar.projectKey={project_key} -Dsonar.sources=src -Dsonar.login={self.SONARQUBE_TOKEN}",
+            auto_remove=True,
+            environment={"SONAR_HOST_URL": self.SONARQUBE_URL},
+            network=self.SONARQUBE_NETWORK,
+            user=f"{os.getuid()}:{os.getgid()}",
+            volumes={
+                f"{self._PROJECT_ROOT_DIR}": {'bind': '/usr/src', 'mode': 'rw'},
+                f"{project_dir}/.prewarm-cache": {'bind': '/opt/sonar-scanner/.sonar/cache', 'mode': 'rw'}
+            },
+            working_dir=f"/usr/src/{project}").decode("utf-8")
+        self.client.post("api/projects/delete", project=project_key)
+        # Hint: if this test fails, the scanner downloaded a plugin missing from the cache
+        assert "Download plugin" not in output
+
+class TestCNESSonarScannerOffline:
+    """
+    This class test the tools embedded in the lequal/sonar-scanner image
+    without a SonarQube server.
+    The format of their reports is checked by uploading them to the
+    in-process stand-in server of sonarqube_stub.py, which derives issues
+    from them like the import sensors do, so these tests run in seconds.
+    The import of the reports by an analysis needs a server (see
+    TestCNESSonarScanner).
+    They can be run alone with: pytest -m "not server"
+    """
+    # Class variables
+    _SONAR_SCANNER_IMAGE = "lequal/sonar-scanner"
+    _PROJECT_ROOT_DIR = str(Path(os.getcwd()).parent)
+    scanner = None
+
+    # Setup
+    @pytest.fixture(autouse=True, scope="class")
+    def _scanner(self, request, scanner):
+        """
+        Give the tests access to the lequal/sonar-scanner container of the session
+        """
+        request.cls.scanner = scanner
+
+    # Functions
+    @classmethod
+    def run_tool(cls, cmd, working_dir: str = "", environment: dict = None) -> str:
+        """
+        This function runs a command in the container of the image
+        with the project mounted in /usr/src.
+
+        :param cmd: command line (a string or a list of arguments)
+        :param working_dir: (optional) folder to run the command in (relative to the root of the project)
+        :param environment: (optional) environment variables of the command
+        :returns: output of the command
+        """
+        return cls.scanner.run(cmd, working_dir, environment)
+
+    @classmethod
+    def analysis_tool(cls, tool: str, cmd: str, ref_file: str, tmp_file: str, store_output: bool = True):
+        """
+        This function tests that the image can run a specified code analyzer
+        and that it keeps producing the same result given the same source code.
+
+        :param tool: tool name
+        :param cmd: tool command line
+        :param ref_file: analysis results reference file (path from the root of the project)
+        :param tmp_file: temporary results file (path from the root of the project)
+        :param store_output: (optional) store the standard output in the temporary result file, default: True
+
+        Example (not a doctest):
+            ref = "tests/c_cpp/reference-cppcheck-results.xml"
+            output = "tests/c_cpp/tmp-cppcheck-results.xml"
+            cmd = f"cppcheck --xml-version=2 tests/c_cpp/cppcheck/main.c --output-file={output}"
+            self.analysis_tool("cppcheck", cmd, ref, output, False)
+        """
+        # Run an analysis with the tool
+        output = cls.run_tool(cmd)
+        if store_output:
+            with open(os.path.join(cls._PROJECT_ROOT_DIR, tmp_file), "w", encoding="utf8") as f:
+                f.write(output)
+        # Compare the result of the analysis with the reference
+        # Hint: if this test fails, look for differences with: diff {tmp_file} {ref_file}
+        assert filecmp.cmp(os.path.join(cls._PROJECT_ROOT_DIR, tmp_file), os.path.join(cls._PROJECT_ROOT_DIR, ref_file))
+
+    @classmethod
+    def check_report_format_offline(cls, stub, project_key: str, report_file: str, report_name: str,
+        rule_violated: str, nb_issues: int):
+        """
+        This function tests that a report produced by an analysis tool
+        is in the format its import sensor reads: it is zipped and uploaded
+        to the stand-in server which derives issues from it. It does not run
+        the sonar-scanner.
+
+        :param stub: stand-in server (sonarqube_stub.StubSonarQube)
+        :param project_key: project key
+        :param report_file: report to upload (path from the root of the project)
+        :param report_name: default name of the report (e.g. pylint-report.txt)
+        :param rule_violated: id of a rule violated by a source file
+        :param nb_issues: number of issues expected for the rule
+        """
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as report:
+            report.write(os.path.join(cls._PROJECT_ROOT_DIR, report_file), report_name)
+        task_id = stub.client.post("api/ce/submit",
+            files={"report": ("report.zip", archive.getvalue(), "application/zip")},
+            projectKey=project_key)['taskId']
+        task = sonarqube_wait.wait_ce_task(stub.client, task_id, timeout=30)
+        # Hint: if this test fails, the report could not be parsed
+        assert task['status'] == 'SUCCESS'
+        # Hint: if this test fails, look for the rule in the report
+        assert stub.client.count_issues(componentKeys=project_key, rules=rule_violated) == nb_issues
+
     # Test analysis tools
     def test_tool_cppcheck(self):
         """
@@ -461,25 +652,570 @@ class TestCNESSonarScanner:
         cmd = "bash -c 'shellcheck -s sh -f checkstyle tests/shell/src/script.sh || true'"
         self.analysis_tool("shellcheck", cmd, "tests/shell/reference-shellcheck-results.xml", "tests/shell/tmp-shellcheck-results.xml")
 
-    # Test importation of analysis results
-    def test_import_cppcheck_results(self):
+    # Test the format of the reports of the analysis tools (without server)
+    def test_offline_cppcheck_report_format(self, sonarqube_stub):
         """
-        As a user of this image, I want to be able to import the results
-        of a CppCheck analysis to SonarQube.
+        As a user of this image, I want the reports of the embedded cppcheck
+        to be in the format read by the cppcheck sensor of SonarQube.
         """
-        rule_violated = "cppcheck:arrayIndexOutOfBounds"
-        expected_sensor = "INFO: Sensor CXX [cxx]"
-        expected_import = "INFO: Sensor CXX Cppcheck report import"
-        self.import_analysis_results("CppCheck Dummy Project", "cppcheck-dummy-project",
-            "RNC CPP A", "cxx", "tests/c_cpp", "cppcheck", rule_violated, expected_sensor, expected_import)
+        output = "tests/c_cpp/tmp-cppcheck-report.xml"
+        self.run_tool(f"cppcheck --xml-version=2 tests/c_cpp/cppcheck/main.c --output-file={output}")
+        self.check_report_format_offline(sonarqube_stub, "cppcheck-offline-project", output,
+            "cppcheck-report.xml", "cppcheck:arrayIndexOutOfBounds", 1)
 
-    def test_import_pylint_results(self):
+    def test_offline_pylint_report_format(self, sonarqube_stub):
         """
-        As a user of this image, I want to be able to import the results
-        of a pylint analysis to SonarQube.
+        As a user of this image, I want the reports of the embedded pylint,
+        written with the template of the README, to be in the format read
+        by the pylint sensor of SonarQube.
         """
-        rule_violated = "external_pylint:C0326"
-        expected_sensor = "INFO: Sensor Python Sensor [python]"
-        expected_import = "INFO: Sensor Import of Pylint issues [python]"
-        self.import_analysis_results("Pylint Dummy Project", "pylint-dummy-project",
-            "Sonar way", "py", "tests/python", "src", rule_violated, expected_sensor, expected_import)
+        output = "tests/python/tmp-pylint-report.txt"
+        template = "{path}:{line}: [{msg_id}({symbol}), {obj}] {msg}"
+        report = self.run_tool(["pylint", "--exit-zero", "-r", "n", f"--msg-template={template}",
+            "--rcfile=/opt/python/pylintrc_RNC2015_A_B", "tests/python/src/simplecaesar.py"])
+        with open(os.path.join(self._PROJECT_ROOT_DIR, output), "w", encoding="utf8") as f:
+            f.write(report)
+        with open(os.path.join(self._PROJECT_ROOT_DIR, "tests/python/reference-pylint-results.json"), encoding="utf8") as f:
+            reference = json.load(f)
+        rule_violated = f"external_pylint:{reference[0]['message-id']}"
+        expected = len([message for message in reference if message['message-id'] == reference[0]['message-id']])
+        self.check_report_format_offline(sonarqube_stub, "pylint-offline-project", output,
+            "pylint-report.txt", rule_violated, expected)
+
+    # Test the modes of the entrypoint
+    def test_analyze_mode(self, tmp_project):
+        """
+        As a user of this image, I want the embedded tools to be run
+        on all the languages of my project before the analysis
+        so that their reports are imported without any configuration.
+        """
+        project = tmp_project("python", "shell")
+        output = self.run_tool("python3 -m cnes_scanner analyze", project)
+        # Hint: if this test fails, the report of ShellCheck, read by no sensor, is not imported by default
+        assert output.split() == ["-Dsonar.externalIssuesReportPaths=shellcheck-issues.json"]
+        # Hint: if this test fails, the tool of the language was not run
+        with open(os.path.join(self._PROJECT_ROOT_DIR, project, "pylint-report.txt"), encoding="utf8") as report:
+            assert "src/simplecaesar.py:" in report.read()
+        with open(os.path.join(self._PROJECT_ROOT_DIR, project, "shellcheck-report.xml"), encoding="utf8") as report:
+            assert "<file name='src/script.sh' >" in report.read()
+        # Hint: if this test fails, a tool was run on a language absent from the project
+        assert not os.path.exists(os.path.join(self._PROJECT_ROOT_DIR, project, "cppcheck-report.xml"))
+
+    def test_external_issues(self, tmp_project):
+        """
+        As a user of this image, I want the reports of the embedded tools
+        to be converted to generic external issues
+        so that SonarQube imports them without a dedicated sensor.
+        """
+        project = tmp_project("python", "shell")
+        output = self.run_tool("python3 -m cnes_scanner analyze", project,
+            environment={"CNES_EXTERNAL_ISSUES": "pylint,shellcheck"})
+        # Hint: if this test fails, the generic reports are not given to the scanner
+        assert output.split() == ["-Dsonar.python.pylint.reportPaths=",
+                                  "-Dsonar.externalIssuesReportPaths=pylint-issues.json,shellcheck-issues.json"]
+        project_dir = os.path.join(self._PROJECT_ROOT_DIR, project)
+        with open(os.path.join(project_dir, "shellcheck-report.xml"), encoding="utf8") as report:
+            nb_errors = report.read().count("<error ")
+        for tool, source in (("pylint", "src/simplecaesar.py"), ("shellcheck", "src/script.sh")):
+            with open(os.path.join(project_dir, f"{tool}-issues.json"), encoding="utf8") as report:
+                issues = json.load(report)["issues"]
+            # Hint: if this test fails, the paths are not relative to the base directory of the project
+            assert issues and all(issue["primaryLocation"]["filePath"] == source for issue in issues)
+            assert all(issue["engineId"] == tool for issue in issues)
+        # Hint: if this test fails, an issue of the report was not converted
+        assert len(issues) == nb_errors
+
+    def test_cache_eviction(self, tmp_project):
+        """
+        As a user of this image, I want the cache shared by my containers
+        to stay under a maximum size
+        so that it does not grow without limit as the server is upgraded.
+        """
+        project = tmp_project("shell")
+        cache_dir = os.path.join(self._PROJECT_ROOT_DIR, project, ".cache")
+        now = time.time()
+
+        def fill_cache():
+            # Files recorded by prewarm, with the age of their use-stamp, and one downloaded by the scanner
+            entries = {"old": ("a" * 32, 300), "recent": ("b" * 32, 100), "older": ("c" * 32, 200),
+                       "scanner": ("d" * 32, None)}
+            os.makedirs(os.path.join(cache_dir, ".cnes-stamps"), exist_ok=True)
+            for name, (md5, age) in entries.items():
+                os.makedirs(os.path.join(cache_dir, md5), exist_ok=True)
+                with open(os.path.join(cache_dir, md5, f"{name}.jar"), "wb") as entry:
+                    entry.write(b"0" * 1024)
+                if age is not None:
+                    stamp = os.path.join(cache_dir, ".cnes-stamps", md5)
+                    with open(stamp, "wb"):
+                        pass
+                    os.utime(stamp, (now - age, now - age))
+            for partial in (os.path.join(cache_dir, "b" * 32, "partial.jar.tmp"),
+                            os.path.join(cache_dir, "_tmp", "fileCache.tmp")):
+                os.makedirs(os.path.dirname(partial), exist_ok=True)
+                with open(partial, "wb") as entry:
+                    entry.write(b"0")
+                os.utime(partial, (now - 7200, now - 7200))
+
+        evict = f"python3 -m cnes_scanner evict --cache-dir=/usr/src/{project}/.cache --max-size=2K"
+        # While a sonar-scanner runs (holding the shared lock of the entrypoint), its files are kept
+        fill_cache()
+        self.run_tool(["bash", "-c", f"mkdir -p /usr/src/{project}/.cache/.cnes-locks && "
+                       f"flock -s /usr/src/{project}/.cache/.cnes-locks/scanner.lock {evict}"])
+        # Hint: if this test fails, the eviction removed files a running sonar-scanner may use
+        assert os.path.isfile(os.path.join(cache_dir, "a" * 32, "old.jar"))
+        assert os.path.isfile(os.path.join(cache_dir, "_tmp", "fileCache.tmp"))
+        self.run_tool(evict)
+        # Hint: if this test fails, the least recently used entries are not the evicted ones
+        assert not os.path.exists(os.path.join(cache_dir, "a" * 32))
+        assert not os.path.exists(os.path.join(cache_dir, ".cnes-stamps", "a" * 32))
+        assert os.path.isfile(os.path.join(cache_dir, "b" * 32, "recent.jar"))
+        assert os.path.isfile(os.path.join(cache_dir, "c" * 32, "older.jar"))
+        # Hint: if this test fails, a file the sonar-scanner downloaded itself (not recorded by prewarm) was evicted
+        assert os.path.isfile(os.path.join(cache_dir, "d" * 32, "scanner.jar"))
+        # Hint: if this test fails, the files of an interrupted download are left in the cache
+        assert not os.path.exists(os.path.join(cache_dir, "b" * 32, "partial.jar.tmp"))
+        assert not os.path.exists(os.path.join(cache_dir, "_tmp", "fileCache.tmp"))
+
+    def test_resources_autotune(self):
+        """
+        As a user of this image, I want the sonar-scanner and the embedded
+        tools to be sized to the limits of the container
+        so that analyses neither run out of memory nor leave CPUs idle.
+        """
+        docker_client = docker.from_env()
+        for environment, expected in (({}, {"-Xmx512m", "-XX:ActiveProcessorCount=2"}),
+                                      ({"SONAR_SCANNER_OPTS": "-Xmx300m"}, {"-Xmx300m", "-XX:ActiveProcessorCount=2"}),
+                                      ({"CNES_CPUS": "1", "CNES_MEMORY": "2G"}, {"-Xmx1024m", "-XX:ActiveProcessorCount=1"})):
+            output = docker_client.containers.run(self._SONAR_SCANNER_IMAGE, "python3 -m cnes_scanner jvm-options",
+                auto_remove=True,
+                environment=environment,
+                nano_cpus=2 * 10**9,
+                mem_limit="1g").decode("utf-8")
+            options = output.split()
+            # Hint: if this test fails, the limits of the container or the options of the user are not read
+            assert expected <= set(options)
+            assert len([option for option in options if option.startswith("-Xmx")]) == 1
+        for environment in ({"CNES_CPUS": "two"}, {"CNES_CPUS": "0"}, {"CNES_MEMORY": "4X"}):
+            container = docker_client.containers.run(self._SONAR_SCANNER_IMAGE, "python3 -m cnes_scanner jvm-options",
+                detach=True,
+                environment=environment)
+            status = container.wait()["StatusCode"]
+            logs = container.logs(stdout=False, stderr=True).decode("utf-8")
+            container.remove()
+            # Hint: if this test fails, an invalid value of the user is not reported clearly
+            assert status == 2
+            assert f"Invalid {next(iter(environment))}" in logs
+            assert "Traceback" not in logs
+
+    def test_incremental_cxx(self, tmp_project):
+        """
+        As a user of this image, I want cppcheck and Infer to analyze
+        only the C/C++ files that changed since the last analysis
+        so that a large C project can be analyzed on each commit.
+        """
+        project = tmp_project("c_cpp")
+        project_dir = os.path.join(self._PROJECT_ROOT_DIR, project)
+        shutil.copy(os.path.join(self._PROJECT_ROOT_DIR, "tests/c_cpp/infer/hello.c"), os.path.join(project_dir, "src"))
+        with open(os.path.join(project_dir, "compile_commands.json"), "w", encoding="utf8") as database:
+            json.dump([{"directory": f"/usr/src/{project}", "file": f"src/{name}",
+                        "command": f"gcc -c src/{name} -o /dev/null"} for name in ("main.c", "hello.c")], database)
+        analyze = "python3 -m cnes_scanner analyze"
+        environment = {"CNES_ANALYZE_TOOLS": "cppcheck,infer", "CNES_INCREMENTAL_DIR": f"/usr/src/{project}/.incremental"}
+
+        def infer_issues():
+            with open(os.path.join(project_dir, "infer-out", "report.json"), encoding="utf8") as report:
+                return sorted((bug["bug_type"], bug["file"], bug["line"]) for bug in json.load(report))
+
+        # Reports of full analyses, after a change of a file
+        with open(os.path.join(project_dir, "src", "hello.c"), "a", encoding="utf8") as source:
+            source.write("/* changed */\n")
+        self.run_tool(analyze, project, environment={**environment, "CNES_INCREMENTAL": "no"})
+        os.rename(os.path.join(project_dir, "cppcheck-report.xml"), os.path.join(project_dir, "reference-cppcheck-report.xml"))
+        reference_infer_issues = infer_issues()
+        # Incremental analyses, before and after the same change
+        with open(os.path.join(project_dir, "src", "hello.c"), "r+", encoding="utf8") as source:
+            content = source.read().replace("/* changed */\n", "")
+            source.seek(0)
+            source.truncate()
+            source.write(content)
+        self.run_tool(analyze, project, environment=environment)
+        with open(os.path.join(project_dir, "src", "hello.c"), "a", encoding="utf8") as source:
+            source.write("/* changed */\n")
+        self.run_tool(analyze, project, environment=environment)
+        infer_dir = os.path.join(project_dir, ".incremental", "infer")
+        with open(os.path.join(infer_dir, os.listdir(infer_dir)[0], "cnes-changed-files.txt"), encoding="utf8") as index:
+            # Hint: if this test fails, Infer did not analyze only the changed translation unit
+            assert index.read() == "src/hello.c\n"
+        # Hint: if this test fails, the results of the incremental analysis differ from a full one
+        assert infer_issues() == reference_infer_issues
+        assert filecmp.cmp(os.path.join(project_dir, "cppcheck-report.xml"),
+                           os.path.join(project_dir, "reference-cppcheck-report.xml"), shallow=False)
+        # Hint: if this test fails, cppcheck did not store its results in its build directory
+        assert os.listdir(os.path.join(project_dir, ".incremental", "cppcheck"))
+
+    def test_incremental_cxx_unchanged_units(self, tmp_project):
+        """
+        As a user of this image, I want the issues of the C/C++ files that
+        did not change to stay in the reports of an incremental analysis,
+        wherever my project is mounted
+        so that an incremental analysis reports the same issues as a full one.
+        """
+        project = tmp_project("c_cpp")
+        project_dir = os.path.join(self._PROJECT_ROOT_DIR, project)
+        shutil.copy(os.path.join(self._PROJECT_ROOT_DIR, "tests/c_cpp/infer/hello.c"), os.path.join(project_dir, "src"))
+        # A translation unit with an issue, which does not change
+        with open(os.path.join(project_dir, "src", "null.c"), "w", encoding="utf8") as source:
+            source.write("#include <stddef.h>\n\nint null_dereference(void)\n{\n    int *p = NULL;\n    return *p;\n}\n")
+
+        # A translation unit calling a function of another one, which changes
+        with open(os.path.join(project_dir, "src", "value.c"), "w", encoding="utf8") as source:
+            source.write("#include <stddef.h>\n\nint *value(void)\n{\n    static int v;\n    return &v;\n}\n")
+        with open(os.path.join(project_dir, "src", "caller.c"), "w", encoding="utf8") as source:
+            source.write("int *value(void);\n\nint read_value(void)\n{\n    return *value();\n}\n")
+
+        def write_database(directory):
+            with open(os.path.join(directory, "compile_commands.json"), "w", encoding="utf8") as database:
+                json.dump([{"directory": f"/usr/src/{os.path.relpath(directory, self._PROJECT_ROOT_DIR)}",
+                            "file": f"src/{name}", "command": f"gcc -c src/{name} -o /dev/null"}
+                           for name in ("main.c", "hello.c", "null.c", "value.c", "caller.c")], database)
+
+        def infer_issues(directory):
+            with open(os.path.join(directory, "infer-out", "report.json"), encoding="utf8") as report:
+                issues = [(bug["file"], bug["line"], bug["bug_type"], bug["procedure"]) for bug in json.load(report)]
+            # Hint: if this test fails, the merged report has an issue several times
+            assert len(issues) == len(set(issues))
+            return sorted(issues)
+
+        def infer_files(directory):
+            return {issue[0] for issue in infer_issues(directory)}
+
+        write_database(project_dir)
+        analyze = "python3 -m cnes_scanner analyze"
+        environment = {"CNES_ANALYZE_TOOLS": "cppcheck,infer", "CNES_INCREMENTAL_DIR": f"/usr/src/{project}/.incremental"}
+        self.run_tool(analyze, project, environment=environment)
+        # Hint: if this test fails, Infer found no issue in the unchanged translation unit
+        assert "src/null.c" in infer_files(project_dir)
+        with open(os.path.join(project_dir, "src", "hello.c"), "a", encoding="utf8") as source:
+            source.write("/* changed */\n")
+        self.run_tool(analyze, project, environment=environment)
+        # Hint: if this test fails, the issues of the unchanged translation units were dropped
+        assert "src/null.c" in infer_files(project_dir)
+        # The callee now returns NULL: the issue is in its caller, which did not change
+        with open(os.path.join(project_dir, "src", "value.c"), "r+", encoding="utf8") as source:
+            content = source.read().replace("return &v;", "return NULL;")
+            source.seek(0)
+            source.truncate()
+            source.write(content)
+        self.run_tool(analyze, project, environment=environment)
+        incremental_issues = infer_issues(project_dir)
+        # Hint: if this test fails, the callers of the changed translation units were not analyzed again
+        assert "src/caller.c" in infer_files(project_dir)
+        self.run_tool(analyze, project, environment={**environment, "CNES_INCREMENTAL": "no"})
+        # Hint: if this test fails, the results of the incremental analysis differ from a full one
+        assert incremental_issues == infer_issues(project_dir)
+        # The same project (same sonar.projectKey) mounted elsewhere reuses the same state
+        moved_dir = os.path.join(project_dir, ".moved")
+        shutil.copytree(project_dir, moved_dir, ignore=shutil.ignore_patterns(".moved", ".incremental", "infer-out"))
+        write_database(moved_dir)
+        self.run_tool(analyze, f"{project}/.moved", environment=environment)
+        assert "src/null.c" in infer_files(moved_dir)
+        for tool in ("cppcheck", "infer"):
+            # Hint: if this test fails, the state of the project depends on where it is mounted
+            assert len(os.listdir(os.path.join(project_dir, ".incremental", tool))) == 1
+
+    def test_lint_cache(self, tmp_project):
+        """
+        As a user of this image, I want pylint and ShellCheck to lint
+        only the files that changed since the last analysis
+        so that the analysis of a large project is fast.
+        """
+        project = tmp_project("python", "shell")
+        project_dir = os.path.join(self._PROJECT_ROOT_DIR, project)
+        # Two modules importing each other, for a message computed over several modules (cyclic-import)
+        for module, imported in (("cycle_a", "cycle_b"), ("cycle_b", "cycle_a")):
+            with open(os.path.join(project_dir, "src", f"{module}.py"), "w", encoding="utf8") as source:
+                source.write(f'"""Cycle"""\nimport {imported}\n')
+        reports = ("pylint-report.txt", "shellcheck-report.xml")
+        analyze = "python3 -m cnes_scanner analyze"
+        self.run_tool(f"env CNES_LINT_CACHE=no {analyze}", project)
+        for report in reports:
+            os.rename(os.path.join(project_dir, report), os.path.join(project_dir, f"reference-{report}"))
+        # First run to fill the cache, second run from the cache only
+        for _ in range(2):
+            self.run_tool(f"env CNES_LINT_CACHE_DIR=/usr/src/{project}/.lint-cache {analyze}", project)
+            for report in reports:
+                # Hint: if this test fails, the cached results are not merged as the tool reports them
+                assert filecmp.cmp(os.path.join(project_dir, report),
+                                   os.path.join(project_dir, f"reference-{report}"), shallow=False)
+            with open(os.path.join(project_dir, "pylint-report.txt"), encoding="utf8") as report:
+                # Hint: if this test fails, the messages computed over several modules were dropped
+                assert "R0401" in report.read()
+        # Hint: if this test fails, the results were not cached
+        assert os.listdir(os.path.join(project_dir, ".lint-cache", "pylint"))
+        assert os.listdir(os.path.join(project_dir, ".lint-cache", "shellcheck"))
+        # A change of an imported module changes the messages of the unchanged module importing it
+        for member in ("OTHER = 1", "VALUE = 1"):
+            with open(os.path.join(project_dir, "src", "provider.py"), "w", encoding="utf8") as source:
+                source.write(f'"""Provider"""\n{member}\n')
+            with open(os.path.join(project_dir, "src", "consumer.py"), "w", encoding="utf8") as source:
+                source.write('"""Consumer"""\nimport provider\nprint(provider.OTHER)\n')
+            self.run_tool(f"env CNES_LINT_CACHE=no {analyze}", project)
+            os.replace(os.path.join(project_dir, "pylint-report.txt"),
+                       os.path.join(project_dir, "reference-pylint-report.txt"))
+            self.run_tool(f"env CNES_LINT_CACHE_DIR=/usr/src/{project}/.lint-cache {analyze}", project)
+            # Hint: if this test fails, the cached results of a file do not depend on the modules it imports
+            assert filecmp.cmp(os.path.join(project_dir, "pylint-report.txt"),
+                               os.path.join(project_dir, "reference-pylint-report.txt"), shallow=False)
+
+    def test_pylint_server(self, tmp_project):
+        """
+        As a user of this image, I want pylint to stay loaded between runs
+        so that linting a file from my editor takes milliseconds.
+        """
+        project = tmp_project("python")
+        project_dir = os.path.join(self._PROJECT_ROOT_DIR, project)
+        pylint_args = ["--persistent=n", "-r", "n", "src/simplecaesar.py"]
+        docker_client = docker.from_env()
+        server = docker_client.containers.run(self._SONAR_SCANNER_IMAGE, "pylint-server",
+            detach=True,
+            auto_remove=True,
+            user=f"{os.getuid()}:{os.getgid()}",
+            volumes={f"{self._PROJECT_ROOT_DIR}": {'bind': '/usr/src', 'mode': 'rw'}})
+        try:
+            sonarqube_wait.wait_log_line(server.name, b"INFO: pylint server listening")
+            # The pylintrcs alternate: the options of a run must not leak into the next ones
+            for change, rcfile in (("", "A_B"), ("\nimport os\n", "D"), ("", "A_B"), ("", "D")):
+                with open(os.path.join(project_dir, "src", "simplecaesar.py"), "a", encoding="utf8") as source:
+                    source.write(change)
+                args = [f"--rcfile=/opt/python/pylintrc_RNC2015_{rcfile}", *pylint_args]
+                expected = server.exec_run(["pylint", *args], workdir=f"/usr/src/{project}", demux=True)
+                output = server.exec_run(["python3", "-m", "cnes_scanner", "pylint-client", *args],
+                    workdir=f"/usr/src/{project}", demux=True)
+                # Hint: if this test fails, the server does not run pylint like its command line
+                # (or it linted a previous version of the file, or with the options of a previous run)
+                assert output.exit_code == expected.exit_code
+                assert output.output[0] == expected.output[0]
+        finally:
+            server.stop()
+
+    def test_pylint_shard(self, sonarqube_stub, tmp_project):
+        """
+        As a user of this image, I want to split pylint across the nodes
+        of my CI and merge their results
+        so that a large Python project is linted faster, with the same report.
+        """
+        project = tmp_project("python")
+        project_dir = os.path.join(self._PROJECT_ROOT_DIR, project)
+        for index in range(5):
+            shutil.copy(os.path.join(project_dir, "src", "simplecaesar.py"),
+                        os.path.join(project_dir, "src", f"simplecaesar_{index}.py"))
+        # Two modules importing each other, for a message computed over several modules (cyclic-import)
+        for module, imported in (("cycle_a", "cycle_b"), ("cycle_b", "cycle_a")):
+            with open(os.path.join(project_dir, "src", f"{module}.py"), "w", encoding="utf8") as source:
+                source.write(f'"""Cycle"""\nimport {imported}\n')
+        environment = {"CNES_LINT_CACHE": "no"}
+        # Report of the pylint command line, on all the Python files of the project
+        files = self.run_tool("python3 -m cnes_scanner pylint-shard split --shards 1", project).split()
+        reference = os.path.join(project_dir, "reference-pylint-report.txt")
+        with open(reference, "w", encoding="utf8") as report:
+            report.write(self.run_tool(["pylint", "--exit-zero", "--rcfile=/opt/python/pylintrc_RNC2015_A_B", "-r", "n",
+                "--persistent=n", "--msg-template={path}:{line}: [{msg_id}({symbol}), {obj}] {msg}", *files], project))
+        # Hint: if this test fails, the project has no message computed over several modules
+        with open(reference, encoding="utf8") as report:
+            assert "R0401" in report.read()
+        for index in range(1, 4):
+            self.run_tool(f"python3 -m cnes_scanner pylint-shard run --shards 3 --index {index} "
+                          f"--output shard-{index}.json", project, environment=environment)
+        self.run_tool("python3 -m cnes_scanner pylint-shard merge --output pylint-report.txt "
+                      "shard-3.json shard-1.json shard-2.json", project)
+        # Hint: if this test fails, the merged report differs from the one of the pylint command line
+        assert filecmp.cmp(os.path.join(project_dir, "pylint-report.txt"), reference, shallow=False)
+        # A shard split differently (e.g. with another history) leaves a file out
+        with open(os.path.join(project_dir, "shard-2.json"), encoding="utf8") as shard_file:
+            shard = json.load(shard_file)
+        shard["results"].popitem()
+        with open(os.path.join(project_dir, "shard-2.json"), "w", encoding="utf8") as shard_file:
+            json.dump(shard, shard_file)
+        with pytest.raises(docker.errors.ContainerError) as error:
+            self.run_tool("python3 -m cnes_scanner pylint-shard merge --output gap-report.txt "
+                          "shard-1.json shard-2.json shard-3.json", project)
+        # Hint: if this test fails, the merge does not check that the shards cover each file once
+        assert "do not cover the files" in error.value.stderr
+        assert "Traceback" not in error.value.stderr
+        with open(os.path.join(self._PROJECT_ROOT_DIR, "tests/python/reference-pylint-results.json"), encoding="utf8") as f:
+            reference_messages = json.load(f)
+        rule_violated = f"external_pylint:{reference_messages[0]['message-id']}"
+        with open(reference, encoding="utf8") as report:
+            expected = report.read().count(f"[{reference_messages[0]['message-id']}(")
+        self.check_report_format_offline(sonarqube_stub, "pylint-shard-offline-project", f"{project}/pylint-report.txt",
+            "pylint-report.txt", rule_violated, expected)
+
+    def test_pr_mode(self, tmp_project):
+        """
+        As a user of this image, I want to analyze only the files
+        changed by a pull request
+        so that the analysis of a pull request is fast.
+        """
+        project = tmp_project("python", "shell")
+        git = "git -c user.name=test -c user.email=test@example.com"
+        # The Python file is in the base commit, the shell script is changed afterwards
+        self.run_tool(["bash", "-c", f"git init -q && {git} add src/simplecaesar.py && {git} commit -qm base "
+                                     f"&& {git} add src/script.sh && {git} commit -qm change"], project)
+        output = self.run_tool("python3 -m cnes_scanner pr HEAD~1", project)
+        # Hint: if this test fails, the analysis is not restricted to the changed files
+        assert output.split() == ["-Dsonar.externalIssuesReportPaths=shellcheck-issues.json",
+                                  "-Dsonar.inclusions=src/script.sh"]
+        # Hint: if this test fails, the arguments of the sonar-scanner around the base ref are lost
+        output = self.run_tool("python3 -m cnes_scanner pr -Dsonar.pullrequest.key=1 HEAD~1 -Dsonar.pullrequest.branch=change",
+            project)
+        assert output.split() == ["-Dsonar.externalIssuesReportPaths=shellcheck-issues.json", "-Dsonar.pullrequest.key=1",
+                                  "-Dsonar.pullrequest.branch=change", "-Dsonar.inclusions=src/script.sh"]
+        # Hint: if this test fails, the sonar.inclusions of the user are not restricted to the changed files
+        output = self.run_tool("python3 -m cnes_scanner pr HEAD~1 -Dsonar.inclusions=**/*.sh,src/*.py", project)
+        assert output.split()[-1] == "-Dsonar.inclusions=src/script.sh"
+        output = self.run_tool("python3 -m cnes_scanner pr HEAD~1 -Dsonar.inclusions=**/*.py", project)
+        assert output.strip() == ""
+        project_dir = os.path.join(self._PROJECT_ROOT_DIR, project)
+        # Hint: if this test fails, the tools did not run on the changed files only
+        assert os.path.exists(os.path.join(project_dir, "shellcheck-report.xml"))
+        assert not os.path.exists(os.path.join(project_dir, "pylint-report.txt"))
+
+    def test_metrics(self, tmp_project):
+        """
+        As a user of this image, I want the time and the resources spent by
+        each stage of an analysis to be recorded
+        so that I can find out which one slows down my pipeline.
+        """
+        project = tmp_project("python", "shell")
+        self.run_tool("analyze -v", project, environment={"CNES_METRICS": "json,prometheus"})
+        project_dir = os.path.join(self._PROJECT_ROOT_DIR, project)
+        with open(os.path.join(project_dir, "cnes-scanner-metrics.json"), encoding="utf8") as metrics_file:
+            metrics = json.load(metrics_file)
+        # Hint: if this test fails, a stage of the entrypoint was not recorded in the same run
+        assert [stage["name"] for stage in metrics["stages"]] == ["analyze", "sonar-scanner"]
+        assert set(metrics["stages"][0]["tools"]) == {"pylint", "shellcheck"}
+        with open(os.path.join(project_dir, "cnes-scanner-metrics.prom"), encoding="utf8") as textfile:
+            prometheus = textfile.read()
+        # Hint: if this test fails, the Prometheus textfile is not written
+        assert 'cnes_scanner_stage_seconds{stage="sonar-scanner"}' in prometheus
+        assert 'cnes_scanner_tool_seconds{tool="pylint"}' in prometheus
+        assert 'cnes_scanner_jvm_heap_at_exit_bytes{kind="used"}' in prometheus
+        series = [line.rpartition(" ")[0] for line in prometheus.splitlines() if not line.startswith("#")]
+        # Hint: if this test fails, a sensor or a step run several times has several series
+        assert len(series) == len(set(series))
+
+    def test_metrics_stop(self):
+        """
+        As a user of this image, I want a container recording metrics to
+        stop as soon as it is asked to
+        so that docker stop does not wait for its timeout and kill the analysis.
+        """
+        docker_client = docker.from_env()
+        container = docker_client.containers.run(self._SONAR_SCANNER_IMAGE, "sleep 600",
+            detach=True,
+            environment={"CNES_METRICS": "json", "CNES_METRICS_DIR": "/tmp"})
+        try:
+            time.sleep(5)
+            start = time.monotonic()
+            container.stop(timeout=60)
+            elapsed = time.monotonic() - start
+            status = container.wait()["StatusCode"]
+        finally:
+            container.remove(force=True)
+        # Hint: if this test fails, SIGTERM is not forwarded to the final command by the metrics
+        assert elapsed < 30
+        assert status == 128 + 15
+
+    def test_cds_archive(self):
+        """
+        As a user of this image, I want the sonar-scanner to load its
+        classes from an archive
+        so that its JVM starts faster.
+        """
+        # The JVM fails to start if it cannot share the classes of the JDK (-Xshare:on)
+        environment = {"SONAR_SCANNER_OPTS": "-Xshare:on -Xlog:cds=info -Xlog:class+load=info"}
+        output = self.run_tool("sonar-scanner -v", environment=environment)
+        # Hint: if this test fails, the archive is missing or does not match the JVM of the image
+        assert "source: shared objects file (top)" in output
+        assert "mismatch" not in output.lower()
+        # The warm mode runs the JVM of the scanner with its own classpath
+        docker_client = docker.from_env()
+        scanner = docker_client.containers.run(self._SONAR_SCANNER_IMAGE, "warm",
+            detach=True,
+            environment=environment,
+            user=f"{os.getuid()}:{os.getgid()}")
+        try:
+            sonarqube_wait.wait_log_line(scanner.name, b"INFO: Warm sonar-scanner listening")
+            output = scanner.logs().decode("utf-8")
+        finally:
+            scanner.remove(force=True)
+        # Hint: if this test fails, the classpath of the warm mode does not match the archive
+        assert "source: shared objects file (top)" in output
+        assert "mismatch" not in output.lower()
+
+    # Test the benchmark of the image
+    def test_benchmark(self):
+        """
+        As a maintainer of this image, I want to measure the tools on
+        generated projects
+        so that I can catch performance regressions when they are bumped.
+        """
+        results = benchmark.benchmark(30)
+        # Hint: if this test fails, a tool was not measured
+        assert set(results["tools"]) == {"cppcheck", "infer", "shellcheck",
+            *(f"pylint-{rcfile}" for rcfile in benchmark.PYLINTRCS)}
+        for usage in results["tools"].values():
+            assert usage["wall"] > 0 and usage["max_rss_kb"] > 0
+        # Hint: if this test fails, the comparison with a baseline is wrong
+        assert not benchmark.compare(results, results)
+
+    # Test the flavors of the image
+    @pytest.mark.skipif(not os.environ.get("FLAVORS"), reason="no flavor built (see FLAVORS in tests/README.md)")
+    def test_flavors(self, tmp_project):
+        """
+        As a maintainer of this image, I want to know the compressed size
+        of each flavor and the time it takes to run its first scan
+        so that I can follow what the users pay to pull and start them.
+        """
+        # Dummy projects and report of the tools of each flavor
+        flavors = {
+            "python": (("python",), "pylint-report.txt"),
+            "cxx": (("c_cpp",), "cppcheck-report.xml"),
+            "shell": (("shell",), "shellcheck-report.xml"),
+            "full": (("c_cpp", "python", "shell"), "pylint-report.txt")
+        }
+        docker_client = docker.from_env()
+        results = {}
+        for flavor in os.environ["FLAVORS"].split(","):
+            image = f"{self._SONAR_SCANNER_IMAGE}:{flavor}"
+            # Size of the layers once gzipped, as pushed to a registry
+            compressor = zlib.compressobj(wbits=31)
+            compressed_size = 0
+            for chunk in docker_client.images.get(image).save(named=True):
+                compressed_size += len(compressor.compress(chunk))
+            compressed_size += len(compressor.flush())
+            dummy_projects, report = flavors[flavor]
+            project = tmp_project(*dummy_projects)
+            project_key = f"{flavor}-flavor-dummy-project-{self.WORKER}"
+            # First scan of a new container: the tools, then the sonar-scanner with an empty cache
+            start = time.monotonic()
+            try:
+                docker_client.containers.run(image, f"analyze -Dsonar.projectKey={project_key} -Dsonar.sources=src "
+                    f"-Dsonar.working.directory={self.WORK_DIR} -Dsonar.login={self.SONARQUBE_TOKEN}",
+                    auto_remove=True,
+                    environment={"SONAR_HOST_URL": self.SONARQUBE_URL},
+                    network=self.SONARQUBE_NETWORK,
+                    user=f"{os.getuid()}:{os.getgid()}",
+                    volumes={f"{self._PROJECT_ROOT_DIR}": {'bind': '/usr/src', 'mode': 'rw'}},
+                    working_dir=f"/usr/src/{project}")
+                results[flavor] = {
+                    "compressed_size": compressed_size,
+                    "time_to_first_scan": round(time.monotonic() - start, 3)
+                }
+                self.wait_analysis_processed(project)
+            finally:
+                self.client.post("api/projects/delete", project=project_key)
+            # Hint: if this test fails, the tools of the flavor are missing
+            assert os.path.exists(os.path.join(self._PROJECT_ROOT_DIR, project, report))
+        with open(os.environ.get("FLAVORS_REPORT", "flavors-report.json"), "w", encoding="utf8") as flavors_report:
+            json.dump(results, flavors_report, indent=2)